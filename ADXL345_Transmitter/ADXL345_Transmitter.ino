@@ -18,6 +18,16 @@ char DATAZ1 = 0x37;	//Z-Axis Data 1
 //This buffer will hold values read from the ADXL345 registers.
 char values[10];
 
+//Binary frame sent to the monitor (see codec.py), all fields little-endian:
+//  sync word 0xA5 0x5A | uint16 sequence | SAMPLES_PER_FRAME x (x, y, z) int16 | uint16 CRC-16/CCITT
+#define SAMPLES_PER_FRAME 4
+#define PAYLOAD_SIZE      (SAMPLES_PER_FRAME * 6)
+#define FRAME_SIZE        (2 + 2 + PAYLOAD_SIZE + 2)
+
+byte frame[FRAME_SIZE];
+int sample = 0;
+uint16_t sequence = 0;
+
 void setup(){ 
   //Initiate an SPI communication instance.
   SPI.begin();
@@ -42,26 +52,50 @@ void loop(){
   //The results of the read operation will get stored to the values[] buffer.
   readRegister(DATAX0, 6, values);
   
-  //Send the results to the serial data monitor.
-  //Value space seperated and terminated by LF
-   
-  Serial.print(values[0]);
-  Serial.print(" ");
-  Serial.print(values[1]);
-  Serial.print(" ");
-  Serial.print(values[2]);
-  Serial.print(" ");
-  Serial.print(values[3]);
-  Serial.print(" ");
-  Serial.print(values[4]);
-  Serial.print(" ");
-  Serial.print(values[5]);
-  Serial.println();
+  //Store the sample in the frame; once the frame is full, send it.
+  for(int i=0; i<6; i++){
+    frame[4 + sample * 6 + i] = values[i];
+  }
+  sample++;
+  
+  if(sample == SAMPLES_PER_FRAME){
+    sendFrame();
+    sample = 0;
+  }
   
   delay(50); 
 }
 
 
+//This function will compute the CRC-16/CCITT (poly 0x1021, init 0xFFFF) of a buffer.
+//Parameters:
+//  byte * data - The bytes to check.
+//  int length - The number of bytes.
+uint16_t crc16(byte * data, int length){
+  uint16_t crc = 0xFFFF;
+  for(int i=0; i<length; i++){
+    crc ^= (uint16_t)data[i] << 8;
+    for(int bit=0; bit<8; bit++){
+      if(crc & 0x8000) crc = (crc << 1) ^ 0x1021;
+      else crc = crc << 1;
+    }
+  }
+  return crc;
+}
+
+//This function will complete the frame header and CRC and send it to the serial data monitor.
+void sendFrame(){
+  frame[0] = 0xA5;
+  frame[1] = 0x5A;
+  frame[2] = sequence & 0xFF;
+  frame[3] = sequence >> 8;
+  uint16_t crc = crc16(frame + 2, 2 + PAYLOAD_SIZE);
+  frame[FRAME_SIZE - 2] = crc & 0xFF;
+  frame[FRAME_SIZE - 1] = crc >> 8;
+  Serial.write(frame, FRAME_SIZE);
+  sequence++;
+}
+
 //This function will write a value to a register on the ADXL345.
 //Parameters:
 //  char registerAddress - The register to write a value to
@@ -0,0 +1,596 @@
+#!/usr/bin/env python
+"""
+Chunked compressed archives for long captures: the samples are stored in
+chunks of a fixed duration, compressed one by one, with an index at the
+end of the file, so reading a time range only decompresses the chunks it
+touches.
+
+usage: python -m archive convert ARCHIVE FILE.csv... [-s SCHEMA] [-c SECONDS]
+                                                     [-z varint|zlib|lzma]
+       python -m archive query ARCHIVE [-a AXIS]... [--from T1] [--to T2]
+       python -m archive info ARCHIVE
+"""
+import sys, os, json, struct, zlib, itertools, optparse
+import numpy as np
+from globals            import *
+from schema             import StreamSchema, DEFAULT_SCHEMA, SCHEMAS, load_schema
+
+try:
+    import lzma                                     # python 3.3+
+except ImportError:
+    try:
+        from backports import lzma                  # pip install backports.lzma
+    except ImportError:
+        lzma = None
+
+
+
+#===============================================================================
+# Archive file:
+#
+#   magic       8 bytes     'ADXLARC1'
+#   size        uint32      header size, the first chunk starts at this offset
+#   header      json        {"schema": the StreamSchema, "codec": ...,
+#                           "chunk_seconds": ...}, padded with spaces up to a
+#                           multiple of 64 bytes
+#   chunks      'CHNK', payload size uint32, count uint32, t_start <f8,
+#               t_end <f8, then the payload (compressed by the codec):
+#                   the timestamps in microseconds, then every channel in
+#                   turn (raw counts), delta encoded, zigzag and varint
+#                   packed; the channels of a float raw type are stored as
+#                   is (little-endian) after the timestamps
+#   index       one record per chunk (see index_dtype): time range, offset,
+#               payload size, count, min and max of every channel
+#   trailer     index offset uint64, chunk count uint32, 'ADXLIDX1'
+#
+# The chunk k holds the samples of [k * chunk_seconds, (k+1) * chunk_seconds).
+# The index is written when the archive is closed: the index of an archive
+# whose writer was killed is rebuilt from the chunk headers.
+#===============================================================================
+ARCHIVE_MAGIC     = 'ADXLARC1'
+ARCHIVE_EXTENSION = '.adxa'
+INDEX_MAGIC       = 'ADXLIDX1'
+CHUNK_MAGIC       = 'CHNK'
+CHUNK_HEADER      = struct.Struct('<4sIIdd')
+TRAILER           = struct.Struct('<QI8s')
+HEADER_ALIGN      = 64
+
+ARCHIVE_VARINT    = 'varint'
+ARCHIVE_ZLIB      = 'zlib'
+ARCHIVE_LZMA      = 'lzma'
+ARCHIVE_CODECS    = [ARCHIVE_VARINT, ARCHIVE_ZLIB, ARCHIVE_LZMA]
+ARCHIVE_CHUNK_SECONDS = 60.0
+
+TIME_RESOLUTION   = 1e-6                        # timestamps are stored in microseconds
+
+
+def zigzag(values):
+    """ int64 -> uint64, the small negative values to small codes
+    """
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+#------------------------------------------------------------
+
+
+def unzigzag(codes):
+    codes = np.asarray(codes, dtype=np.uint64)
+    return (codes >> np.uint64(1)).view(np.int64) ^ -(codes & np.uint64(1)).view(np.int64)
+#------------------------------------------------------------
+
+
+def varint_encode(values):
+    """
+    Purpose:    LEB128 packing of an uint64 array, vectorized: one pass
+                per byte of the longest code instead of one per value
+    Return:     an uint8 array
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    sizes  = np.ones(len(values), dtype=np.intp)
+    for k in range(1, 10):
+        more = values >= np.uint64(1 << (7 * k))
+        if not more.any():
+            break
+        sizes += more
+    ends   = np.cumsum(sizes)
+    starts = ends - sizes
+    out    = np.empty(ends[-1] if len(ends) else 0, dtype=np.uint8)
+    for k in range(sizes.max() if len(sizes) else 0):
+        sel  = np.flatnonzero(sizes > k) if k else slice(None)
+        code = (values[sel] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        code |= (sizes[sel] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[sel] + k] = code
+    return out
+#------------------------------------------------------------
+
+
+def varint_decode(data, count):
+    """
+    Purpose:    unpack the first 'count' LEB128 codes of a buffer
+    Return:     (uint64 array, number of bytes they used)
+    """
+    data = np.frombuffer(data, dtype=np.uint8)
+    if count == 0:
+        return np.empty(0, dtype=np.uint64), 0
+    ends = np.flatnonzero(data < 0x80)[:count] + 1
+    if len(ends) < count:
+        raise ValueError('truncated varint stream')
+    starts = np.empty_like(ends)
+    starts[0]  = 0
+    starts[1:] = ends[:-1]
+    used   = data[:ends[-1]]
+    shifts = (np.arange(len(used)) - np.repeat(starts, ends - starts)) * 7
+    codes  = (used & 0x7f).astype(np.uint64) << shifts.astype(np.uint64)
+    return np.add.reduceat(codes, starts), int(ends[-1])
+#------------------------------------------------------------
+
+
+def delta(values):
+    """ Differences along the first axis, the first row kept as is
+    """
+    out = np.empty_like(values)
+    out[:1] = values[:1]
+    out[1:] = values[1:] - values[:-1]
+    return out
+#------------------------------------------------------------
+
+
+def compress(payload, codec):
+    if codec == ARCHIVE_ZLIB:
+        return zlib.compress(payload, 6)
+    if codec == ARCHIVE_LZMA:
+        return lzma.compress(payload)
+    return payload
+
+def decompress(payload, codec):
+    if codec == ARCHIVE_ZLIB:
+        return zlib.decompress(payload)
+    if codec == ARCHIVE_LZMA:
+        return lzma.decompress(payload)
+    return payload
+#------------------------------------------------------------
+
+
+def encode_chunk(timestamps, samples, schema, codec):
+    """
+    Purpose:    pack the samples of one chunk
+    Input:      timestamps: (N,) seconds, samples: (N, channels) scaled values
+    Return:     (payload, min, max), min and max: (channels,) of the values
+                as they are read back
+    """
+    ticks  = np.rint(np.asarray(timestamps) / TIME_RESOLUTION).astype(np.int64)
+    raw    = schema.quantize(samples)
+    packed = [varint_encode(zigzag(delta(ticks))).tostring()]
+    if schema.raw_dtype.kind in 'iu':
+        codes = zigzag(delta(raw.astype(np.int64)).T.ravel())
+        packed.append(varint_encode(codes).tostring())
+    else:
+        packed.append(raw.T.astype(schema.raw_dtype.newbyteorder('<')).tostring())
+    values = schema.decode(raw)
+    return compress(''.join(packed), codec), values.min(axis=0), values.max(axis=0)
+#------------------------------------------------------------
+
+
+def decode_chunk(payload, count, schema, codec):
+    """ (timestamps, samples) of a chunk payload holding 'count' samples
+    """
+    data = decompress(payload, codec)
+    codes, used = varint_decode(data, count)
+    timestamps  = np.cumsum(unzigzag(codes)) * TIME_RESOLUTION
+    if schema.raw_dtype.kind in 'iu':
+        codes, _ = varint_decode(buffer(data, used), count * schema.channels)
+        raw = np.cumsum(unzigzag(codes).reshape(schema.channels, count), axis=1).T
+    else:
+        raw = np.frombuffer(data, dtype=schema.raw_dtype.newbyteorder('<'), offset=used,
+                            count=count * schema.channels).reshape(schema.channels, count).T
+    return timestamps, schema.decode(raw)
+#------------------------------------------------------------
+
+
+def index_dtype(schema):
+    """ numpy dtype of one index record
+    """
+    return np.dtype([('t_start', '<f8'), ('t_end', '<f8'),
+                     ('offset',  '<u8'), ('size',  '<u4'), ('count', '<u4'),
+                     ('min',     '<f8', (schema.channels,)),
+                     ('max',     '<f8', (schema.channels,))])
+#------------------------------------------------------------
+
+
+def make_archive_header(schema, codec, chunk_seconds):
+    header = json.dumps(dict(schema        = schema.to_dict(),
+                             codec         = codec,
+                             chunk_seconds = chunk_seconds))
+    size    = len(ARCHIVE_MAGIC) + 4 + len(header)
+    size   += -size % HEADER_ALIGN
+    header  = header.ljust(size - len(ARCHIVE_MAGIC) - 4)
+    return ARCHIVE_MAGIC + struct.pack('<I', size) + header
+#------------------------------------------------------------
+
+
+def read_archive_header(f):
+    """
+    Purpose:    parse the header of an opened archive
+    Return:     (header size, header dict)
+    """
+    start = f.read(len(ARCHIVE_MAGIC) + 4)
+    if len(start) < len(ARCHIVE_MAGIC) + 4 or not start.startswith(ARCHIVE_MAGIC):
+        raise ValueError('%s is not an archive' % getattr(f, 'name', f))
+    size = struct.unpack('<I', start[len(ARCHIVE_MAGIC):])[0]
+    return size, json.loads(f.read(size - len(start)))
+#------------------------------------------------------------
+
+
+
+class ArchiveWriter(object):
+    """ Writes samples to an archive through an opened file. The
+        file is only appended to (it can be a pipe) and is not
+        closed by close().
+
+        schema:
+            The StreamSchema of the samples: the values are stored
+            as its raw counts.
+
+        chunk_seconds:
+            Duration of a chunk. A chunk is written when the samples
+            reach the next one, so about that much of the capture
+            is held in memory.
+
+        codec:
+            'varint' (delta + zigzag + varint packing only), 'zlib'
+            or 'lzma' (the packed chunk compressed again, lzma needs
+            Python 3 or backports.lzma).
+
+        write(timestamps, samples):
+            Append a (N,) timestamps, (N, channels) samples batch.
+
+        close():
+            Write the last chunk and the index.
+    """
+    def __init__(   self,
+                    out,
+                    schema        = DEFAULT_SCHEMA,
+                    chunk_seconds = ARCHIVE_CHUNK_SECONDS,
+                    codec         = ARCHIVE_ZLIB):
+        if codec not in ARCHIVE_CODECS:
+            raise ValueError('unknown archive codec %r' % codec)
+        if codec == ARCHIVE_LZMA and lzma is None:
+            raise ValueError('lzma needs python 3 or backports.lzma')
+        if chunk_seconds <= 0:
+            raise ValueError('the chunk duration must be positive')
+        self.out           = out
+        self.schema        = schema
+        self.chunk_seconds = float(chunk_seconds)
+        self.codec         = codec
+        self.index         = []
+        self.chunk         = None               # number of the chunk being filled
+        self.pending       = []                 # its (timestamps, samples) batches
+        self.count         = 0                  # samples written
+
+        header = make_archive_header(schema, codec, self.chunk_seconds)
+        self.out.write(header)
+        self.offset = len(header)
+    #------------------------------------------------------
+
+
+    def write(self, timestamps, samples):
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if len(timestamps) == 0:
+            return
+        samples = np.asarray(samples, dtype=np.float64).reshape(len(timestamps), -1)
+        chunks  = np.floor(timestamps / self.chunk_seconds).astype(np.int64)
+        cuts    = np.flatnonzero(chunks[1:] != chunks[:-1]) + 1
+        for start, stop in zip(np.r_[0, cuts], np.r_[cuts, len(chunks)]):
+            if chunks[start] != self.chunk:
+                self.flush()
+                self.chunk = chunks[start]
+            self.pending.append((timestamps[start:stop], samples[start:stop]))
+        self.count += len(timestamps)
+    #------------------------------------------------------
+
+
+    def flush(self):
+        """ Write the chunk being filled
+        """
+        if not self.pending:
+            return
+        timestamps = np.concatenate([t for t, s in self.pending])
+        samples    = np.concatenate([s for t, s in self.pending])
+        self.pending = []
+        payload, lo, hi = encode_chunk(timestamps, samples, self.schema, self.codec)
+        self.out.write(CHUNK_HEADER.pack(CHUNK_MAGIC, len(payload), len(timestamps),
+                                         timestamps[0], timestamps[-1]))
+        self.out.write(payload)
+        self.index.append((timestamps[0], timestamps[-1], self.offset,
+                           len(payload), len(timestamps), lo, hi))
+        self.offset += CHUNK_HEADER.size + len(payload)
+    #------------------------------------------------------
+
+
+    def close(self):
+        self.flush()
+        index = np.array(self.index, dtype=index_dtype(self.schema))
+        self.out.write(index.tostring())
+        self.out.write(TRAILER.pack(self.offset, len(index), INDEX_MAGIC))
+        self.out.flush()
+    #------------------------------------------------------
+
+
+
+class Archive(object):
+    """ An archive opened for reading: only the header and the
+        index are read when it is opened, the chunks are read and
+        decompressed when a query touches them.
+
+        index:
+            One record per chunk (see index_dtype): the time range,
+            count and extrema of every chunk, known without
+            decompressing anything.
+
+        recovered:
+            True if the archive had no index (its writer didn't
+            close it) and the index was rebuilt.
+
+        query(t1=None, t2=None, channels=None):
+            (timestamps, samples) of the samples with t1 <= t <= t2
+            (from the start/to the end if None) of the channels
+            given by name or position (all if None).
+
+        blocks():
+            (timestamps, samples) of every chunk in turn.
+    """
+    def __init__(self, path):
+        self.path = path
+        f = open(path, 'rb')
+        try:
+            self.header_size, header = read_archive_header(f)
+            self.schema        = StreamSchema.from_dict(header['schema'])
+            self.codec         = header['codec']
+            self.chunk_seconds = header['chunk_seconds']
+            if self.codec == ARCHIVE_LZMA and lzma is None:
+                raise ValueError('%s is lzma compressed: it needs python 3 or '
+                                 'backports.lzma' % path)
+            self.dtype     = index_dtype(self.schema)
+            self.index     = self.read_index(f)
+            self.recovered = self.index is None
+            if self.recovered:
+                self.index = self.rebuild_index(f)
+        finally:
+            f.close()
+        self.channels = self.schema.names
+    #------------------------------------------------------
+
+
+    def read_index(self, f):
+        """ The index written at the end of the file, None if there
+            is no (valid) index
+        """
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size < self.header_size + TRAILER.size:
+            return None
+        f.seek(size - TRAILER.size)
+        offset, count, magic = TRAILER.unpack(f.read(TRAILER.size))
+        if magic != INDEX_MAGIC or offset + count * self.dtype.itemsize + TRAILER.size != size:
+            return None
+        f.seek(offset)
+        return np.fromstring(f.read(count * self.dtype.itemsize), dtype=self.dtype)
+    #------------------------------------------------------
+
+
+    def rebuild_index(self, f):
+        """ Walk the chunk headers (and decode the chunks for their
+            extrema), a truncated last chunk is ignored
+        """
+        index  = []
+        offset = self.header_size
+        while True:
+            f.seek(offset)
+            head = f.read(CHUNK_HEADER.size)
+            if len(head) < CHUNK_HEADER.size:
+                break
+            magic, size, count, t_start, t_end = CHUNK_HEADER.unpack(head)
+            payload = f.read(size)
+            if magic != CHUNK_MAGIC or len(payload) < size:
+                break
+            try:
+                samples = decode_chunk(payload, count, self.schema, self.codec)[1]
+            except (ValueError, zlib.error):
+                break
+            index.append((t_start, t_end, offset, size, count,
+                          samples.min(axis=0), samples.max(axis=0)))
+            offset += CHUNK_HEADER.size + size
+        return np.array(index, dtype=self.dtype)
+    #------------------------------------------------------
+
+
+    def __len__(self):
+        return int(self.index['count'].sum())
+    #------------------------------------------------------
+
+
+    def time_range(self):
+        """ (first, last) timestamps, None if the archive is empty
+        """
+        if len(self.index) == 0:
+            return None
+        return float(self.index['t_start'].min()), float(self.index['t_end'].max())
+    #------------------------------------------------------
+
+
+    def channel_positions(self, channels):
+        if channels is None:
+            return range(self.schema.channels)
+        positions = []
+        for channel in channels:
+            if channel in self.schema.names:
+                positions.append(self.schema.names.index(channel))
+            elif isinstance(channel, (int, long)) and 0 <= channel < self.schema.channels:
+                positions.append(channel)
+            else:
+                raise ValueError('unknown channel %r (channels: %s)' %
+                                 (channel, ', '.join(self.schema.names)))
+        return positions
+    #------------------------------------------------------
+
+
+    def chunks(self, t1 = None, t2 = None):
+        """ Positions in the index of the chunks overlapping [t1, t2]
+        """
+        touched = np.ones(len(self.index), dtype=bool)
+        if t1 is not None:
+            touched &= self.index['t_end'] >= t1
+        if t2 is not None:
+            touched &= self.index['t_start'] <= t2
+        return np.flatnonzero(touched)
+    #------------------------------------------------------
+
+
+    def read_chunks(self, positions):
+        """ (timestamps, samples) of the chunks at these positions
+            of the index
+        """
+        f = open(self.path, 'rb')
+        try:
+            for i in positions:
+                chunk = self.index[i]
+                f.seek(chunk['offset'] + CHUNK_HEADER.size)
+                yield decode_chunk(f.read(chunk['size']), int(chunk['count']),
+                                   self.schema, self.codec)
+        finally:
+            f.close()
+    #------------------------------------------------------
+
+
+    def blocks(self):
+        return self.read_chunks(range(len(self.index)))
+    #------------------------------------------------------
+
+
+    def query(self, t1 = None, t2 = None, channels = None):
+        positions = self.channel_positions(channels)
+        times, values = [np.empty(0)], [np.empty((0, len(positions)))]
+        for timestamps, samples in self.read_chunks(self.chunks(t1, t2)):
+            keep = np.ones(len(timestamps), dtype=bool)
+            if t1 is not None:
+                keep &= timestamps >= t1
+            if t2 is not None:
+                keep &= timestamps <= t2
+            times.append(timestamps[keep])
+            values.append(samples[keep][:, positions])
+        return np.concatenate(times), np.concatenate(values)
+    #------------------------------------------------------
+
+
+
+def csv_rows(path, block = 1 << 16):
+    """ (timestamps, samples) blocks of 'block' lines of a csv file
+        written by the monitor ('#' lines are skipped), without
+        loading the whole file
+    """
+    f = open(path, 'rb')
+    try:
+        while True:
+            lines = list(itertools.islice(f, block))
+            if not lines:
+                break
+            rows = [line for line in lines if line.strip() and not line.startswith('#')]
+            if not rows:
+                continue
+            columns = rows[0].count(',') + 1
+            data    = np.fromstring(','.join(rows), sep=',')
+            if len(data) != len(rows) * columns:
+                raise ValueError('%s: rows of different lengths near %r' % (path, rows[0]))
+            data = data.reshape(-1, columns)
+            yield data[:, 0], data[:, 1:]
+    finally:
+        f.close()
+#------------------------------------------------------------
+
+
+def convert_csv(paths, path, schema = DEFAULT_SCHEMA,
+                chunk_seconds = ARCHIVE_CHUNK_SECONDS, codec = ARCHIVE_ZLIB):
+    """
+    Purpose:    convert csv files of the monitor (the %H%M%S.csv files of
+                the first versions or the rotated recorder files, given in
+                time order) into one archive
+    Input:      paths: the csv files, path: the archive to create
+    Return:     the number of samples converted
+    """
+    out = open(path, 'wb')
+    try:
+        writer = ArchiveWriter(out, schema, chunk_seconds, codec)
+        for csv_path in paths:
+            for timestamps, samples in csv_rows(csv_path):
+                if samples.shape[1] != schema.channels:
+                    raise ValueError('%s has %d channels, the schema %d' %
+                                     (csv_path, samples.shape[1], schema.channels))
+                writer.write(timestamps, samples)
+        writer.close()
+    finally:
+        out.close()
+    return writer.count
+#------------------------------------------------------------
+
+
+def parse_time(value):
+    return None if value is None else float(value)
+#------------------------------------------------------------
+
+
+def main(argv = None):
+    parser = optparse.OptionParser(usage = __doc__.strip().split('usage: ')[1])
+    parser.add_option('-s', '--schema', default='adxl345',
+                      help='convert: the schema of the csv files, a name (%s) or a '
+                           'json file [%%default]' % ', '.join(sorted(SCHEMAS)))
+    parser.add_option('-c', '--chunk', type='float', default=ARCHIVE_CHUNK_SECONDS,
+                      help='convert: seconds of samples per chunk [%default]')
+    parser.add_option('-z', '--codec', choices=ARCHIVE_CODECS, default=ARCHIVE_ZLIB,
+                      help='convert: varint, zlib or lzma [%default]')
+    parser.add_option('-a', '--axis', action='append', dest='axes',
+                      help='query: a channel to output (all by default), can be repeated')
+    parser.add_option('--from', dest='t1', help='query: first time (s)')
+    parser.add_option('--to', dest='t2', help='query: last time (s)')
+    options, args = parser.parse_args(argv)
+    if len(args) < 2 or args[0] not in ('convert', 'query', 'info'):
+        parser.error('convert, query or info and an archive are required')
+    command, path = args[0], args[1]
+
+    try:
+        if command == 'convert':
+            if len(args) < 3:
+                parser.error('the csv files to convert are required')
+            count = convert_csv(args[2:], path, load_schema(options.schema),
+                                options.chunk, options.codec)
+            csv_size = sum(os.path.getsize(name) for name in args[2:])
+            sys.stderr.write('%d samples, %d -> %d bytes\n' %
+                             (count, csv_size, os.path.getsize(path)))
+            return 0
+
+        archive = Archive(path)
+        if command == 'info':
+            print 'samples  : %d in %d chunks of %g s (%s)' % (len(archive), len(archive.index),
+                                                            archive.chunk_seconds, archive.codec)
+            if archive.recovered:
+                print 'index    : missing, rebuilt from the chunks'
+            if len(archive):
+                print 'time     : %.6f - %.6f s' % archive.time_range()
+                for i, label in enumerate(archive.schema.labels()):
+                    print '%-9s: min %8.4f  max %8.4f' % (label, archive.index['min'][:, i].min(),
+                                                          archive.index['max'][:, i].max())
+            return 0
+
+        positions = archive.channel_positions(options.axes)
+        timestamps, samples = archive.query(parse_time(options.t1), parse_time(options.t2),
+                                            positions)
+        labels = [archive.schema.labels()[i] for i in positions]
+        sys.stdout.write('# %s\n' % ','.join(['t (s)'] + labels))
+        np.savetxt(sys.stdout, np.column_stack((timestamps, samples)), fmt='%.6f', delimiter=',')
+    except (IOError, ValueError), e:
+        sys.stderr.write('%s\n' % e)
+        return 1
+    return 0
+#------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the ADXL345 frame decoding: the legacy per-sample
+ComMonitorThread.getAxes path against the vectorized decode_axes.
+
+usage: python bench_decode.py [nb_frames] [nb_repeat]
+"""
+
+import sys, timeit, random
+import numpy as np
+
+from com_monitor        import ComMonitorThread
+from decoder            import decode_axes
+
+
+def make_frames(n):
+    """ Return n random 6 bytes frames packed back to back
+    """
+    return ''.join(chr(random.randint(0, 255)) for i in xrange(6 * n))
+#------------------------------------------------------
+
+
+def legacy_decode(monitor, raw):
+    """ Per-sample path as done by ComMonitorThread.run: one
+        map(ord) and one getAxes call (dict) per frame
+    """
+    out = []
+    for i in xrange(0, len(raw), 6):
+        axes = monitor.getAxes(map(ord, raw[i:i+6]))
+        out.append([axes['x'], axes['y'], axes['z']])
+    return out
+#------------------------------------------------------
+
+
+def main():
+    n      = int(sys.argv[1]) if len(sys.argv) > 1 else 3200
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    raw     = make_frames(n)
+    monitor = ComMonitorThread(None, None, None, 9600)
+
+    # both paths must agree (the legacy one rounds to 3 decimals)
+    ref = np.array(legacy_decode(monitor, raw))
+    assert np.allclose(ref, decode_axes(raw), atol=1e-3)
+
+    t_legacy = min(timeit.repeat(lambda: legacy_decode(monitor, raw),
+                                 number=1, repeat=repeat))
+    t_vector = min(timeit.repeat(lambda: decode_axes(raw),
+                                 number=1, repeat=repeat))
+
+    print "frames per batch : %d" % n
+    print "legacy getAxes   : %10.1f us/batch  %8.3f us/frame" % (
+                                    t_legacy * 1e6, t_legacy * 1e6 / n)
+    print "decode_axes      : %10.1f us/batch  %8.3f us/frame" % (
+                                    t_vector * 1e6, t_vector * 1e6 / n)
+    print "speed-up         : %10.1fx" % (t_legacy / t_vector)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+"""
+End-to-end throughput and latency benchmark (Linux): a load generator
+writes binary frames at a given sample rate to one end of a pty pair,
+while ComMonitorThread reads and decodes the other end.
+
+For every rate it reports the sustained frames/s, the drop and
+corruption rates, the p50/p99 latency from the write of a frame to the
+put of its decoded samples in data_q, the spread of the timestamps error
+(reconstructed sampling time minus write time) and the CPU time of the
+reader thread per 1000 samples, and saves the results as JSON so they
+can be compared between versions.
+
+The load generator runs in another process and the CPU time is the one
+of the ComMonitorThread alone (CLOCK_THREAD_CPUTIME_ID), so neither the
+generator nor the consumer loop of the benchmark are counted. It is
+also given as a percentage of one core: the reader wakes up every
+port_timeout even without data, a fixed cost the per-sample figure
+spreads over fewer samples at low rates. The
+latency is taken when the reader thread puts the batch, not when the
+benchmark dequeues it: the timed waits of Python 2 sleep in steps (up
+to 50 ms), which would add the harness own wake-up delay.
+
+usage: python bench_pipeline.py [-r 100,1000,3200] [-d 5] [-b 921600]
+                                [-o bench_pipeline.json]
+"""
+
+import os, tty, time, json, Queue, multiprocessing, optparse, platform
+import numpy as np
+
+from com_monitor        import ComMonitorThread
+from codec              import BinaryFrameCodec
+from spsc_ring          import SampleRing, OVERFLOW_BLOCK
+from timestamps         import posix_clock, CLOCK_THREAD_CPUTIME_IDS
+from globals            import *
+
+
+
+class LoadGenerator(multiprocessing.Process):
+    """ A process writing frames to the pty master at 'rate'
+        samples/s, limited to the throughput of a 'baud' serial link
+        (10 bits per byte). The x value of every sample holds the
+        frame number, so the reader side can find the send time of
+        each received frame in send_times (shared memory).
+    """
+    def __init__(self, fd, rate, baud, duration):
+        multiprocessing.Process.__init__(self)
+        self.daemon     = True
+        self.fd         = fd
+        self.codec      = BinaryFrameCodec()
+        self.frame_rate = min(rate / float(self.codec.samples_per_frame),
+                              baud / 10.0 / self.codec.frame_size)
+        self.duration   = duration
+        self.frames     = int(self.frame_rate * duration) + 1
+        self.shared_times = multiprocessing.RawArray('d', self.frames)
+        self.shared_sent  = multiprocessing.RawValue('l', 0)
+        self.send_times = np.frombuffer(self.shared_times)
+    #------------------------------------------------------
+
+
+    @property
+    def sent(self):
+        return self.shared_sent.value
+    #------------------------------------------------------
+
+
+    def run(self):
+        samples = np.zeros((self.codec.samples_per_frame, 3), dtype=np.int16)
+        start   = time.time()
+        sent    = 0
+        while sent < self.frames:
+            due = min(self.frames, int((time.time() - start) * self.frame_rate) + 1)
+            if due > sent:
+                frames = []
+                for n in xrange(sent, due):
+                    samples[:, 0] = n & 0x7FFF
+                    frames.append(self.codec.encode(samples, n))
+                data = ''.join(frames)
+                self.send_times[sent:due] = time.time()
+                while data:
+                    data = data[os.write(self.fd, data):]
+                sent = self.shared_sent.value = due
+            time.sleep(0.001)
+    #------------------------------------------------------
+
+
+
+class StampedRing(SampleRing):
+    """ SampleRing remembering when (time.time()) and how many
+        samples every batch was put, from the reader thread
+    """
+    def __init__(self, *args, **kwargs):
+        SampleRing.__init__(self, *args, **kwargs)
+        self.put_times = []
+    #------------------------------------------------------
+
+
+    def put(self, item, block = True, timeout = None):
+        self.put_times.append((time.time(), len(item[1])))
+        SampleRing.put(self, item, block, timeout)
+    #------------------------------------------------------
+
+
+
+class TimedMonitorThread(ComMonitorThread):
+    """ ComMonitorThread measuring the CPU time of its own thread
+        (cpu_time, None if the platform has no thread CPU clock)
+    """
+    def run(self):
+        clock = posix_clock(CLOCK_THREAD_CPUTIME_IDS)
+        self.cpu_time = None
+        start = clock() if clock is not None else None
+        try:
+            ComMonitorThread.run(self)
+        finally:
+            if clock is not None:
+                self.cpu_time = clock() - start
+    #------------------------------------------------------
+
+
+
+def run_rate(rate, baud, duration):
+    """ Run the pipeline for 'duration' seconds at 'rate' samples/s
+        and return its measures
+    """
+    master, slave = os.openpty()
+    tty.setraw(slave)
+
+    # blocking policy: the samples dequeued are the samples put, in order
+    data_q   = StampedRing(DATA_RING_CAPACITY, policy = OVERFLOW_BLOCK)
+    error_q  = Queue.Queue()
+    monitor  = TimedMonitorThread(data_q, error_q, os.ttyname(slave), baud)
+    monitor.start()
+    time.sleep(0.2)
+    error = get_item_from_queue(error_q, 0)
+    if error is not None:
+        raise IOError(error)
+
+    generator = LoadGenerator(master, rate, baud, duration)
+    generator.start()
+
+    sent_at   = []
+    errors    = []
+    received  = 0
+    deadline  = time.time() + duration + 1.0
+    spf       = generator.codec.samples_per_frame
+    while time.time() < deadline:
+        try:
+            samples, timestamps = data_q.get(True, 0.1)
+        except Queue.Empty:
+            continue
+        # frame numbers from the x value of the first sample of each frame
+        # (15 bits, unwrapped around the number of frames received so far)
+        expected = received // spf
+        frames   = np.rint(samples[::spf, 0] / SCALE_MULTIPLIER).astype(np.int64)
+        frames  += expected & ~0x7FFF
+        frames[frames < expected - 0x4000] += 0x8000
+        frames[frames > expected + 0x4000] -= 0x8000
+        sent     = generator.send_times[np.clip(frames, 0, generator.frames - 1)]
+        sent_at.append(sent)
+        errors.append(monitor.start_time + timestamps[::spf] - sent)
+        received += len(samples)
+        if received >= generator.frames * spf and not generator.is_alive():
+            break
+
+    monitor.join(1.0)
+    generator.join(1.0)
+    os.close(master)
+    os.close(slave)
+
+    codec     = monitor.framer
+    sent      = generator.sent
+    cpu       = monitor.cpu_time
+    # put time of the first sample of every frame received
+    if sent_at:
+        times, counts = zip(*data_q.put_times)
+        sent_at   = np.concatenate(sent_at)
+        put_at    = np.repeat(times, counts)[::spf][:len(sent_at)]
+        latencies = put_at - sent_at[:len(put_at)]
+    else:
+        latencies = np.zeros(1)
+    # the clock estimate needs a few reads: skip the first 10%
+    errors    = np.concatenate(errors) if errors else np.zeros(1)
+    errors    = errors[len(errors) // 10:]
+    return dict(rate_requested  = rate,
+                baud            = baud,
+                duration        = duration,
+                frames_sent     = sent,
+                frames_received = codec.frames_decoded,
+                frames_per_s    = codec.frames_decoded / float(duration),
+                samples_per_s   = received / float(duration),
+                drop_rate       = 1.0 - codec.frames_decoded / float(max(1, sent)),
+                corruption_rate = codec.frames_corrupted / float(max(1, sent)),
+                ring_overflows  = data_q.overflows,
+                latency_p50_ms  = float(np.percentile(latencies, 50) * 1e3),
+                latency_p99_ms  = float(np.percentile(latencies, 99) * 1e3),
+                timestamp_std_ms = float(errors.std() * 1e3),
+                cpu_percent     = None if cpu is None else 100.0 * cpu / duration,
+                cpu_ms_per_1k   = None if cpu is None else cpu * 1e6 / max(1, received))
+#------------------------------------------------------------
+
+
+def main(argv = None):
+    parser = optparse.OptionParser(usage = "python bench_pipeline.py [options]")
+    parser.add_option('-r', '--rates', default='100,1000,3200',
+                      help='comma separated sample rates [%default]')
+    parser.add_option('-d', '--duration', type='float', default=5.0,
+                      help='seconds per rate [%default]')
+    parser.add_option('-b', '--baud', type='int', default=921600,
+                      help='emulated baud rate [%default]')
+    parser.add_option('-o', '--output', default='bench_pipeline.json',
+                      help='json results file [%default]')
+    options, args = parser.parse_args(argv)
+
+    results = []
+    for rate in [float(r) for r in options.rates.split(',')]:
+        result = run_rate(rate, options.baud, options.duration)
+        results.append(result)
+        print "%7d samples/s: %8.1f frames/s  drop %5.2f%%  corrupt %5.2f%%  " \
+              "p50 %6.2f ms  p99 %6.2f ms  timestamps +/-%5.2f ms  cpu %5.1f%% %6.2f ms/1k samples" % (
+                rate, result['frames_per_s'], 100 * result['drop_rate'],
+                100 * result['corruption_rate'], result['latency_p50_ms'],
+                result['latency_p99_ms'], result['timestamp_std_ms'],
+                result['cpu_percent'] or 0.0, result['cpu_ms_per_1k'] or 0.0)
+
+    f = open(options.output, 'w')
+    try:
+        json.dump(dict(python   = platform.python_version(),
+                       numpy    = np.__version__,
+                       time     = time.strftime("%Y-%m-%d %H:%M:%S"),
+                       results  = results), f, indent=2)
+    finally:
+        f.close()
+
+
+if __name__ == "__main__":
+    main()
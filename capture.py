@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+"""
+Headless capture: reads a serial port with ComMonitorThread and streams
+the decoded samples to a file or to stdout, without any GUI import.
+
+usage: python -m capture PORT [-b BAUD] [-p binary|line] [-s SCHEMA]
+                              [-f csv|jsonl|binary|archive|summary] [-o FILE]
+                              [-d SECONDS] [-n SAMPLES] [-m METRICS.json]
+                              [-r HZ [-i linear|sinc]]
+                              [--overflow drop-oldest|drop-newest|block]
+"""
+
+import sys, Queue, time, json, optparse
+import numpy as np
+
+from com_monitor        import ComMonitorThread
+from spsc_ring          import SampleRing, OVERFLOW_POLICIES, OVERFLOW_BLOCK
+from resampler          import StreamResampler
+from recording          import make_header, to_records
+from archive            import ArchiveWriter
+from schema             import SCHEMAS, load_schema
+from metrics            import METRICS
+from port_discovery     import resolve_port
+from globals            import *
+
+
+
+class CsvSink(object):
+    """ timestamp,channels... rows, same as the monitor csv files
+    """
+    def __init__(self, out, schema):
+        self.out = out
+        self.out.write('# %s\n' % ','.join(['t (s)'] + schema.labels()))
+
+    def write(self, timestamps, samples):
+        np.savetxt(self.out, np.column_stack((timestamps, samples)),
+                   fmt='%.6f', delimiter=',')
+
+    def close(self):
+        pass
+#------------------------------------------------------------
+
+
+class JsonLinesSink(object):
+    """ one {"t": ..., "x": ..., "y": ..., "z": ...} object per line,
+        named after the channels of the schema
+    """
+    def __init__(self, out, schema):
+        self.out   = out
+        self.names = ['t'] + schema.names
+
+    def write(self, timestamps, samples):
+        lines = [json.dumps(dict(zip(self.names, row)))
+                 for row in np.column_stack((timestamps, samples)).tolist()]
+        self.out.write('\n'.join(lines) + '\n')
+
+    def close(self):
+        pass
+#------------------------------------------------------------
+
+
+class BinarySink(object):
+    """ binary recording (see recording.py)
+    """
+    def __init__(self, out, schema):
+        self.out    = out
+        self.schema = schema
+        self.out.write(make_header(schema))
+
+    def write(self, timestamps, samples):
+        self.out.write(to_records(timestamps, samples, self.schema).tostring())
+
+    def close(self):
+        pass
+#------------------------------------------------------------
+
+
+class SummarySink(object):
+    """ nothing is written while capturing, the number of samples,
+        the rate and per-axis statistics are printed at the end
+    """
+    def __init__(self, out, schema):
+        self.out   = out
+        self.names = schema.names
+        self.count = 0
+        self.first = None
+        self.last  = None
+        self.sum   = np.zeros(schema.channels)
+        self.sum2  = np.zeros(schema.channels)
+        self.min   = np.empty(schema.channels)
+        self.min.fill(np.inf)
+        self.max   = -self.min
+
+    def write(self, timestamps, samples):
+        if self.first is None:
+            self.first = timestamps[0]
+        self.last   = timestamps[-1]
+        self.count += len(samples)
+        self.sum   += samples.sum(axis=0)
+        self.sum2  += (samples * samples).sum(axis=0)
+        self.min    = np.minimum(self.min, samples.min(axis=0))
+        self.max    = np.maximum(self.max, samples.max(axis=0))
+
+    def close(self):
+        self.out.write('samples  : %d\n' % self.count)
+        if self.count == 0:
+            return
+        duration = self.last - self.first
+        if duration > 0:
+            self.out.write('duration : %.3f s\n' % duration)
+            self.out.write('rate     : %.1f samples/s\n' % (self.count / duration))
+        mean = self.sum / self.count
+        rms  = np.sqrt(self.sum2 / self.count)
+        for i, axis in enumerate(self.names):
+            self.out.write('%-9s: mean %8.4f  rms %8.4f  min %8.4f  max %8.4f\n' %
+                           (axis, mean[i], rms[i], self.min[i], self.max[i]))
+#------------------------------------------------------------
+
+
+class ArchiveSink(object):
+    """ chunked compressed archive (see archive.py)
+    """
+    def __init__(self, out, schema):
+        self.writer = ArchiveWriter(out, schema)
+
+    def write(self, timestamps, samples):
+        self.writer.write(timestamps, samples)
+
+    def close(self):
+        self.writer.close()
+#------------------------------------------------------------
+
+
+SINKS = dict(csv = CsvSink, jsonl = JsonLinesSink,
+             binary = BinarySink, archive = ArchiveSink, summary = SummarySink)
+
+
+def capture(com_monitor, data_q, error_q, sink, duration = None, count = None,
+            resampler = None):
+    """
+    Purpose:    stream the samples of a started com monitor to a sink
+    Input:      duration: stop after this many seconds (None: no limit)
+                count: stop after this many samples (None: no limit)
+                resampler: a StreamResampler the samples go through
+    Return:     the number of samples written
+    """
+    start   = time.time()
+    written = 0
+    while True:
+        error = get_item_from_queue(error_q, 0)
+        if error is not None:
+            raise IOError(error)
+
+        remaining = None
+        if duration is not None:
+            remaining = duration - (time.time() - start)
+            if remaining <= 0:
+                break
+        try:
+            samples, timestamps = data_q.get(True, 0.1 if remaining is None
+                                                  else min(0.1, remaining))
+        except Queue.Empty:
+            if not com_monitor.isAlive():
+                # the monitor reports why it stopped before exiting
+                error = get_item_from_queue(error_q, 0)
+                if error is not None:
+                    raise IOError(error)
+                break
+            continue
+
+        if resampler is not None:
+            timestamps, samples = resampler.push(timestamps, samples)
+            if len(samples) == 0:
+                continue
+        if count is not None and written + len(samples) > count:
+            samples    = samples[:count - written]
+            timestamps = timestamps[:count - written]
+        sink.write(timestamps, samples)
+        written += len(samples)
+        if count is not None and written >= count:
+            break
+    return written
+#------------------------------------------------------------
+
+
+def main(argv = None):
+    parser = optparse.OptionParser(usage = "python -m capture PORT [options]")
+    parser.add_option('-b', '--baud', type='int', default=9600,
+                      help='baud rate [%default]')
+    parser.add_option('-p', '--protocol', choices=['binary', 'line'], default='binary',
+                      help='binary or line (legacy text frames) [%default]')
+    parser.add_option('-s', '--schema', default='adxl345',
+                      help='stream schema: %s or a json file [%%default]' %
+                           ', '.join(sorted(SCHEMAS)))
+    parser.add_option('-f', '--format', choices=sorted(SINKS), default='csv',
+                      help='csv, jsonl, binary, archive or summary [%default]')
+    parser.add_option('-o', '--output', default='-',
+                      help='output file, - for stdout [%default]')
+    parser.add_option('-d', '--duration', type='float',
+                      help='stop after this many seconds')
+    parser.add_option('-n', '--count', type='int',
+                      help='stop after this many samples')
+    parser.add_option('-m', '--metrics',
+                      help='write the pipeline metrics as JSON to this file')
+    parser.add_option('-r', '--resample', type='float',
+                      help='resample the samples at this rate (Hz) on a uniform grid')
+    parser.add_option('-i', '--interpolation', choices=RESAMPLE_METHODS, default='linear',
+                      help='resampling interpolation: linear or sinc [%default]')
+    parser.add_option('--overflow', choices=OVERFLOW_POLICIES, default=OVERFLOW_BLOCK,
+                      help='when the output falls behind: drop-oldest, drop-newest '
+                           'or block the reception [%default]')
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('a serial port is required')
+    try:
+        schema = load_schema(options.schema)
+    except ValueError, e:
+        parser.error(str(e))
+
+    resampler = None
+    if options.resample:
+        resampler = StreamResampler(options.resample, options.interpolation)
+
+    if options.output == '-':
+        out = sys.stdout
+    else:
+        out = open(options.output, 'wb')
+
+    data_q      = SampleRing(DATA_RING_CAPACITY, schema.channels, policy = options.overflow)
+    error_q     = Queue.Queue()
+    # PORT is a device or its /dev/serial/by-id name
+    com_monitor = ComMonitorThread(data_q, error_q, resolve_port(args[0]), options.baud,
+                                   port_protocol = options.protocol,
+                                   schema        = schema)
+    com_monitor.daemon = True
+    com_monitor.start()
+
+    sink = SINKS[options.format](out, schema)
+    try:
+        try:
+            capture(com_monitor, data_q, error_q, sink,
+                    options.duration, options.count, resampler)
+        except KeyboardInterrupt:
+            pass
+        except IOError, e:
+            sys.stderr.write('capture error: %s\n' % e)
+            return 1
+    finally:
+        com_monitor.join(1.0)
+        sink.close()
+        METRICS.gauge('data_q_overflows').set(data_q.overflows)
+        if data_q.overflows:
+            sys.stderr.write('%d samples lost, the output was too slow\n' % data_q.overflows)
+        if out is not sys.stdout:
+            out.close()
+        if options.metrics:
+            f = open(options.metrics, 'w')
+            try:
+                METRICS.dump(f)
+            finally:
+                f.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import struct
+import numpy as np
+
+
+
+#===============================================================================
+# Binary frame format (all fields little-endian):
+#
+#   +--------+--------+-----------------------------------------+--------+
+#   |  sync  |  seq   |  payload                                |  crc   |
+#   | A5 5A  | uint16 |  samples_per_frame x channels x int16   | uint16 |
+#   +--------+--------+-----------------------------------------+--------+
+#
+# The channels are int16 by default, any other numpy type can be used
+# (see schema.py).
+# crc is a CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) of seq + payload.
+# With the default 4 samples of 3 axes per frame, a frame is 30 bytes for
+# 4 samples, where the legacy text format needs 48 bytes.
+#===============================================================================
+SYNC_WORD           = '\xa5\x5a'
+SYNC_0, SYNC_1      = 0xA5, 0x5A
+CRC_INIT            = 0xFFFF
+CRC_POLY            = 0x1021
+SAMPLES_PER_FRAME   = 4
+
+
+def _crc16_table():
+    table = np.zeros(256, dtype=np.uint32)
+    for i in range(256):
+        crc = i << 8
+        for bit in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ CRC_POLY) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+        table[i] = crc
+    return table
+
+CRC16_TABLE = _crc16_table()
+
+
+def crc16(data):
+    """ CRC-16/CCITT-FALSE of a string of bytes
+    """
+    crc = CRC_INIT
+    for c in bytearray(data):
+        crc = ((crc << 8) & 0xFFFF) ^ int(CRC16_TABLE[((crc >> 8) ^ c) & 0xFF])
+    return crc
+#------------------------------------------------------------
+
+
+def crc16_rows(rows):
+    """ Vectorized CRC-16/CCITT-FALSE: one crc per row of the uint8
+        array rows (the loop runs over the columns, not the frames)
+    """
+    crc = np.empty(len(rows), dtype=np.uint32)
+    crc.fill(CRC_INIT)
+    for col in range(rows.shape[1]):
+        crc = ((crc << 8) & 0xFFFF) ^ CRC16_TABLE[((crc >> 8) ^ rows[:, col]) & 0xFF]
+    return crc
+#------------------------------------------------------------
+
+
+
+class BinaryFrameCodec(object):
+    """ Encoder and incremental resynchronizing parser of the
+        binary frame format.
+
+        channels/samples_per_frame/dtype:
+            Layout of the payload, which must be the same on
+            both ends of the link.
+
+        feed(data):
+            Append a received chunk and return the raw samples
+            of all the valid frames it completes. Partial frames
+            are carried over to the next call.
+
+        Counters:
+            frames_decoded   - frames with a valid crc
+            frames_corrupted - frames starting with a sync word
+                               but failing the crc check
+            frames_rejected  - resynchronizations (corrupted frames
+                               and bytes sequences without a frame)
+            frames_lost      - frames missing from the sequence
+                               counter (corrupted ones included)
+            last_sequences   - sequence numbers of the frames
+                               returned by the last feed()
+    """
+    def __init__(   self,
+                    channels          = 3,
+                    samples_per_frame = SAMPLES_PER_FRAME,
+                    capacity          = 4096,
+                    dtype             = '<i2'):
+        self.channels          = channels
+        self.samples_per_frame = samples_per_frame
+        self.dtype             = np.dtype(dtype)
+        self.payload_size      = self.dtype.itemsize * channels * samples_per_frame
+        self.frame_size        = 2 + 2 + self.payload_size + 2
+
+        self.buffer            = bytearray(max(capacity, 2 * self.frame_size))
+        self.fill              = 0
+        self.next_seq          = None
+        self.frames_decoded    = 0
+        self.frames_corrupted  = 0
+        self.frames_rejected   = 0
+        self.frames_lost       = 0
+        self.last_sequences    = np.empty(0, dtype=np.uint16)
+
+        self.trailer           = struct.Struct('<H')
+    #------------------------------------------------------
+
+
+    def encode(self, samples, seq):
+        """
+        Purpose:    build one frame
+        Input:      samples: raw values, samples_per_frame x channels
+                    seq: the frame sequence counter (wrapped on 16 bits)
+        Return:     the frame as a string of bytes
+        """
+        payload = np.asarray(samples, dtype=self.dtype).tostring()
+        if len(payload) != self.payload_size:
+            raise ValueError('expected %d payload bytes, got %d' %
+                             (self.payload_size, len(payload)))
+        body = struct.pack('<H', seq & 0xFFFF) + payload
+        return SYNC_WORD + body + self.trailer.pack(crc16(body))
+    #------------------------------------------------------
+
+
+    def _append(self, data):
+        n = len(data)
+        if self.fill + n > len(self.buffer):
+            self.buffer.extend(bytearray(self.fill + n - len(self.buffer)))
+        self.buffer[self.fill:self.fill + n] = data
+        self.fill += n
+    #------------------------------------------------------
+
+
+    def _count_lost(self, seqs):
+        """ Update frames_lost from the gaps in the sequence counter
+        """
+        if self.next_seq is not None:
+            gaps = (int(seqs[0]) - self.next_seq) & 0xFFFF
+        else:
+            gaps = 0
+        if len(seqs) > 1:
+            gaps += int((((np.diff(seqs.astype(np.int32))) - 1) & 0xFFFF).sum())
+        self.frames_lost += int(gaps)
+        self.next_seq     = (int(seqs[-1]) + 1) & 0xFFFF
+    #------------------------------------------------------
+
+
+    def feed(self, data):
+        """
+        Purpose:    append a received chunk and decode the complete frames
+        Input:      data: the bytes read from the port
+        Return:     an array of shape (N * samples_per_frame, channels) of dtype
+        """
+        self._append(data)
+        size  = self.frame_size
+        buf   = np.frombuffer(self.buffer, dtype=np.uint8, count=self.fill)
+        pos   = 0
+        found = []
+
+        while self.fill - pos >= size:
+            k      = (self.fill - pos) // size
+            frames = buf[pos:pos + k * size].reshape(k, size)
+
+            valid  = (frames[:, 0] == SYNC_0) & (frames[:, 1] == SYNC_1)
+            crc    = frames[:, -2].astype(np.uint32) | (frames[:, -1].astype(np.uint32) << 8)
+            valid &= crc16_rows(frames[:, 2:-2]) == crc
+
+            bad    = np.flatnonzero(~valid)
+            ngood  = bad[0] if len(bad) else k
+            if ngood:
+                found.append(frames[:ngood].copy())
+                pos += ngood * size
+            if ngood == k:
+                break
+
+            # a frame failed: skip its sync word and look for the next one
+            self.frames_rejected += 1
+            if buf[pos] == SYNC_0 and buf[pos + 1] == SYNC_1:
+                self.frames_corrupted += 1
+            window = buf[pos + 1:self.fill]
+            sync   = np.flatnonzero((window[:-1] == SYNC_0) & (window[1:] == SYNC_1))
+            if len(sync) == 0:
+                # keep a possible first half of a sync word
+                pos = self.fill - 1 if window[-1] == SYNC_0 else self.fill
+            else:
+                pos += 1 + sync[0]
+
+        # carry the partial frame over to the next read
+        rest = self.fill - pos
+        if pos:
+            self.buffer[:rest] = self.buffer[pos:self.fill]
+        self.fill = rest
+
+        if not found:
+            self.last_sequences = np.empty(0, dtype=np.uint16)
+            return np.empty((0, self.channels), dtype=self.dtype)
+
+        frames = np.concatenate(found) if len(found) > 1 else found[0]
+        seqs   = frames[:, 2:4].copy().view('<u2').ravel()
+        self._count_lost(seqs)
+        self.last_sequences  = seqs
+        self.frames_decoded += len(frames)
+
+        payload = np.ascontiguousarray(frames[:, 4:-2]).view(self.dtype)
+        return payload.reshape(-1, self.channels)
+    #------------------------------------------------------
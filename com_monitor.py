@@ -1,6 +1,9 @@
 
 import Queue, threading, time, serial
 from globals            import *
+from schema             import DEFAULT_SCHEMA, create_framer
+from timestamps         import SampleClock, monotonic, wire_period
+from metrics            import METRICS
 
 
 
@@ -10,10 +13,13 @@ class ComMonitorThread(threading.Thread):
     
         data_q:
             Queue for received data. Items in the queue are
-            (data, timestamp) pairs, where data is a binary 
-            string representing the received data, and timestamp
-            is the time elapsed from the thread's start (in 
-            seconds).
+            (samples, timestamps) pairs, where samples is an
+            (N, channels) array of the values decoded from one
+            read, and timestamps an (N,) array of the sampling
+            times from the thread's start (in seconds), as
+            reconstructed by a SampleClock (see timestamps.py)
+            from the read times on a monotonic clock and the
+            frames sequence numbers.
         
         error_q:
             Queue for error messages. In particular, if the 
@@ -32,6 +38,20 @@ class ComMonitorThread(threading.Thread):
             value is low, the thread will return data in finer
             grained chunks, with more accurate timestamps, but
             it will also consume more CPU.
+
+        port_read_size:
+            Number of bytes requested per read. If None, all the
+            bytes waiting in the OS buffer are read at once (at
+            least one, blocking up to port_timeout), so the number
+            of reads doesn't grow with the baud rate.
+
+        port_protocol:
+            'binary' for the framed binary protocol (see codec.py)
+            or 'line' for the legacy space separated text frames.
+
+        schema:
+            The StreamSchema of the samples (see schema.py), the
+            ADXL345 x, y, z accelerations by default.
     """
     def __init__(   self, 
                     data_q, error_q, 
@@ -39,7 +59,10 @@ class ComMonitorThread(threading.Thread):
                     port_baud,
                     port_stopbits = serial.STOPBITS_ONE,
                     port_parity   = serial.PARITY_NONE,
-                    port_timeout  = 0.01):
+                    port_timeout  = 0.01,
+                    port_read_size = None,
+                    port_protocol  = 'binary',
+                    schema         = DEFAULT_SCHEMA):
         threading.Thread.__init__(self)
         
         self.serial_port = None
@@ -49,6 +72,13 @@ class ComMonitorThread(threading.Thread):
                                  parity    = port_parity,
                                  timeout   = port_timeout)
 
+        self.read_block = port_read_size
+        self.protocol   = port_protocol
+        self.schema     = schema
+        self.framer     = None                  # frame parser, created by run()
+        self.clock      = None                  # SampleClock, created by run()
+        self.start_time = None                  # time.time() of the timestamps origin
+
         self.data_q   = data_q
         self.error_q  = error_q
         
@@ -57,8 +87,32 @@ class ComMonitorThread(threading.Thread):
     #------------------------------------------------------
 
 
+    def read_size(self):
+        """ Number of bytes to request on the next read
+        """
+        if self.read_block:
+            return self.read_block
+        try:
+            waiting = self.serial_port.in_waiting
+        except AttributeError:
+            # pyserial < 3.0
+            waiting = self.serial_port.inWaiting()
+        return max(1, waiting)
+    #------------------------------------------------------
+
+
+    def create_framer(self):
+        """ Return the incremental frame parser of the selected protocol
+        """
+        return create_framer(self.protocol, self.schema)
+    #------------------------------------------------------
+
+
     def getAxes(self, bytes, gforce = True):
-        
+        """ Legacy per-sample decoding of one frame, kept as the
+            reference implementation (see bench_decode.py). The
+            reception loop uses the vectorized StreamSchema.decode.
+        """
         x = bytes[0] | (bytes[1] << 8)
         
         if(x & (1 << 16 - 1)):
@@ -95,42 +149,58 @@ class ComMonitorThread(threading.Thread):
                 self.serial_port.close()
             self.serial_port = serial.Serial(**self.serial_arg)
         except serial.SerialException, e:
-            self.error_q.put(e.message)
+            self.error_q.put(str(e))
             return
         
-        # Restart the clock
-        startTime = time.time()
+        # Restart the clock: the timestamps are taken on the monotonic
+        # clock, start_time gives their origin on the wall clock
+        self.start_time = time.time()
+        startTime       = monotonic()
+
+        self.framer = framer = self.create_framer()
+        samples_per_frame = getattr(framer, 'samples_per_frame', 1)
+        self.clock  = clock  = SampleClock(samples_per_frame = samples_per_frame,
+                                           link_period       = wire_period(framer.frame_size,
+                                                                  samples_per_frame,
+                                                                  self.serial_port.baudrate))
+
+        bytes_read      = METRICS.counter('bytes_read')
+        frames_decoded  = METRICS.counter('frames_decoded')
+        frames_rejected = METRICS.counter('frames_rejected')
+        read_time       = METRICS.histogram('read_time')
+        decode_time     = METRICS.histogram('decode_time')
+        sample_rate     = METRICS.gauge('sample_rate')
+        read_latency    = METRICS.gauge('read_latency')
+        decoded         = 0
+        rejected        = 0
         
         while self.alive.isSet():
-          
-            Line = self.serial_port.readline()
-            bytes = Line.split()
-            print bytes
-            #use map(int) for simulation
-            data = map(ord, bytes)
-            qdata = [0,0,0]
-            if len(data) == 6:
-                timestamp = time.time() - startTime
-                #data = list(map(ord, list(Line)))
-
-                print "Line", Line
-                print "bytes", bytes
-                print "data", data
-                
-                axes = self.getAxes(data)
-
-                print "   x = %.3fG" % ( axes['x'] )
-                print "   y = %.3fG" % ( axes['y'] )
-                print "   z = %.3fG" % ( axes['z'] )
-                
-                qdata[0] = axes['x']
-                qdata[1] = axes['y']
-                qdata[2] = axes['z']
-                print "qdata :", qdata
-                timestamp = time.clock()
-                self.data_q.put((qdata, timestamp))
-
-               
+
+            t0    = monotonic()
+            chunk = self.serial_port.read(self.read_size())
+            t1    = monotonic()
+            read_time.observe(t1 - t0)
+            if not chunk:
+                continue
+            bytes_read.inc(len(chunk))
+
+            frames = framer.feed(chunk)
+            if framer.frames_rejected != rejected:
+                frames_rejected.inc(framer.frames_rejected - rejected)
+                rejected = framer.frames_rejected
+            if len(frames) == 0:
+                continue
+
+            samples    = self.schema.decode(frames)
+            timestamps = clock.stamp(t1 - startTime, len(samples),
+                                     getattr(framer, 'last_sequences', None))
+            self.data_q.put((samples, timestamps))
+            sample_rate.set(clock.rate)
+            read_latency.set(clock.latency)
+
+            frames_decoded.inc(framer.frames_decoded - decoded)
+            decoded = framer.frames_decoded
+            decode_time.observe(monotonic() - t1)
             
         # clean up
         if self.serial_port:
@@ -0,0 +1,158 @@
+import numpy as np
+
+
+
+def minmax_positions(y, bucket):
+    """
+    Purpose:    per bucket min/max reduction of a signal
+    Input:      y: (N,) or (channels, N) array
+                bucket: number of samples per bucket
+    Return:     the (channels, 2 * nb_buckets) positions of the min and max
+                of each bucket, in time order (the last bucket may be partial)
+    """
+    y = np.atleast_2d(y)
+    n = y.shape[1]
+    if n == 0:
+        return np.empty((y.shape[0], 0), dtype=np.intp)
+
+    full = n // bucket
+    pos  = []
+    if full:
+        blocks = y[:, :full * bucket].reshape(y.shape[0], full, bucket)
+        offset = np.arange(full) * bucket
+        pos.append((blocks.argmin(axis=2) + offset, blocks.argmax(axis=2) + offset))
+    if full * bucket < n:
+        rest = y[:, full * bucket:]
+        pos.append((rest.argmin(axis=1)[:, None] + full * bucket,
+                    rest.argmax(axis=1)[:, None] + full * bucket))
+
+    imin = np.concatenate([p[0] for p in pos], axis=1)
+    imax = np.concatenate([p[1] for p in pos], axis=1)
+
+    # each pixel column keeps its two extrema, the first one first
+    out = np.empty((y.shape[0], 2 * imin.shape[1]), dtype=np.intp)
+    out[:, 0::2] = np.minimum(imin, imax)
+    out[:, 1::2] = np.maximum(imin, imax)
+    return out
+#------------------------------------------------------------
+
+
+def lttb_positions(t, y, n_out):
+    """
+    Purpose:    Largest-Triangle-Three-Buckets downsampling
+    Input:      t, y: (N,) arrays
+                n_out: number of points to keep (>= 3)
+    Return:     the positions of the n_out selected points
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # bucket edges of the n - 2 inner points
+    edges = (np.arange(n_out - 1) * (n - 2) / float(n_out - 2)).astype(np.intp) + 1
+    edges[-1] = n - 1
+
+    out    = np.empty(n_out, dtype=np.intp)
+    out[0] = 0
+    out[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        # average point of the next bucket
+        tc = t[nlo:nhi].mean()
+        yc = y[nlo:nhi].mean()
+        area = np.abs((t[a] - tc) * (y[lo:hi] - y[a]) -
+                      (t[a] - t[lo:hi]) * (yc - y[a]))
+        a = lo + area.argmax()
+        out[i + 1] = a
+    return out
+#------------------------------------------------------------
+
+
+
+class MinMaxDecimator(object):
+    """ Incremental per-pixel min/max decimation of a SampleRingBuffer.
+
+        The history is cut into buckets of a fixed number of
+        samples, aligned on the absolute sample index, so a bucket
+        never changes once it is full: only the buckets completed
+        since the last call (and the partial first and last ones)
+        are reduced, whatever the window length.
+
+        positions(history, width):
+            Return, per channel, the positions in the current
+            window (history.times()) of the points to plot for a
+            canvas 'width' pixels wide, or None when the window is
+            small enough to be plotted as is.
+    """
+    def __init__(self):
+        self.reset(0, 0)
+    #------------------------------------------------------
+
+
+    def reset(self, bucket, nb_buckets):
+        self.bucket     = bucket
+        self.next_start = None                  # first not reduced bucket
+        self.ifirst     = None                  # cached extrema of each bucket
+        self.ilast      = None
+        self.nb_buckets = nb_buckets
+        self.generation = None                  # history.generation the cache is built on
+    #------------------------------------------------------
+
+
+    def positions(self, history, width):
+        n = len(history)
+        width = max(1, width)
+        if n <= 2 * width:
+            return None
+
+        # power of 2 bucket size: it only changes a few times while
+        # the window fills up, and each pixel gets 1 or 2 buckets
+        bucket = 1 << int(np.ceil(np.log2(n / float(width))))
+        nb_buckets = history.capacity // bucket + 2
+        if bucket != self.bucket or nb_buckets != self.nb_buckets:
+            self.reset(bucket, nb_buckets)
+            self.ifirst = np.zeros((history.channels, nb_buckets), dtype=np.int64)
+            self.ilast = np.zeros((history.channels, nb_buckets), dtype=np.int64)
+
+        first  = history.total - n                  # absolute index of the window start
+        k0     = -(-first // bucket)                # first bucket fully in the window
+        k1     = history.total // bucket            # end of the full buckets
+        if self.next_start is None or self.next_start > k1 or self.next_start < k0 \
+           or history.generation != self.generation:
+            # first call, history cleared or too long since the last one
+            self.next_start = k0
+        self.generation = history.generation
+
+        values = history.values_view()
+
+        # reduce the newly completed buckets
+        if k1 > self.next_start:
+            lo    = self.next_start * bucket - first
+            hi    = k1 * bucket - first
+            pos   = minmax_positions(values[:, lo:hi], bucket) + (first + lo)
+            slots = np.arange(self.next_start, k1) % nb_buckets
+            self.ifirst[:, slots] = pos[:, 0::2]
+            self.ilast[:, slots] = pos[:, 1::2]
+            self.next_start = k1
+
+        parts = []
+        # partial head bucket, samples before the first aligned bucket
+        head = k0 * bucket - first
+        if head > 0:
+            parts.append(minmax_positions(values[:, :min(head, n)], bucket))
+        # cached full buckets
+        if k1 > k0:
+            slots = np.arange(k0, k1) % nb_buckets
+            cached = np.empty((history.channels, 2 * len(slots)), dtype=np.int64)
+            cached[:, 0::2] = self.ifirst[:, slots]
+            cached[:, 1::2] = self.ilast[:, slots]
+            parts.append(cached - first)
+        # partial tail bucket, recomputed on every call
+        tail = max(k1 * bucket - first, head)
+        if tail < n:
+            parts.append(minmax_positions(values[:, tail:], bucket) + tail)
+
+        return np.concatenate(parts, axis=1)
+    #------------------------------------------------------
@@ -0,0 +1,26 @@
+from globals            import *
+from schema             import DEFAULT_SCHEMA
+
+
+
+# Raw ADXL345 axes as sent on the wire: 3 x little-endian two's complement int16
+AXES_DTYPE = DEFAULT_SCHEMA.raw_dtype
+AXES_COUNT = DEFAULT_SCHEMA.channels
+
+
+def decode_axes(frames, gforce = True, schema = DEFAULT_SCHEMA):
+    """
+    Purpose:    vectorized decoding of a batch of frames
+    Input:      frames: raw payload bytes (str, bytearray, buffer) holding
+                N frames of 6 bytes (x0 x1 y0 y1 z0 z1) packed back to back,
+                or an uint8 array of shape (N, 6), or an already decoded
+                int16 array of shape (N, 3) (the layout of another schema)
+                gforce: if False, the values are converted to m/s^2
+                schema: the StreamSchema of the samples
+    Return:     a float64 array of shape (N, channels)
+    """
+    samples = schema.decode(frames)
+    if gforce == False:
+        samples *= EARTH_GRAVITY_MS2
+    return samples
+#------------------------------------------------------
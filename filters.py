@@ -0,0 +1,250 @@
+import numpy as np
+
+try:
+    from scipy.signal import sosfilt
+except ImportError:
+    sosfilt = None
+
+
+
+FILTER_NONE     = 'none'
+FILTER_LOWPASS  = 'lowpass'
+FILTER_HIGHPASS = 'highpass'
+FILTER_BANDPASS = 'bandpass'
+FILTER_AVERAGE  = 'average'
+FILTER_KINDS    = [FILTER_NONE, FILTER_LOWPASS, FILTER_HIGHPASS, FILTER_BANDPASS, FILTER_AVERAGE]
+
+
+def biquad(kind, frequency, rate, q = 0.7071):
+    """
+    Purpose:    design a second order section (Audio EQ cookbook, R. Bristow-Johnson)
+    Input:      kind: lowpass, highpass or bandpass (0 dB peak gain)
+                frequency: cutoff or center frequency (Hz), clipped below rate/2
+                rate: sample rate (Hz)
+                q: quality factor (0.7071: Butterworth)
+    Return:     the [b0, b1, b2, 1, a1, a2] section, as used by sosfilt
+    """
+    w0    = 2 * np.pi * min(frequency, 0.45 * rate) / rate
+    cosw  = np.cos(w0)
+    alpha = np.sin(w0) / (2 * q)
+    if kind == FILTER_LOWPASS:
+        b = [(1 - cosw) / 2, 1 - cosw, (1 - cosw) / 2]
+    elif kind == FILTER_HIGHPASS:
+        b = [(1 + cosw) / 2, -(1 + cosw), (1 + cosw) / 2]
+    elif kind == FILTER_BANDPASS:
+        b = [alpha, 0.0, -alpha]
+    else:
+        raise ValueError('unknown biquad %r' % kind)
+    a0 = 1 + alpha
+    return np.array(b + [a0, -2 * cosw, 1 - alpha]) / a0
+#------------------------------------------------------------
+
+
+class BlockSosFilter(object):
+    """ sosfilt(sos, x, axis=0, zi=zi) without scipy, vectorized: a
+        biquad in transposed direct form II is the linear system
+
+            s[n+1] = A s[n] + B x[n],  y[n] = C s[n] + D x[n]
+
+        so a block of 'block' samples is filtered with matrix
+        products: y = H x + O s0 (H: lower triangular Toeplitz
+        matrix of the impulse response, O: rows C A^k) and the
+        state after the block is A^block s0 + G x. The matrices are
+        computed once per design, the Python loop is on the blocks
+        and sections only, every channel at once.
+
+        filter(x, zi):
+            (y, zf) of a (N, channels) array and a (sections, 2,
+            channels) state.
+    """
+    def __init__(self, sos, block = 64):
+        self.block    = block
+        self.sections = []
+        for b0, b1, b2, a0, a1, a2 in sos:
+            A = np.array([[-a1, 1.0], [-a2, 0.0]])
+            B = np.array([b1 - a1 * b0, b2 - a2 * b0])
+            powers = [np.eye(2)]                        # A^0 .. A^block
+            for k in range(block):
+                powers.append(A.dot(powers[-1]))
+            powers = np.array(powers)
+            h = np.r_[b0, [p[0].dot(B) for p in powers[:block - 1]]]
+            k = np.arange(block)
+            H = np.where(k[:, None] >= k, h[np.clip(k[:, None] - k, 0, block - 1)], 0.0)
+            O = powers[:block, 0, :]                    # rows C A^k
+            G = np.array([p.dot(B) for p in powers[block - 1::-1]]).T   # A^(block-1-j) B
+            self.sections.append((H, O, G, powers))
+    #------------------------------------------------------
+
+
+    def filter(self, x, zi):
+        y  = np.array(x, dtype=np.float64)
+        zf = np.array(zi, dtype=np.float64)
+        n  = len(y)
+        for s, (H, O, G, powers) in enumerate(self.sections):
+            state = zf[s]
+            for lo in xrange(0, n, self.block):
+                m  = min(self.block, n - lo)
+                xb = y[lo:lo + m].copy()
+                y[lo:lo + m] = H[:m, :m].dot(xb) + O[:m].dot(state)
+                state = powers[m].dot(state) + G[:, self.block - m:].dot(xb)
+            zf[s] = state
+        return y, zf
+#------------------------------------------------------------
+
+
+def sosfilt_numpy(sos, x, zi):
+    """ sosfilt(sos, x, axis=0, zi=zi) fallback without scipy (see
+        BlockSosFilter, keep one to filter a stream)
+    """
+    return BlockSosFilter(sos).filter(x, zi)
+#------------------------------------------------------------
+
+
+def steady_state(sos, x0):
+    """ Initial state of the sections for a signal that has
+        been constant at x0 (channels,) forever, so the filter
+        starts without a transient
+    """
+    zi = np.zeros((len(sos), 2) + np.shape(x0))
+    x  = np.asarray(x0, dtype=np.float64)
+    for s, (b0, b1, b2, a0, a1, a2) in enumerate(sos):
+        y = x * (b0 + b1 + b2) / (1 + a1 + a2)
+        zi[s, 0] = y - b0 * x
+        zi[s, 1] = b2 * x - a2 * y
+        x = y
+    return zi
+#------------------------------------------------------------
+
+
+
+class StreamFilter(object):
+    """ A filter applied batch after batch to a (N, channels) stream,
+        its state carried from one batch to the next so the output
+        is the same as if the whole stream was filtered at once.
+
+        kind:
+            'none', 'lowpass', 'highpass', 'bandpass' (biquads,
+            applied with scipy's sosfilt when scipy is installed)
+            or 'average': a moving average over 'length' samples.
+
+        frequency:
+            Cutoff (low/high-pass) or center (band-pass) frequency.
+
+        rate:
+            Sample rate (Hz). If None, it is estimated from the
+            timestamps and the biquads are designed again when the
+            estimate moves by more than 10%, starting from the
+            steady state of the last sample.
+
+        sections:
+            Number of biquads in cascade (order = 2 * sections).
+
+        process(timestamps, samples):
+            Return the filtered (N, channels) samples.
+    """
+    def __init__(   self,
+                    kind,
+                    frequency = 10.0,
+                    rate      = None,
+                    q         = 0.7071,
+                    sections  = 1,
+                    length    = 8):
+        if kind not in FILTER_KINDS:
+            raise ValueError('unknown filter %r' % kind)
+        self.kind      = kind
+        self.frequency = frequency
+        self.q         = q
+        self.sections  = sections
+        self.length    = max(1, int(length))
+        self.fixed     = rate
+        self.rate      = rate
+
+        self.sos       = None
+        self.blocks    = None                   # BlockSosFilter of sos, without scipy
+        self.state     = None                   # biquads state, or the last samples of the average
+        self.last      = None                   # last input sample
+        self.count     = 0
+        self.t_first   = None
+    #------------------------------------------------------
+
+
+    def settings(self):
+        """ What the output depends on: the filters with the same
+            settings can filter their channels together
+        """
+        return (self.kind, self.frequency, self.q, self.sections, self.length, self.fixed)
+    #------------------------------------------------------
+
+
+    def estimate_rate(self, timestamps):
+        if self.t_first is None:
+            self.t_first = timestamps[0]
+        self.count += len(timestamps)
+        if self.fixed is not None or self.count < 2 or timestamps[-1] <= self.t_first:
+            return
+        rate = (self.count - 1) / (timestamps[-1] - self.t_first)
+        if self.rate is None or abs(rate - self.rate) > 0.1 * self.rate:
+            self.rate  = rate
+            self.sos   = None
+            self.state = None
+    #------------------------------------------------------
+
+
+    def process(self, timestamps, samples):
+        if self.kind == FILTER_NONE or len(samples) == 0:
+            return samples
+        samples = np.asarray(samples, dtype=np.float64)
+        if self.kind == FILTER_AVERAGE:
+            return self.average(samples)
+
+        self.estimate_rate(timestamps)
+        if self.rate is None:
+            return samples
+        if self.sos is None:
+            self.sos = np.array([biquad(self.kind, self.frequency, self.rate, self.q)] * self.sections)
+            self.blocks = None if sosfilt is not None else BlockSosFilter(self.sos)
+        if self.state is None:
+            # a new design continues from the last sample filtered
+            self.state = steady_state(self.sos, samples[0] if self.last is None else self.last)
+        self.last = samples[-1].copy()
+        if self.blocks is None:
+            filtered, self.state = sosfilt(self.sos, samples, axis=0, zi=self.state)
+        else:
+            filtered, self.state = self.blocks.filter(samples, self.state)
+        return filtered
+    #------------------------------------------------------
+
+
+    def average(self, samples):
+        if self.state is None:
+            self.state = np.repeat(samples[:1], self.length - 1, axis=0)
+        window = np.concatenate((self.state, samples))
+        total  = np.cumsum(window, axis=0)
+        total  = np.concatenate((np.zeros((1,) + samples.shape[1:]), total))
+        self.state = window[len(window) - (self.length - 1):]
+        return (total[self.length:] - total[:-self.length]) / self.length
+    #------------------------------------------------------
+
+
+
+class ChannelFilters(object):
+    """ One StreamFilter per channel of a (N, channels) stream. The
+        channels whose filters have the same settings are filtered
+        at once, as one (N, k) stream, by the first of them.
+    """
+    def __init__(self, filters):
+        self.filters = filters
+        groups = {}
+        for i, f in enumerate(filters):
+            groups.setdefault(f.settings(), (f, []))[1].append(i)
+        self.groups = [(f, np.array(columns)) for f, columns in groups.values()
+                       if f.kind != FILTER_NONE]
+
+    def process(self, timestamps, samples):
+        if not self.groups:
+            return samples
+        out = np.array(samples, dtype=np.float64)
+        for f, columns in self.groups:
+            out[:, columns] = f.process(timestamps, out[:, columns])
+        return out
+#------------------------------------------------------------
@@ -0,0 +1,101 @@
+import numpy as np
+
+
+
+# Legacy text frame: 6 data bytes separated by a space and terminated by '\n'
+#   d0 ' ' d1 ' ' d2 ' ' d3 ' ' d4 ' ' d5 '\n'
+# (2 x payload size bytes for another number of data bytes)
+LINE_FRAME_SIZE     = 12
+LINE_PAYLOAD_SIZE   = 6
+LINE_SEPARATOR      = 0x20
+LINE_TERMINATOR     = 0x0A
+
+
+class LineFrameSplitter(object):
+    """ An incremental splitter for the legacy space separated,
+        '\\n' terminated frames.
+
+        The received chunks are appended to a reusable bytearray;
+        every complete frame is extracted in one vectorized pass
+        and the leftover bytes of a partial frame are carried over
+        to the next call of feed().
+
+        Frames are validated with their fixed layout (separators
+        and terminator positions) instead of split(), so a data
+        byte equal to 0x0A or 0x20 is decoded correctly. When a
+        frame is malformed, the splitter resynchronizes on the
+        next '\\n'.
+
+        payload_size:
+            Number of data bytes per frame.
+
+        frames_decoded/frames_rejected:
+            Counters of the valid frames returned and of the bytes
+            sequences dropped while resynchronizing.
+    """
+    def __init__(self, payload_size = LINE_PAYLOAD_SIZE, capacity = 4096):
+        self.payload_size      = payload_size
+        self.frame_size        = 2 * payload_size
+        self.payload_columns   = np.arange(0, self.frame_size, 2)
+        self.separator_columns = np.arange(1, self.frame_size - 1, 2)
+        self.buffer            = bytearray(capacity)
+        self.fill              = 0
+        self.frames_decoded    = 0
+        self.frames_rejected   = 0
+    #------------------------------------------------------
+
+
+    def _append(self, data):
+        n = len(data)
+        if self.fill + n > len(self.buffer):
+            self.buffer.extend(bytearray(self.fill + n - len(self.buffer)))
+        self.buffer[self.fill:self.fill + n] = data
+        self.fill += n
+    #------------------------------------------------------
+
+
+    def feed(self, data):
+        """
+        Purpose:    append a received chunk and extract the complete frames
+        Input:      data: the bytes read from the port
+        Return:     an uint8 array of shape (N, payload_size) with the frames payload
+        """
+        self._append(data)
+        buf   = np.frombuffer(self.buffer, dtype=np.uint8, count=self.fill)
+        pos   = 0
+        found = []
+
+        while self.fill - pos >= self.frame_size:
+            k      = (self.fill - pos) // self.frame_size
+            frames = buf[pos:pos + k * self.frame_size].reshape(k, self.frame_size)
+            valid  = (frames[:, -1] == LINE_TERMINATOR) & \
+                     (frames[:, self.separator_columns] == LINE_SEPARATOR).all(axis=1)
+
+            bad    = np.flatnonzero(~valid)
+            ngood  = bad[0] if len(bad) else k
+            if ngood:
+                found.append(frames[:ngood, self.payload_columns])
+                pos += ngood * self.frame_size
+            if ngood == k:
+                break
+
+            # resynchronize just after the next end of frame marker
+            self.frames_rejected += 1
+            eol = np.flatnonzero(buf[pos:self.fill] == LINE_TERMINATOR)
+            if len(eol) == 0:
+                pos = self.fill
+            else:
+                pos += eol[0] + 1
+
+        # carry the partial frame over to the next read
+        rest = self.fill - pos
+        if pos:
+            self.buffer[:rest] = self.buffer[pos:self.fill]
+        self.fill = rest
+
+        if not found:
+            return np.empty((0, self.payload_size), dtype=np.uint8)
+        payload = np.concatenate(found) if len(found) > 1 else found[0]
+        self.frames_decoded += len(payload)
+        return payload
+    #------------------------------------------------------
@@ -1,5 +1,5 @@
 
-import  random, sys, Queue, serial, glob, os, csv, time
+import  sys, Queue, os
 
 # ADXL345 constants
 EARTH_GRAVITY_MS2   = 9.80665
@@ -8,7 +8,52 @@ SCALE_MULTIPLIER    = 0.0078
 YMAX				=	 4.000
 YMIN				=   -4.000
 
-ktrace = 0
+# Plot history (number of samples)
+HISTORY_SIZE        = 100
+HISTORY_MIN         = 100
+HISTORY_MAX         = 5000000
+
+# Plot decimation modes (decimation combobox index)
+DECIMATION_MINMAX   = 0
+DECIMATION_LTTB     = 1
+DECIMATION_OFF      = 2
+
+# Samples between the reception thread and the GUI (see spsc_ring.py)
+DATA_RING_CAPACITY  = 1 << 16
+
+# Resampling (resample combobox index -> StreamResampler method)
+RESAMPLE_METHODS    = ['linear', 'sinc']
+RESAMPLE_MAX        = 10000
+
+# Rolling statistics window (number of samples)
+STATS_WINDOW        = 1000
+STATS_WINDOW_MAX    = 1000000
+
+# Channel filters (filter combobox index -> StreamFilter kind)
+FILTER_LABELS       = ["No filter", "Low-pass", "High-pass", "Band-pass", "Moving avg"]
+
+# Trigger (condition combobox index -> Trigger condition)
+TRIGGER_LABELS      = ["Rising edge", "Falling edge", "Level", "Magnitude", "Slope"]
+
+# Spectrum panel
+FFT_SIZES           = [64, 128, 256, 512, 1024, 2048, 4096]
+FFT_WINDOWS         = ['hann', 'hamming', 'blackman', 'rect']
+SPECTROGRAM_DEPTH   = 200                   # spectra shown in the spectrogram
+SPECTROGRAM_RANGE   = 80.0                  # dB below the maximum shown in the spectrogram
+
+# Recording formats (format combobox index)
+RECORD_CSV          = 0
+RECORD_BINARY       = 1
+RECORD_ARCHIVE      = 2
+
+# Replay speeds of a capture started as a port (0: as fast as possible)
+REPLAY_SPEEDS       = [('1x', 1.0), ('10x', 10.0), ('100x', 100.0), ('max', 0)]
+
+# Playback position slider steps per second
+PLAYBACK_RESOLUTION = 100
+
+# set MONITOR_TRACE=1 to print the debug messages
+ktrace = int(os.environ.get('MONITOR_TRACE', '0'))
 
 class LiveDataFeed(object):
     """ A simple "live data feed" abstraction that allows a reader 
@@ -59,47 +104,40 @@ else:
     from functools import partial
 #----------------------------------------------------------------------
 
-def get_all_from_queue(Q):
-    """ Generator to yield one after the others all items 
-        currently in the queue Q, without any waiting.
-    """
-    try:
-        while True:
-            yield Q.get_nowait( )
-    except Queue.Empty:
-        raise StopIteration
-#------------------------------------------------------------
-
 def get_item_from_queue(Q, timeout=0.01):
     """ Attempts to retrieve an item from the queue Q. If Q is
         empty, None is returned.
         
         Blocks for 'timeout' seconds in case the queue is empty,
         so don't use this method for speedy retrieval of multiple
-        items (use get_all_from_queue for that).
+        items (the samples go through a SampleRing for that).
     """
     try: 
-        item = Q.get(True, 0.01)
+        item = Q.get(True, timeout)
     except Queue.Empty: 
         return None
     return item
 #------------------------------------------------------------
 
+def drain_queue(Q):
+    """ Return the items currently in the queue Q (a Queue or a
+        multiprocessing Queue), without blocking: an empty list if
+        there are none.
+    """
+    items = []
+    while True:
+        try:
+            items.append(Q.get_nowait())
+        except Queue.Empty:
+            return items
+#------------------------------------------------------------
+
 def enumerate_serial_ports():
     """ 
-    Purpose:        scan for available serial ports
+    Purpose:        scan for available serial ports (see port_discovery.py,
+                    the monitor uses the cached background scan)
     Return:         return a list of of the availables ports names
     """
-    if os.name  == 'nt':
-        outAvailablePorts = []
-        for i in range(256):
-            try:
-                s = serial.Serial(i)
-                outAvailablePorts.append(s.portstr)
-                s.close()   
-            except serial.SerialException:
-                pass
-        return outAvailablePorts
-    else:
-        return glob.glob('/dev/tty.*')
-#----------------------------------------------------------------------
\ No newline at end of file
+    from port_discovery import scan_ports
+    return sorted(info.device for info in scan_ports().values())
+#----------------------------------------------------------------------
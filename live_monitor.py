@@ -8,8 +8,9 @@
 """ 
 A serial port packet monitor that plots live data using PyQwt.
 
-The monitor expects to receive 8 bytes data packets with a line return
-as a packet EOF on the serial port.
+The monitor expects to receive binary frames (sync word, sequence counter,
+gx, gy, gz samples and a CRC-16) or the legacy 6 bytes packets with a line
+return as a packet EOF on the serial port.
 Each received packet is analysed to extract gx, gy and gz.
 
 When the monitor is active, you can turn the 'Update speed' knob
@@ -20,41 +21,147 @@ License: this code is in the public domain
 Last modified: 07.08.2009
 """
 
-import  random, sys, Queue, serial, glob, os, csv, time
+import  sys, Queue, os, time, multiprocessing
+import  numpy as np
 
 import  PyQt4.Qwt5     as Qwt
 from    PyQt4.QtCore   import *
 from    PyQt4.QtGui    import *
 
 from com_monitor        import ComMonitorThread
+from replay             import ReplayThread, REPLAY_PREFIX
+from multi_port         import MultiPortMonitorThread
+from spsc_ring          import SampleRing, SharedSampleRing, OVERFLOW_POLICIES
+from shm_acquisition    import AcquisitionProcess
+from ring_buffer        import SampleRingBuffer
+from decimate           import MinMaxDecimator, lttb_positions
+from resampler          import StreamResampler
+from spectrum           import StreamingSpectrum, magnitude_db
+from filters            import StreamFilter, ChannelFilters, FILTER_KINDS, FILTER_AVERAGE
+from rolling_stats      import RollingStats
+from trigger            import Trigger, TRIGGER_CONDITIONS, TRIGGER_MODES
+from recorder           import CsvRecorderThread, BinaryRecorderThread, ArchiveRecorderThread
+from recording          import Recording, RecordingPlayer, RECORDING_EXTENSION
+from archive            import ARCHIVE_EXTENSION
+from metrics            import METRICS
+from schema             import DEFAULT_SCHEMA, load_schema
+from port_discovery     import PortInfo, PortScanner
 from globals            import *
 
 
+# Pen styles of the sources when several ports are monitored
+RIG_LINE_STYLES = [Qt.SolidLine, Qt.DashLine, Qt.DotLine, Qt.DashDotLine]
+
+# Colors of the channels curves and checkboxes, in the schema order
+CHANNEL_COLORS  = ['limegreen', 'red', 'yellow', 'cyan', 'magenta', 'orange',
+                   'white', 'dodgerblue']
+
+
+
+class BatchNotifier(QObject):
+    """ Emits batchReady() when the reception thread puts a batch in
+        the SampleRing (its notify callback). The signal is emitted
+        from the reception thread and delivered in the GUI thread
+        through a queued connection; the ring only calls notify()
+        once until the GUI reads it, so the notifications are
+        coalesced.
+    """
+    def notify(self):
+        self.emit(SIGNAL('batchReady()'))
+#-----------------------------------------------------------------------
+
+
+
+class PortNotifier(QObject):
+    """ Forwards the hotplug callbacks of the PortScanner, called in
+        its thread, to the GUI thread as portAdded(info) and
+        portRemoved(info) signals (queued connections)
+    """
+    def added(self, info):
+        self.emit(SIGNAL('portAdded(PyQt_PyObject)'), info)
+
+    def removed(self, info):
+        self.emit(SIGNAL('portRemoved(PyQt_PyObject)'), info)
+#-----------------------------------------------------------------------
+
+
+
+class Rig(object):
+    """ The plot history, decimator, curves, resampler, filters,
+        rolling statistics, trigger and recorder of one data source
+        (one serial port)
+    """
+    def __init__(self, curves, capacity):
+        self.history   = SampleRingBuffer(capacity, len(curves))
+        self.decimator = MinMaxDecimator()
+        self.curve     = curves
+        self.resampler = None
+        self.filters   = None
+        self.stats     = RollingStats(STATS_WINDOW, len(curves))
+        self.trigger   = None
+        self.recorder  = None
+#-----------------------------------------------------------------------
+
+
 
 class PlottingDataMonitor(QMainWindow):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, schema=DEFAULT_SCHEMA):
         super(PlottingDataMonitor, self).__init__(parent)
 
         self.setWindowTitle('ADXL345 Realtime Monitor')
         self.resize(800, 600)
         
+        self.schema         = schema                # channels of the received samples
         self.port           = ""
         self.baudrate       = 9600
         self.monitor_active = False                 # on/off monitor state
         self.com_monitor    = None                  # monitor reception thread
         self.com_data_q     = None
         self.com_error_q    = None
+        self.data_q         = None                  # SampleRing filled by the reception thread
+        self.error_q        = None                  # its error messages
+        self.errors         = []                    # errors reported while running, last one shown
+        self.recording_errors = []                  # the recorders' ones, shown when stopped
         self.livefeed       = LiveDataFeed()
-        self.timer          = QTimer()
-        self.g_samples      = [[], [], []]
-        self.curve          = [None]*3
-        self.gcurveOn       = [1]*3                 # by default all curve are plotted
-        self.csvdata        = []    
+        self.timer          = QTimer()                # playback, or polling of a separate process
+        self.frame_timer    = QTimer()                # pending redraw, paced to the update speed
+        self.frame_timer.setSingleShot(True)
+        self.notifier       = BatchNotifier()
+        self.port_notifier  = PortNotifier()
+        self.port_scanner   = PortScanner(self.port_notifier.added,
+                                          self.port_notifier.removed)
+        self.ports          = {}                    # combobox port id -> PortInfo
+        self.last_port      = None                  # id of the port last started
+        self.last_frame     = 0.0                     # time.time() of the last redraw
+        self.x_scale        = None                    # current time axis scale
+        self.rigs           = {}                    # source id -> Rig
+        self.curve          = [None]*schema.channels
+        self.gcurveOn       = [1]*schema.channels   # by default all curve are plotted
+        self.player         = None                  # binary recording playback
+        self.spectrum       = None                  # spectrum of the first source
+        self.last_tick      = None
+        self.samples_seen     = 0                 # samples received from the thread
+        self.samples_rendered = 0                 # samples added to the plot (after resampling/trigger)
         
         self.create_menu()
         self.create_main_frame()
         self.create_status_bar()
 
+        self.rigs[0]        = Rig(self.curve, HISTORY_SIZE)
+        self.on_resample_change()
+
+        self.connect(self.timer, SIGNAL('timeout()'), self.on_timer)
+        self.connect(self.frame_timer, SIGNAL('timeout()'), self.on_frame)
+        self.connect(self.notifier, SIGNAL('batchReady()'), self.on_batch_ready,
+                    Qt.QueuedConnection)
+        self.connect(self.port_notifier, SIGNAL('portAdded(PyQt_PyObject)'),
+                    self.on_port_added, Qt.QueuedConnection)
+        self.connect(self.port_notifier, SIGNAL('portRemoved(PyQt_PyObject)'),
+                    self.on_port_removed, Qt.QueuedConnection)
+        # the ports are listed in the background, the combobox is
+        # filled when the scan reports them
+        self.port_scanner.start()
+
         # Activate start-stop button connections
         self.connect(self.button_Connect, SIGNAL("clicked()"),
                     self.OnStart)
@@ -63,6 +170,14 @@ class PlottingDataMonitor(QMainWindow):
     #----------------------------------------------------------
 
 
+    @property
+    def history(self):
+        """ History of the first (or only) source
+        """
+        return self.rigs[0].history
+    #----------------------------------------------------------
+
+
     def create_com_box(self):
         """ 
         Purpose:   create the serial com groupbox
@@ -76,10 +191,36 @@ class PlottingDataMonitor(QMainWindow):
         self.radio9600.setChecked(1)
         self.radio19200    =    QRadioButton("19200")
         self.Com_ComboBox  =    QComboBox()
+        self.Protocol_ComboBox = QComboBox()
+        self.Protocol_ComboBox.addItem("Binary frames")
+        self.Protocol_ComboBox.addItem("Text lines (legacy)")
 
         com_layout.addWidget(self.Com_ComboBox,0,0,1,2)
         com_layout.addWidget(self.radio9600,1,0)
         com_layout.addWidget(self.radio19200,1,1)
+        com_layout.addWidget(self.Protocol_ComboBox,2,0,1,2)
+
+        self.Replay_ComboBox = QComboBox()
+        for label, speed in REPLAY_SPEEDS:
+            self.Replay_ComboBox.addItem("Replay %s" % label)
+        com_layout.addWidget(self.Replay_ComboBox,2,2)
+
+        self.multi_check = QCheckBox("All ports")
+        self.multi_check.setToolTip("Monitor all the listed serial ports at once")
+        com_layout.addWidget(self.multi_check,3,0)
+
+        self.Overflow_ComboBox = QComboBox()
+        self.Overflow_ComboBox.addItem("Drop oldest")
+        self.Overflow_ComboBox.addItem("Drop newest")
+        self.Overflow_ComboBox.addItem("Block reception")
+        self.Overflow_ComboBox.setToolTip("What to do with the received samples "
+                                          "when the display falls behind")
+        com_layout.addWidget(self.Overflow_ComboBox,3,1)
+
+        self.process_check = QCheckBox("Separate process")
+        self.process_check.setToolTip("Read and decode the port in another process, "
+                                      "so a slow display can't delay the reads")
+        com_layout.addWidget(self.process_check,3,2)
         self.fill_ports_combobox()
 
         self.button_Connect      =   QPushButton("Start")
@@ -102,20 +243,61 @@ class PlottingDataMonitor(QMainWindow):
         plot.setCanvasBackground(Qt.black)
         plot.setAxisTitle(Qwt.QwtPlot.xBottom, 'Time')
         plot.setAxisScale(Qwt.QwtPlot.xBottom, 0, 10, 1)
-        plot.setAxisTitle(Qwt.QwtPlot.yLeft, 'Acceleration')
-        plot.setAxisScale(Qwt.QwtPlot.yLeft, YMIN, YMAX, (YMAX-YMIN)/10)
+        ymin, ymax = self.schema.range
+        plot.setAxisTitle(Qwt.QwtPlot.yLeft, self.schema.title)
+        plot.setAxisScale(Qwt.QwtPlot.yLeft, ymin, ymax, (ymax-ymin)/10)
         plot.replot()
         
-        curve = [None]*3
-        pen = [QPen(QColor('limegreen')), QPen(QColor('red')) ,QPen(QColor('yellow')) ]
-        for i in range(3):
+        curve = self.create_curves(plot, Qt.SolidLine)
+
+        return plot, curve
+    #---------------------------------------------------
+
+
+    def create_curves(self, plot, style):
+        """ 
+        Purpose:   create the curves of the channels of one source
+        Input:     the plot and the pen style of the source
+        Return:    return the list of the curves
+        """
+        curve = [None]*self.schema.channels
+        pen = [QPen(self.channel_color(i)) for i in range(self.schema.channels)]
+        for i in range(self.schema.channels):
             curve[i] =  Qwt.QwtPlotCurve('')
             curve[i].setRenderHint(Qwt.QwtPlotItem.RenderAntialiased)
             pen[i].setWidth(2)
+            pen[i].setStyle(style)
             curve[i].setPen(pen[i])
             curve[i].attach(plot)
+        return curve
+    #---------------------------------------------------
 
-        return plot, curve
+
+    def channel_color(self, channel):
+        return QColor(CHANNEL_COLORS[channel % len(CHANNEL_COLORS)])
+    #---------------------------------------------------
+
+
+    def setup_rigs(self, source_ids):
+        """ Create the rigs of new sources, each one with its own
+            pen style, remove the ones not used anymore and restart
+            the resampling, the spectrum, the statistics and the
+            trigger
+        """
+        for source_id in list(self.rigs):
+            if source_id != 0 and source_id not in source_ids:
+                for curve in self.rigs[source_id].curve:
+                    curve.detach()
+                del self.rigs[source_id]
+        for source_id in source_ids:
+            if source_id not in self.rigs:
+                style = RIG_LINE_STYLES[source_id % len(RIG_LINE_STYLES)]
+                self.rigs[source_id] = Rig(self.create_curves(self.plot, style),
+                                           self.window_spin.value())
+        self.on_resample_change()
+        self.on_spectrum_change()
+        self.on_stats_window_change()
+        self.on_trigger_change()
     #---------------------------------------------------
 
 
@@ -182,37 +364,134 @@ class PlottingDataMonitor(QMainWindow):
         spins_hbox.addWidget(QLabel('Save every'))
         spins_hbox.addWidget(self.max_spin)
         spins_hbox.addWidget( QLabel('Lines'))
+        self.connect(self.max_spin, SIGNAL('valueChanged(int)'),
+            self.on_max_spin_change)
+        self.format_combo = QComboBox()
+        self.format_combo.addItem("CSV")
+        self.format_combo.addItem("Binary")
+        self.format_combo.addItem("Archive")
+        spins_hbox.addWidget(self.format_combo)
         #spins_hbox.addStretch(1)
 
-        self.gCheckBox   =  [   self.create_checkbox("Acceleration(x)", Qt.green, self.activate_curve, 0),
-                                self.create_checkbox("Acceleration(y)", Qt.red, self.activate_curve, 1),
-                                self.create_checkbox("Acceleration(z)", Qt.yellow, self.activate_curve, 2)
+        self.window_spin = QSpinBox()
+        self.window_spin.setRange(HISTORY_MIN, HISTORY_MAX)
+        self.window_spin.setSingleStep(100)
+        self.window_spin.setValue(HISTORY_SIZE)
+        self.connect(self.window_spin, SIGNAL('valueChanged(int)'),
+            self.on_window_change)
+        window_hbox     = QHBoxLayout()
+        window_hbox.addWidget(QLabel('Plot'))
+        window_hbox.addWidget(self.window_spin)
+        window_hbox.addWidget(QLabel('Samples'))
+
+        self.decimation_combo = QComboBox()
+        self.decimation_combo.addItem("Min/Max")
+        self.decimation_combo.addItem("LTTB")
+        self.decimation_combo.addItem("Off")
+        decimation_hbox = QHBoxLayout()
+        decimation_hbox.addWidget(QLabel('Decimation'))
+        decimation_hbox.addWidget(self.decimation_combo)
+
+        self.resample_spin = QSpinBox()
+        self.resample_spin.setRange(0, RESAMPLE_MAX)
+        self.resample_spin.setSpecialValueText("Off")
+        self.resample_spin.setToolTip("Resample the samples on a uniform time grid "
+                                      "before plotting and saving them")
+        self.resample_combo = QComboBox()
+        self.resample_combo.addItem("Linear")
+        self.resample_combo.addItem("Sinc")
+        self.connect(self.resample_spin, SIGNAL('valueChanged(int)'),
+            self.on_resample_change)
+        self.connect(self.resample_combo, SIGNAL('currentIndexChanged(int)'),
+            self.on_resample_change)
+        resample_hbox   = QHBoxLayout()
+        resample_hbox.addWidget(QLabel('Resample (Hz)'))
+        resample_hbox.addWidget(self.resample_spin)
+        resample_hbox.addWidget(self.resample_combo)
+
+        channels         =  self.schema.channels
+        self.gCheckBox   =  [   self.create_checkbox(label, self.channel_color(i), self.activate_curve, i)
+                                for i, label in enumerate(self.schema.labels())
                             ]
 
+        self.filter_combo = []
+        self.filter_spin  = []
+        filter_hbox       = []
+        for i in range(channels):
+            combo = QComboBox()
+            for label in FILTER_LABELS:
+                combo.addItem(label)
+            spin = QDoubleSpinBox()
+            spin.setRange(0.1, RESAMPLE_MAX / 2)
+            spin.setValue(10.0)
+            spin.setSuffix(" Hz")
+            self.connect(combo, SIGNAL('currentIndexChanged(int)'), self.on_filter_change)
+            self.connect(spin, SIGNAL('valueChanged(double)'), self.on_filter_change)
+            hbox = QHBoxLayout()
+            hbox.addWidget(combo)
+            hbox.addWidget(spin)
+            self.filter_combo.append(combo)
+            self.filter_spin.append(spin)
+            filter_hbox.append(hbox)
+
+        self.stats_l = [QLabel() for i in range(channels)]
+        for label in self.stats_l:
+            label.setFont(QFont("Courier", pointSize=9))
+        self.stats_spin = QSpinBox()
+        self.stats_spin.setRange(2, STATS_WINDOW_MAX)
+        self.stats_spin.setSingleStep(100)
+        self.stats_spin.setValue(STATS_WINDOW)
+        self.connect(self.stats_spin, SIGNAL('valueChanged(int)'),
+            self.on_stats_window_change)
+        stats_hbox      = QHBoxLayout()
+        stats_hbox.addWidget(QLabel('Stats over'))
+        stats_hbox.addWidget(self.stats_spin)
+        stats_hbox.addWidget(QLabel('Samples'))
+
+        self.lossless_check    =   QCheckBox("Lossless")
+        self.lossless_check.setChecked(1)
+        self.lossless_check.setToolTip("Plot and save every received sample "
+                                       "instead of the most recent one")
+
         self.button_clear      =   QPushButton("Clear screen")
 
         self.connect(self.button_clear, SIGNAL("clicked()"),
                     self.clear_screen)
         
-        # Place the horizontal panel widget
+        # Place the horizontal panel widget: one row per channel,
+        # then the settings
         plot_layout = QGridLayout()
-        plot_layout.addWidget(self.plot,0,0,8,7)
-        plot_layout.addWidget(self.gCheckBox[0],0,8)
-        plot_layout.addWidget(self.gCheckBox[1],1,8)
-        plot_layout.addWidget(self.gCheckBox[2],2,8)
-        plot_layout.addWidget(self.button_clear,3,8)
-        plot_layout.addLayout(spins_hbox,4,8)
-        plot_layout.addWidget(self.updatespeed_knob,5,8)
-        plot_layout.addWidget(self.knob_l,6,8)
+        plot_layout.addWidget(self.plot,0,0,channels+5,7)
+        for i in range(channels):
+            plot_layout.addWidget(self.gCheckBox[i],i,8)
+            plot_layout.addLayout(filter_hbox[i],i,9)
+            plot_layout.addWidget(self.stats_l[i],i,10)
+        row = channels
+        plot_layout.addLayout(stats_hbox,row,10)
+        plot_layout.addWidget(self.button_clear,row,8)
+        plot_layout.addWidget(self.lossless_check,row,9)
+        plot_layout.addLayout(spins_hbox,row+1,8)
+        plot_layout.addLayout(resample_hbox,row+1,9)
+        plot_layout.addLayout(window_hbox,row+2,8)
+        plot_layout.addLayout(decimation_hbox,row+2,9)
+        plot_layout.addWidget(self.updatespeed_knob,row+3,8)
+        plot_layout.addWidget(self.knob_l,row+4,8)
         
-        plot_groupbox = QGroupBox('Acceleration')
+        plot_groupbox = QGroupBox(self.schema.title)
         plot_groupbox.setLayout(plot_layout)
+
+        self.playback_box = self.create_playback_box()
+        self.trigger_box  = self.create_trigger_box()
+        self.spectrum_box = self.create_spectrum_box()
         
         # Place the main frame and layout
         self.main_frame = QWidget()
         main_layout 	= QVBoxLayout()
         main_layout.addWidget(self.com_box)
         main_layout.addWidget(plot_groupbox)
+        main_layout.addWidget(self.trigger_box)
+        main_layout.addWidget(self.spectrum_box)
+        main_layout.addWidget(self.playback_box)
         main_layout.addStretch(1)
         self.main_frame.setLayout(main_layout)
         
@@ -220,11 +499,361 @@ class PlottingDataMonitor(QMainWindow):
     #----------------------------------------------------------------------
 
 
+    def create_playback_box(self):
+        """ 
+        Purpose:   create the recording playback groupbox
+        Return:    return the groupbox, hidden until a recording is opened
+        """
+        box = QGroupBox("Playback")
+        layout = QHBoxLayout()
+
+        self.button_play    = QPushButton("Play")
+        self.button_play.setCheckable(True)
+        self.connect(self.button_play, SIGNAL("toggled(bool)"),
+                    self.on_play_toggled)
+
+        self.speed_spin     = QDoubleSpinBox()
+        self.speed_spin.setRange(0.1, 100.0)
+        self.speed_spin.setSingleStep(0.1)
+        self.speed_spin.setValue(1.0)
+        self.speed_spin.setSuffix("x")
+        self.connect(self.speed_spin, SIGNAL('valueChanged(double)'),
+                    self.on_speed_change)
+
+        self.position_slider = QSlider(Qt.Horizontal)
+        self.connect(self.position_slider, SIGNAL('sliderMoved(int)'),
+                    self.on_seek)
+
+        self.position_l     = QLabel()
+
+        layout.addWidget(self.button_play)
+        layout.addWidget(QLabel('Speed'))
+        layout.addWidget(self.speed_spin)
+        layout.addWidget(self.position_slider, 1)
+        layout.addWidget(self.position_l)
+        box.setLayout(layout)
+        box.hide()
+        return box
+    #---------------------------------------------------------------------
+
+
+    def create_trigger_box(self):
+        """ 
+        Purpose:   create the trigger groupbox
+        Return:    return the groupbox, unchecked (continuous monitoring)
+        """
+        box = QGroupBox("Trigger")
+        box.setCheckable(True)
+        box.setChecked(False)
+        box.setToolTip("Plot and save only the samples around the trigger events")
+        self.connect(box, SIGNAL("toggled(bool)"), self.on_trigger_change)
+
+        self.trigger_combo = QComboBox()
+        for label in TRIGGER_LABELS:
+            self.trigger_combo.addItem(label)
+        self.trigger_channel_combo = QComboBox()
+        for label in self.schema.labels():
+            self.trigger_channel_combo.addItem(label)
+        self.trigger_level_spin = QDoubleSpinBox()
+        self.trigger_level_spin.setRange(-100.0, 100.0)
+        self.trigger_level_spin.setDecimals(3)
+        self.trigger_level_spin.setSingleStep(0.1)
+        self.trigger_level_spin.setValue(1.5)
+        self.trigger_pre_spin = QSpinBox()
+        self.trigger_pre_spin.setRange(0, HISTORY_MAX / 2)
+        self.trigger_pre_spin.setValue(100)
+        self.trigger_post_spin = QSpinBox()
+        self.trigger_post_spin.setRange(1, HISTORY_MAX / 2)
+        self.trigger_post_spin.setValue(400)
+        self.holdoff_spin = QDoubleSpinBox()
+        self.holdoff_spin.setRange(0.0, 3600.0)
+        self.holdoff_spin.setSuffix(" s")
+        self.trigger_mode_combo = QComboBox()
+        self.trigger_mode_combo.addItem("Normal")
+        self.trigger_mode_combo.addItem("Single")
+        self.button_arm = QPushButton("Arm")
+        self.connect(self.button_arm, SIGNAL("clicked()"), self.on_arm)
+        self.trigger_l = QLabel()
+
+        for widget, signal in ((self.trigger_combo,         'currentIndexChanged(int)'),
+                               (self.trigger_channel_combo, 'currentIndexChanged(int)'),
+                               (self.trigger_level_spin,    'valueChanged(double)'),
+                               (self.trigger_pre_spin,      'valueChanged(int)'),
+                               (self.trigger_post_spin,     'valueChanged(int)'),
+                               (self.holdoff_spin,          'valueChanged(double)'),
+                               (self.trigger_mode_combo,    'currentIndexChanged(int)')):
+            self.connect(widget, SIGNAL(signal), self.on_trigger_change)
+
+        layout = QHBoxLayout()
+        for label, widget in (('', self.trigger_combo),
+                              ('on', self.trigger_channel_combo),
+                              ('Level', self.trigger_level_spin),
+                              ('Pre', self.trigger_pre_spin),
+                              ('Post', self.trigger_post_spin),
+                              ('Holdoff', self.holdoff_spin),
+                              ('', self.trigger_mode_combo)):
+            if label:
+                layout.addWidget(QLabel(label))
+            layout.addWidget(widget)
+        layout.addWidget(self.button_arm)
+        layout.addWidget(self.trigger_l, 1)
+        box.setLayout(layout)
+        return box
+    #---------------------------------------------------------------------
+
+
+    def on_trigger_change(self):
+        """ Arm new triggers with the new settings, or go back to
+            continuous monitoring when the trigger is unchecked
+        """
+        enabled = self.trigger_box.isChecked()
+        if enabled:
+            # the plot must be able to show a whole event
+            event = self.trigger_pre_spin.value() + self.trigger_post_spin.value()
+            self.window_spin.setValue(max(self.window_spin.value(), event))
+        for rig in self.rigs.values():
+            rig.trigger = None
+            if enabled:
+                rig.trigger = Trigger(TRIGGER_CONDITIONS[self.trigger_combo.currentIndex()],
+                                      self.trigger_channel_combo.currentIndex(),
+                                      self.trigger_level_spin.value(),
+                                      self.trigger_pre_spin.value(),
+                                      self.trigger_post_spin.value(),
+                                      self.holdoff_spin.value(),
+                                      TRIGGER_MODES[self.trigger_mode_combo.currentIndex()],
+                                      self.schema.channels)
+        self.update_trigger_status()
+    #---------------------------------------------------------------------
+
+
+    def on_arm(self):
+        for rig in self.rigs.values():
+            if rig.trigger is not None:
+                rig.trigger.arm()
+        self.update_trigger_status()
+    #---------------------------------------------------------------------
+
+
+    def update_trigger_status(self):
+        trigger = self.rigs[0].trigger if 0 in self.rigs else None
+        if trigger is None:
+            self.trigger_l.setText('')
+        elif trigger.pending is not None:
+            self.trigger_l.setText('Triggered - %d events' % trigger.events)
+        elif trigger.armed:
+            self.trigger_l.setText('Armed - %d events' % trigger.events)
+        else:
+            self.trigger_l.setText('Stopped - %d events' % trigger.events)
+    #---------------------------------------------------------------------
+
+
+    def create_spectrum_box(self):
+        """ 
+        Purpose:   create the spectrum and spectrogram groupbox
+        Return:    return the groupbox, unchecked (no FFT computed)
+        """
+        box = QGroupBox("Spectrum")
+        box.setCheckable(True)
+        box.setChecked(False)
+        self.connect(box, SIGNAL("toggled(bool)"), self.on_spectrum_change)
+
+        self.spectrum_plot = Qwt.QwtPlot(self)
+        self.spectrum_plot.setCanvasBackground(Qt.black)
+        self.spectrum_plot.setAxisTitle(Qwt.QwtPlot.xBottom, 'Frequency (Hz)')
+        self.spectrum_plot.setAxisTitle(Qwt.QwtPlot.yLeft, 'Magnitude')
+        self.spectrum_curve = self.create_curves(self.spectrum_plot, Qt.SolidLine)
+
+        self.spectrogram_l = QLabel()
+        self.spectrogram_l.setMinimumSize(200, 150)
+        self.spectrogram_l.setScaledContents(True)
+        # black -> red -> yellow -> white color map
+        level = np.arange(256)
+        red   = np.clip(3 * level, 0, 255)
+        green = np.clip(3 * level - 255, 0, 255)
+        blue  = np.clip(3 * level - 510, 0, 255)
+        self.spectrogram_colors = [qRgb(r, g, b) for r, g, b in zip(red, green, blue)]
+        self.spectrogram_data   = None      # the image buffer must outlive the QImage
+
+        self.fft_size_combo = QComboBox()
+        for size in FFT_SIZES:
+            self.fft_size_combo.addItem(str(size))
+        self.fft_size_combo.setCurrentIndex(FFT_SIZES.index(256))
+        self.overlap_spin = QSpinBox()
+        self.overlap_spin.setRange(0, 90)
+        self.overlap_spin.setValue(50)
+        self.overlap_spin.setSuffix(" %")
+        self.fft_window_combo = QComboBox()
+        for window in FFT_WINDOWS:
+            self.fft_window_combo.addItem(window.capitalize())
+        self.db_check = QCheckBox("dB")
+        self.db_check.setChecked(1)
+        self.spectrogram_combo = QComboBox()
+        for name in self.schema.names:
+            self.spectrogram_combo.addItem("Spectrogram (%s)" % name)
+        self.peak_l = [QLabel() for i in range(self.schema.channels)]
+
+        for widget, signal in ((self.fft_size_combo,   'currentIndexChanged(int)'),
+                               (self.overlap_spin,     'valueChanged(int)'),
+                               (self.fft_window_combo, 'currentIndexChanged(int)')):
+            self.connect(widget, SIGNAL(signal), self.on_spectrum_change)
+        self.connect(self.db_check, SIGNAL("clicked()"), self.update_spectrum)
+        self.connect(self.spectrogram_combo, SIGNAL('currentIndexChanged(int)'),
+                    self.update_spectrum)
+
+        config_layout = QVBoxLayout()
+        for label, widget in (('FFT size', self.fft_size_combo),
+                              ('Overlap', self.overlap_spin),
+                              ('Window', self.fft_window_combo)):
+            hbox = QHBoxLayout()
+            hbox.addWidget(QLabel(label))
+            hbox.addWidget(widget)
+            config_layout.addLayout(hbox)
+        config_layout.addWidget(self.db_check)
+        config_layout.addWidget(self.spectrogram_combo)
+        for label in self.peak_l:
+            config_layout.addWidget(label)
+        config_layout.addStretch(1)
+
+        layout = QHBoxLayout()
+        layout.addWidget(self.spectrum_plot, 2)
+        layout.addWidget(self.spectrogram_l, 2)
+        layout.addLayout(config_layout)
+        box.setLayout(layout)
+        return box
+    #---------------------------------------------------------------------
+
+
+    def on_spectrum_change(self):
+        """ Restart the spectrum with the new FFT configuration,
+            or stop computing it when the panel is unchecked
+        """
+        self.spectrum = None
+        if self.spectrum_box.isChecked():
+            self.spectrum = StreamingSpectrum(FFT_SIZES[self.fft_size_combo.currentIndex()],
+                                              self.overlap_spin.value() / 100.0,
+                                              FFT_WINDOWS[self.fft_window_combo.currentIndex()],
+                                              SPECTROGRAM_DEPTH,
+                                              self.schema.channels)
+        self.update_spectrum()
+    #---------------------------------------------------------------------
+
+
+    def update_spectrum(self):
+        """ Draw the last spectrum, its peaks and the spectrogram
+        """
+        if self.spectrum is None or self.spectrum.frames == 0:
+            for i, name in enumerate(self.schema.names):
+                self.spectrum_curve[i].setData([], [])
+                self.peak_l[i].setText('%s: - Hz' % name)
+            self.spectrogram_l.clear()
+            self.spectrum_plot.replot()
+            return
+
+        freqs    = self.spectrum.frequencies()
+        spectrum = self.spectrum.spectrum()
+        if self.db_check.isChecked():
+            spectrum = magnitude_db(spectrum)
+        for i, peak in enumerate(self.spectrum.peak_frequencies()):
+            if self.gcurveOn[i]:
+                self.spectrum_curve[i].setData(freqs, spectrum[i])
+            else:
+                self.spectrum_curve[i].setData([], [])
+            self.peak_l[i].setText('%s: %.1f Hz' % (self.schema.names[i], peak))
+        self.spectrum_plot.setAxisScale(Qwt.QwtPlot.xBottom, 0, freqs[-1])
+        self.spectrum_plot.replot()
+
+        # frequencies upwards, time to the right
+        levels = magnitude_db(self.spectrum.spectrogram(self.spectrogram_combo.currentIndex()))
+        levels = (levels - (levels.max() - SPECTROGRAM_RANGE)) * (255 / SPECTROGRAM_RANGE)
+        self.spectrogram_data = np.ascontiguousarray(
+                                    np.clip(levels, 0, 255).astype(np.uint8)[:, ::-1].T)
+        height, width = self.spectrogram_data.shape
+        image = QImage(self.spectrogram_data.data, width, height, width, QImage.Format_Indexed8)
+        image.setColorTable(self.spectrogram_colors)
+        self.spectrogram_l.setPixmap(QPixmap.fromImage(image))
+    #---------------------------------------------------------------------
+
+
     def clear_screen(self):
-        g_samples[0] = []
+        for rig in self.rigs.values():
+            rig.history.clear()
+    #-----------------------------
+
+
+    def on_window_change(self):
+        """ When the plot window is changed, resize the history
+        """
+        for rig in self.rigs.values():
+            rig.history.resize(self.window_spin.value())
     #-----------------------------
         
 
+    def on_resample_change(self):
+        """ Restart the resampling and the filtering of every source
+            at the new rate
+        """
+        for rig in self.rigs.values():
+            rig.resampler = self.create_resampler()
+            rig.filters   = self.create_filters()
+    #-----------------------------
+
+
+    def on_stats_window_change(self):
+        """ Restart the rolling statistics over the new window
+        """
+        for rig in self.rigs.values():
+            rig.stats = RollingStats(self.stats_spin.value(), self.schema.channels)
+        self.update_stats()
+    #-----------------------------
+
+
+    def update_stats(self):
+        """ Show the statistics of the first source next to the
+            channel checkboxes
+        """
+        stats = self.rigs[0].stats
+        if stats.n == 0:
+            for label in self.stats_l:
+                label.setText('')
+            return
+        mean, rms, p2p, crest = stats.mean, stats.rms, stats.peak_to_peak, stats.crest
+        for i, label in enumerate(self.stats_l):
+            label.setText('mean %8.4f  rms %8.4f\np-p  %8.4f  crest %6.2f' %
+                          (mean[i], rms[i], p2p[i], crest[i]))
+    #-----------------------------
+
+
+    def on_filter_change(self):
+        """ Restart the filtering of every source with the new
+            per axis filters
+        """
+        for i in range(self.schema.channels):
+            kind = FILTER_KINDS[self.filter_combo[i].currentIndex()]
+            self.filter_spin[i].setSuffix(" samples" if kind == FILTER_AVERAGE else " Hz")
+        for rig in self.rigs.values():
+            rig.filters = self.create_filters()
+    #-----------------------------
+
+
+    def create_filters(self):
+        rate = self.resample_spin.value() or None
+        filters = []
+        for i in range(self.schema.channels):
+            kind  = FILTER_KINDS[self.filter_combo[i].currentIndex()]
+            value = self.filter_spin[i].value()
+            filters.append(StreamFilter(kind, value, rate, length = value))
+        return ChannelFilters(filters)
+    #-----------------------------
+
+
+    def create_resampler(self):
+        rate = self.resample_spin.value()
+        if rate == 0:
+            return None
+        return StreamResampler(rate, RESAMPLE_METHODS[self.resample_combo.currentIndex()])
+    #-----------------------------
+
+
     def activate_curve(self, axe):
         if self.gCheckBox[axe].isChecked():
             self.gcurveOn[axe]  = 1
@@ -242,6 +871,14 @@ class PlottingDataMonitor(QMainWindow):
             shortcut="Ctrl+M", slot=self.OnStart, tip="Start the data monitor")
         self.stop_action = self.create_action("&Stop monitor",
             shortcut="Ctrl+T", slot=self.OnStop, tip="Stop the data monitor")
+        open_action = self.create_action("&Open recording...",
+            shortcut="Ctrl+O", slot=self.on_open_recording,
+            tip="Play back a binary recording")
+        metrics_action = self.create_action("&Dump metrics...",
+            slot=self.on_dump_metrics, tip="Save the pipeline metrics as JSON")
+        replay_action = self.create_action("&Replay capture as a port...",
+            shortcut="Ctrl+R", slot=self.on_add_replay,
+            tip="Feed a csv, binary recording or raw dump through the live pipeline")
         exit_action = self.create_action("E&xit", slot=self.close, 
             shortcut="Ctrl+X", tip="Exit the application")
         
@@ -250,6 +887,7 @@ class PlottingDataMonitor(QMainWindow):
         
         self.add_actions(self.file_menu, 
             (   selectport_action, self.start_action, self.stop_action,
+                None, open_action, replay_action, None, metrics_action,
                 None, exit_action))
             
         self.help_menu = self.menuBar().addMenu("&Help")
@@ -282,7 +920,7 @@ class PlottingDataMonitor(QMainWindow):
 
     def on_select_port(self):
         
-        ports = enumerate_serial_ports()
+        ports = [info.device for info in self.port_scanner.ports()]
         
         if len(ports) == 0:
             QMessageBox.critical(self, 'No ports',
@@ -298,60 +936,201 @@ class PlottingDataMonitor(QMainWindow):
     #-----------------------------------------------
 
 
+    def on_add_replay(self):
+        """ Add a recorded capture to the ports combobox, so it can
+            be started in place of a serial port
+        """
+        path = QFileDialog.getOpenFileName(self, 'Replay capture', '',
+                    'Captures (*.csv *%s *%s *.raw *.bin);;All files (*)' %
+                    (RECORDING_EXTENSION, ARCHIVE_EXTENSION))
+        if path.isEmpty():
+            return
+        info = PortInfo(REPLAY_PREFIX + str(path))
+        self.Com_ComboBox.setCurrentIndex(self.add_port_item(info))
+    #-----------------------------------------------
+
+
     def fill_ports_combobox(self):
-        """ Purpose: rescan the serial port com and update the combobox
+        """ Purpose: update the combobox with the ports cached by the
+                     background scan (the replays added are kept)
         """
-        vNbCombo = ""
-        self.Com_ComboBox.clear()
-        self.AvailablePorts = enumerate_serial_ports()
-        for value in self.AvailablePorts:
-            self.Com_ComboBox.addItem(value)
-            vNbCombo += value + " - "
-        vNbCombo = vNbCombo[:-3] 
+        for info in self.port_scanner.ports():
+            self.add_port_item(info)
 
-        debug(("--> Les ports series disponibles sont: %s " % (vNbCombo)))
+        debug(("--> Les ports series disponibles sont: %s " % " - ".join(sorted(self.ports))))
+    #----------------------------------------------------------------------
+
+
+    def add_port_item(self, info):
+        """ Purpose: add a port to the combobox, or update its label
+            Return:  its index in the combobox
+        """
+        self.ports[info.id] = info
+        index = self.Com_ComboBox.findData(QVariant(info.id))
+        if index < 0:
+            self.Com_ComboBox.addItem(info.label(), QVariant(info.id))
+            index = self.Com_ComboBox.count() - 1
+        else:
+            self.Com_ComboBox.setItemText(index, info.label())
+        self.Com_ComboBox.setItemData(index, QVariant(info.hwid() or info.id), Qt.ToolTipRole)
+        return index
+    #----------------------------------------------------------------------
+
+
+    def selected_port(self):
+        """ id of the port selected in the combobox, None if there is none
+        """
+        index = self.Com_ComboBox.currentIndex()
+        if index < 0:
+            return None
+        return str(self.Com_ComboBox.itemData(index).toString())
+    #----------------------------------------------------------------------
+
+
+    def on_port_added(self, info):
+        """ A port was plugged: add it, and select it again if it is
+            the one last used (found by its id, whatever its device)
+        """
+        index = self.add_port_item(info)
+        if self.Com_ComboBox.isEnabled() and \
+           (info.id == self.last_port or self.Com_ComboBox.count() == 1):
+            self.Com_ComboBox.setCurrentIndex(index)
+        debug("--> port added: %s" % info.label())
+    #----------------------------------------------------------------------
+
+
+    def on_port_removed(self, info):
+        """ A port was unplugged: remove it from the combobox (the
+            reception thread reports the error if it was in use)
+        """
+        if info.id == self.selected_port():
+            self.last_port = info.id
+        self.ports.pop(info.id, None)
+        index = self.Com_ComboBox.findData(QVariant(info.id))
+        if index >= 0:
+            self.Com_ComboBox.removeItem(index)
+        debug("--> port removed: %s" % info.label())
     #----------------------------------------------------------------------
 
 
     def OnStart(self):
         """ Start the monitor: com_monitor thread and the update timer     
         """
+        self.close_playback()
+
         if self.radio19200.isChecked():
             self.baudrate = 19200
-            print "--> baudrate is 19200 bps"
         if self.radio9600.isChecked():
             self.baudrate = 9600
-            print "--> baudrate is 9600 bps"  
+        debug("--> baudrate is %d bps" % self.baudrate)
 
-        vNbCombo    = self.Com_ComboBox.currentIndex()
-        self.port   = self.AvailablePorts[vNbCombo]
+        self.last_port = self.selected_port()
+        if self.last_port is None:
+            QMessageBox.critical(self, 'No ports',
+                'No serial ports found')
+            return
+        self.port   = self.ports[self.last_port].device
+        protocol    = ['binary', 'line'][self.Protocol_ComboBox.currentIndex()]
 
         self.button_Connect.setEnabled(False)
         self.button_Disconnect.setEnabled(True)
         self.Com_ComboBox.setEnabled(False)
-
-        self.data_q      =  Queue.Queue()
-        self.error_q     =  Queue.Queue()
-        self.com_monitor =  ComMonitorThread(
+        self.Protocol_ComboBox.setEnabled(False)
+        self.multi_check.setEnabled(False)
+        self.Overflow_ComboBox.setEnabled(False)
+        self.process_check.setEnabled(False)
+
+        self.samples_seen     = 0
+        self.samples_rendered = 0
+        self.errors           = []
+        self.recording_errors = []
+        METRICS.reset()
+
+        policy  = OVERFLOW_POLICIES[self.Overflow_ComboBox.currentIndex()]
+        replay  = self.port.startswith(REPLAY_PREFIX)
+        process = self.process_check.isChecked() and not replay and not self.multi_check.isChecked()
+        if process:
+            self.data_q      =  SharedSampleRing(DATA_RING_CAPACITY, self.schema.channels,
+                                                 policy = policy)
+            self.error_q     =  multiprocessing.Queue()
+        else:
+            self.data_q      =  SampleRing(DATA_RING_CAPACITY, self.schema.channels,
+                                           policy = policy)
+            self.error_q     =  Queue.Queue()
+            # the reception thread wakes the GUI up when it puts data
+            self.data_q.notify = self.notifier.notify
+        if self.multi_check.isChecked() and not replay:
+            ports = [info.device for info in self.port_scanner.ports()]
+            self.com_monitor = MultiPortMonitorThread(
+                                            self.data_q,
+                                            self.error_q,
+                                            [(port, self.baudrate, protocol) for port in ports],
+                                            schema = self.schema)
+            self.setup_rigs(range(len(ports)))
+        elif replay:
+            self.com_monitor = ReplayThread(
+                                            self.data_q,
+                                            self.error_q,
+                                            self.port[len(REPLAY_PREFIX):],
+                                            REPLAY_SPEEDS[self.Replay_ComboBox.currentIndex()][1],
+                                            protocol = protocol,
+                                            schema   = self.schema)
+            self.setup_rigs([0])
+        elif process:
+            self.com_monitor = AcquisitionProcess(
                                             self.data_q,
                                             self.error_q,
                                             self.port,
-                                            self.baudrate)
+                                            self.baudrate,
+                                            port_protocol = protocol,
+                                            schema        = self.schema)
+            self.setup_rigs([0])
+        else:
+            self.com_monitor = ComMonitorThread(
+                                            self.data_q,
+                                            self.error_q,
+                                            self.port,
+                                            self.baudrate,
+                                            port_protocol = protocol,
+                                            schema        = self.schema)
+            self.setup_rigs([0])
         
         self.com_monitor.start()  
 
+        for source_id, rig in self.rigs.items():
+            prefix = ''
+            if len(self.rigs) > 1:
+                prefix = 'rig%d-' % source_id
+            if self.format_combo.currentIndex() == RECORD_BINARY:
+                rig.recorder = BinaryRecorderThread(prefix = prefix, schema = self.schema)
+            elif self.format_combo.currentIndex() == RECORD_ARCHIVE:
+                rig.recorder = ArchiveRecorderThread(prefix = prefix, schema = self.schema)
+            else:
+                rig.recorder = CsvRecorderThread(prefix = prefix,
+                                                 rotate_rows = self.max_spin.value(),
+                                                 schema = self.schema)
+            rig.recorder.start()
+
         com_error = get_item_from_queue(self.error_q)
         if com_error is not None:
-            QMessageBox.critical(self, 'ComMonitorThread error',
-                com_error)
-            self.com_monitor = None  
+            com_errors = [com_error] + drain_queue(self.error_q)
+            if isinstance(self.com_monitor, MultiPortMonitorThread) and self.com_monitor.isAlive():
+                # the ports that could be opened keep running
+                QMessageBox.warning(self, 'MultiPortMonitorThread warning',
+                    '\n'.join(com_errors))
+                self.errors.extend(com_errors)
+            else:
+                QMessageBox.critical(self, 'ComMonitorThread error',
+                    '\n'.join(com_errors))
+                # joins the monitor and the recorders already started
+                self.OnStop()
+                return
 
         self.monitor_active = True
 
-        self.connect(self.timer, SIGNAL('timeout()'), self.on_timer)
-        
+        # a separate process can't notify this one: its ring is polled
         update_freq = self.updatespeed_knob.value()
-        if update_freq > 0:
+        if process and update_freq > 0:
             self.timer.start(1000.0 / update_freq)
         
         self.status_text.setText('Monitor running')
@@ -359,6 +1138,12 @@ class PlottingDataMonitor(QMainWindow):
     #------------------------------------------------------------
 
 
+    def close_playback(self):
+        self.player = None
+        self.playback_box.hide()
+    #-----------------------------------------------
+
+
     def OnStop(self):
         """ Stop the monitor
         """
@@ -366,13 +1151,54 @@ class PlottingDataMonitor(QMainWindow):
             self.com_monitor.join(1000)
             self.com_monitor = None
 
+        for rig in self.rigs.values():
+            if rig.recorder is not None:
+                rig.recorder.join()
+                self.recorder_errors(rig)
+                rig.recorder = None
+
         self.monitor_active = False
         self.button_Connect.setEnabled(True)
         self.button_Disconnect.setEnabled(False)
         self.Com_ComboBox.setEnabled(True)
+        self.Protocol_ComboBox.setEnabled(True)
+        self.multi_check.setEnabled(True)
+        self.Overflow_ComboBox.setEnabled(True)
+        self.process_check.setEnabled(True)
         self.timer.stop()
+        self.frame_timer.stop()
         self.status_text.setText('Monitor idle')
         debug('--> Monitor idle')
+
+        if self.recording_errors:
+            QMessageBox.critical(self, 'Recording error',
+                '\n'.join(self.recording_errors))
+            self.recording_errors = []
+    #-----------------------------------------------
+
+
+    def on_batch_ready(self):
+        """ A batch was put in the ring: redraw now if the last
+            redraw is older than the frame period (1 / update speed),
+            else once the period is over
+        """
+        update_freq = self.updatespeed_knob.value()
+        if update_freq <= 0 or self.frame_timer.isActive():
+            return
+        wait = self.last_frame + 1.0 / update_freq - time.time()
+        if wait <= 0:
+            self.on_frame()
+        else:
+            self.frame_timer.start(int(wait * 1000) + 1)
+    #-----------------------------------------------
+
+
+    def on_frame(self):
+        if self.data_q is None:
+            return
+        self.last_frame = time.time()
+        self.read_serial_data()
+        self.update_monitor()
     #-----------------------------------------------
 
 
@@ -380,14 +1206,118 @@ class PlottingDataMonitor(QMainWindow):
         """ Executed periodically when the monitor update timer
             is fired.
         """
-        self.read_serial_data()
+        if self.player is not None:
+            self.read_playback_data()
+        else:
+            self.read_serial_data()
         self.update_monitor()
 	#-----------------------------------------------
 
 
+    def on_open_recording(self):
+        """ Open a binary recording and show the playback controls
+        """
+        path = QFileDialog.getOpenFileName(self, 'Open recording', '',
+                    'Recordings (*%s);;All files (*)' % RECORDING_EXTENSION)
+        if path.isEmpty():
+            return
+        try:
+            recording = Recording(str(path))
+        except (IOError, ValueError), e:
+            QMessageBox.critical(self, 'Recording error', str(e))
+            return
+        if recording.schema.channels != self.schema.channels:
+            QMessageBox.critical(self, 'Recording error',
+                '%d channels recorded, the monitor shows %d (MONITOR_SCHEMA)' %
+                (recording.schema.channels, self.schema.channels))
+            return
+
+        if self.monitor_active:
+            self.OnStop()
+        self.setup_rigs([0])
+
+        self.player = RecordingPlayer(recording, self.speed_spin.value())
+        self.position_slider.setRange(0, int(recording.duration() * PLAYBACK_RESOLUTION))
+        self.position_slider.setValue(0)
+        self.button_play.setChecked(False)
+        self.playback_box.setTitle("Playback - %s" % os.path.basename(str(path)))
+        self.playback_box.show()
+
+        self.on_seek(0)
+        self.last_tick = time.time()
+        update_freq = max(0.01, self.updatespeed_knob.value())
+        self.timer.start(1000.0 / update_freq)
+        self.status_text.setText('Playing %d samples' % len(recording))
+    #-----------------------------------------------
+
+
+    def on_play_toggled(self, playing):
+        if self.player is not None:
+            self.player.playing = playing
+        self.button_play.setText("Pause" if playing else "Play")
+    #-----------------------------------------------
+
+
+    def on_speed_change(self):
+        if self.player is not None:
+            self.player.speed = self.speed_spin.value()
+    #-----------------------------------------------
+
+
+    def on_seek(self, value):
+        """ Move the play head: the plot shows the window of samples
+            just before the new position.
+        """
+        if self.player is None or len(self.player.recording) == 0:
+            return
+        self.player.seek(self.player.recording.t[0] + value / float(PLAYBACK_RESOLUTION))
+        timestamps, samples = self.player.window(self.history.capacity)
+        self.history.clear()
+        self.on_resample_change()
+        self.on_spectrum_change()
+        self.on_stats_window_change()
+        self.livefeed.add_data(dict(timestamps = timestamps,
+                                    samples    = samples))
+        self.update_monitor()
+    #-----------------------------------------------
+
+
+    def read_playback_data(self):
+        """ Called periodically by the update timer to play the
+            recording back.
+        """
+        now = time.time()
+        timestamps, samples = self.player.advance(now - self.last_tick)
+        self.last_tick = now
+
+        recording = self.player.recording
+        if len(recording):
+            self.position_slider.setValue(int((self.player.time - recording.t[0]) * PLAYBACK_RESOLUTION))
+            self.position_l.setText('%.2f / %.2f s' % (self.player.time - recording.t[0],
+                                                       recording.duration()))
+        if self.player.at_end():
+            self.button_play.setChecked(False)
+
+        if len(timestamps):
+            self.samples_seen += len(timestamps)
+            self.livefeed.add_data(dict(timestamps = timestamps,
+                                        samples    = samples))
+    #-----------------------------------------------
+
+
+    def on_max_spin_change(self):
+        """ When the csv length is changed, it applies to the next
+            rotation of the recording file.
+        """
+        for rig in self.rigs.values():
+            if rig.recorder is not None:
+                rig.recorder.set_rotate_rows(self.max_spin.value())
+    #-----------------------------------------------
+
+
     def on_knob_change(self):
-        """ When the knob is rotated, it sets the update interval
-            of the timer.
+        """ When the knob is rotated, it sets the maximum redraw
+            frequency (and the interval of the polling timer).
         """
         update_freq = self.updatespeed_knob.value()
         self.knob_l.setText('Update speed = %s (Hz)' % self.updatespeed_knob.value())
@@ -395,6 +1325,10 @@ class PlottingDataMonitor(QMainWindow):
         if self.timer.isActive():
             update_freq = max(0.01, update_freq)
             self.timer.setInterval(1000.0 / update_freq)
+        elif self.monitor_active and update_freq > 0 and self.data_q is not None \
+             and not self.data_q.empty():
+            # data may have been left waiting while the knob was at 0
+            self.on_batch_ready()
     #-----------------------------------------------
 
 
@@ -406,67 +1340,204 @@ class PlottingDataMonitor(QMainWindow):
         """
         if self.livefeed.has_new_data:
             data = self.livefeed.read_data()
+            timestamps, samples = data['timestamps'], data['samples']
+            sources = data.get('sources')
 
-            self.csvdata.append([data['timestamp'], data['gx'], data['gy'], data['gz']] )
-            if len(self.csvdata) > self.max_spin.value():
-                f = open(time.strftime("%H%M%S")+".csv", 'wt')
-                try:
-                    writer = csv.writer(f)
-                    for i in range(self.max_spin.value()):
-                        writer.writerow( self.csvdata[i] )
-                    print 'transfert data to csv after 1000 samples'
-                finally:
-                    f.close()
-                self.csvdata = []
-            
-            self.g_samples[0].append(
-                (data['timestamp'], data['gx']))
-            if len(self.g_samples[0]) > 100:
-                self.g_samples[0].pop(0)
-
-            self.g_samples[1].append(
-                (data['timestamp'], data['gy']))
-            if len(self.g_samples[1]) > 100:
-                self.g_samples[1].pop(0)
-
-            self.g_samples[2].append(
-                (data['timestamp'], data['gz']))
-            if len(self.g_samples[2]) > 100:
-                self.g_samples[2].pop(0)
-
-            tdata = [s[0] for s in self.g_samples[2]]
-
-            for i in range(3):
-                data[i] = [s[1] for s in self.g_samples[i]]
-                if self.gcurveOn[i]:
-                    self.curve[i].setData(tdata, data[i])
-
-            """
-            debug("xdata", data[0])
-            debug("ydata", data[1])
-            debug("tdata", data[2])
-            """
-
-            self.plot.setAxisScale(Qwt.QwtPlot.xBottom, tdata[0], max(5, tdata[-1]) )        
+            if sources is None:
+                batches = [(0, timestamps, samples)]
+            else:
+                batches = [(source_id, timestamps[sources == source_id],
+                            samples[sources == source_id])
+                           for source_id in np.unique(sources)]
+
+            new_spectra = 0
+            for source_id, t, values in batches:
+                rig = self.rigs.get(source_id)
+                if rig is None:
+                    continue
+                if rig.resampler is not None:
+                    t, values = rig.resampler.push(t, values)
+                    if len(t) == 0:
+                        continue
+                values = rig.filters.process(t, values)
+                summary_due = rig.stats.count // rig.stats.window
+                rig.stats.update(t, values)
+                if rig.trigger is not None:
+                    # only the event windows are plotted and saved
+                    for event_t, event_values, trigger_time in rig.trigger.push(t, values):
+                        if rig.recorder is not None:
+                            rig.recorder.put_comment('trigger t=%.6f' % trigger_time)
+                            rig.recorder.put(event_t, event_values)
+                        rig.history.clear()
+                        rig.history.append(event_t, event_values)
+                        rig.decimator.reset(0, 0)
+                        self.samples_rendered += len(event_t)
+                else:
+                    if rig.recorder is not None:
+                        rig.recorder.put(t, values)
+                    rig.history.append(t, values)
+                    self.samples_rendered += len(t)
+                if rig.recorder is not None and rig.stats.count // rig.stats.window > summary_due:
+                    # a summary row every time the window is renewed
+                    rig.recorder.put_comment('stats t=%.6f %s' % (t[-1], rig.stats.summary(self.schema.names)))
+                if source_id == 0 and self.spectrum is not None:
+                    new_spectra += self.spectrum.push(t, values)
+
+            shown = [rig for rig in self.rigs.values() if len(rig.history)]
+            if not shown:
+                return
+            for rig in shown:
+                self.update_curves(rig)
+            self.update_stats()
+            self.update_trigger_status()
+            t_start = min(rig.history.times()[0] for rig in shown)
+            t_end   = max(rig.history.times()[-1] for rig in shown)
+
+            x_scale = (t_start, max(5, t_end))
+            if x_scale != self.x_scale:
+                self.plot.setAxisScale(Qwt.QwtPlot.xBottom, *x_scale)
+                self.x_scale = x_scale
             
+            t0 = time.time()
             self.plot.replot()
+            METRICS.histogram('replot_time').observe(time.time() - t0)
+
+            if new_spectra:
+                t0 = time.time()
+                self.update_spectrum()
+                METRICS.histogram('spectrum_time').observe(time.time() - t0)
+
+            self.update_status()
     #-----------------------------------------------
             
             
+    def poll_errors(self):
+        """ Collect the errors reported while running: by the
+            reception thread (a disconnected port...) and by the
+            recorders, which stop on a write error (disk full...)
+        """
+        if self.error_q is not None:
+            self.errors.extend(drain_queue(self.error_q))
+        for rig in self.rigs.values():
+            if rig.recorder is not None and self.recorder_errors(rig):
+                # the recorder thread exits on its error
+                rig.recorder.join()
+                rig.recorder = None
+    #-----------------------------------------------
+
+
+    def recorder_errors(self, rig):
+        """ Collect the errors of the recorder of a rig, return
+            True if there were any
+        """
+        where  = rig.recorder.filename or rig.recorder.directory
+        errors = ['Recording to %s stopped: %s' % (where, error)
+                  for error in drain_queue(rig.recorder.error_q)]
+        self.errors.extend(errors)
+        self.recording_errors.extend(errors)
+        return len(errors) > 0
+    #-----------------------------------------------
+
+
+    def update_status(self):
+        """ Show the pipeline metrics, and the last error, in the
+            status bar
+        """
+        replot = METRICS.histogram('replot_time')
+        text   = 'Monitor running - %d samples received, %d rendered | ' \
+                 '%d bytes, %d frames, %d rejected | queue %d, %d lost | replot %.1f ms' % \
+                 (self.samples_seen, self.samples_rendered,
+                  METRICS.value('bytes_read'), METRICS.value('frames_decoded'),
+                  METRICS.value('frames_rejected'), METRICS.value('data_q_depth'),
+                  METRICS.value('data_q_overflows'), replot.quantile(0.5) * 1e3)
+        if self.errors:
+            text += ' | %d errors, last: %s' % (len(self.errors), self.errors[-1])
+        self.status_text.setText(text)
+    #-----------------------------------------------
+
+
+    def on_dump_metrics(self):
+        """ Save the current pipeline metrics as JSON
+        """
+        path = QFileDialog.getSaveFileName(self, 'Dump metrics',
+                    time.strftime("metrics-%Y%m%d-%H%M%S.json"), 'JSON (*.json)')
+        if path.isEmpty():
+            return
+        f = open(str(path), 'w')
+        try:
+            METRICS.dump(f)
+        finally:
+            f.close()
+    #-----------------------------------------------
+
+
+    def update_curves(self, rig):
+        """ Set the curves data of a rig, reduced to at most two
+            points per pixel column of the canvas once the window
+            holds more samples than the canvas is wide.
+        """
+        width = self.plot.canvas().width()
+        mode  = self.decimation_combo.currentIndex()
+        tdata = rig.history.times()
+
+        pos = None
+        if mode == DECIMATION_MINMAX:
+            pos = rig.decimator.positions(rig.history, width)
+
+        for i in range(len(rig.curve)):
+            if not self.gcurveOn[i]:
+                continue
+            ydata = rig.history.channel(i)
+            if pos is not None:
+                rig.curve[i].setData(tdata[pos[i]], ydata[pos[i]])
+            elif mode == DECIMATION_LTTB and len(ydata) > 2 * width:
+                keep = lttb_positions(tdata, ydata, 2 * width)
+                rig.curve[i].setData(tdata[keep], ydata[keep])
+            else:
+                rig.curve[i].setData(tdata, ydata)
+    #-----------------------------------------------
+
+
     def read_serial_data(self):
         """ Called periodically by the update timer to read data
             from the serial port.
         """
-        qdata = list(get_all_from_queue(self.data_q))
-        # get just the most recent data, others are lost
-        #print "qdata" , qdata
-        if len(qdata) > 0:
-            data = dict(timestamp=qdata[-1][1], 
-                        gx=qdata[-1][0][0],
-                        gy=qdata[-1][0][1],
-                        gz=qdata[-1][0][2]
-                        )
-            self.livefeed.add_data(data)
+        self.poll_errors()
+        if isinstance(self.com_monitor, AcquisitionProcess):
+            self.com_monitor.sync_metrics()
+        METRICS.gauge('data_q_depth').set(self.data_q.qsize())
+        samples, timestamps, sources = self.data_q.get_all()
+        METRICS.gauge('data_q_overflows').set(self.data_q.overflows)
+        if len(timestamps) == 0:
+            return
+
+        start_time = getattr(self.com_monitor, 'start_time', None)
+        if start_time is not None:
+            # time spent in the ring by the oldest sample
+            METRICS.histogram('queue_wait').observe(
+                time.time() - start_time - timestamps[0])
+
+        self.samples_seen += len(timestamps)
+
+        if len(self.rigs) == 1:
+            # a single source, no need to split the samples
+            sources = None
+
+        if not self.lossless_check.isChecked():
+            # get just the most recent data of each source, others are lost
+            if sources is None:
+                keep = [-1]
+            else:
+                ids, last = np.unique(sources[::-1], return_index=True)
+                keep = np.sort(len(sources) - 1 - last)
+                sources = sources[keep]
+            METRICS.counter('samples_dropped').inc(len(timestamps) - len(keep))
+            timestamps = timestamps[keep]
+            samples    = samples[keep]
+
+        self.livefeed.add_data(dict(timestamps = timestamps,
+                                    samples    = samples,
+                                    sources    = sources))
     #-----------------------------------------------
 
 
@@ -504,8 +1575,10 @@ class PlottingDataMonitor(QMainWindow):
     
 
 def main():
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
-    form = PlottingDataMonitor()
+    # set MONITOR_SCHEMA to a schema name or json file for another device
+    form = PlottingDataMonitor(schema = load_schema(os.environ.get('MONITOR_SCHEMA', 'adxl345')))
     form.show()
     app.exec_()
 
@@ -0,0 +1,151 @@
+import bisect, json, threading, time
+
+
+
+class Counter(object):
+    """ A monotonic count (bytes read, frames decoded...)
+    """
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n = 1):
+        self.value += n
+
+    def snapshot(self):
+        return self.value
+#------------------------------------------------------------
+
+
+class Gauge(object):
+    """ The last value of a level (queue depth...)
+    """
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+#------------------------------------------------------------
+
+
+class Histogram(object):
+    """ A distribution of durations in seconds, counted in fixed
+        buckets growing by a factor sqrt(2) from 1 us to ~1 min, so
+        observe() is a bisect and an increment.
+    """
+    bounds = [1e-6 * 2 ** (i / 2.0) for i in range(52)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count  = 0
+        self.sum    = 0.0
+        self.max    = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum   += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """ Upper bound of the bucket holding the q quantile
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        return dict(count = self.count,
+                    mean  = self.sum / self.count if self.count else 0.0,
+                    p50   = self.quantile(0.50),
+                    p99   = self.quantile(0.99),
+                    max   = self.max)
+#------------------------------------------------------------
+
+
+
+class MetricsRegistry(object):
+    """ A registry of named counters, gauges and histograms of the
+        acquisition pipeline.
+
+        The metrics are plain attributes updated without locking
+        (the hot loops only pay for an increment or a bisect), and
+        are created on first use:
+
+            METRICS.counter('bytes_read').inc(len(chunk))
+            METRICS.histogram('decode_time').observe(dt)
+
+        snapshot()/dump(f):
+            All the current values as a dict / written as JSON.
+    """
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.metrics = {}
+        self.created = time.time()
+    #------------------------------------------------------
+
+
+    def get(self, name, kind):
+        metric = self.metrics.get(name)
+        if metric is None:
+            self.lock.acquire()
+            try:
+                metric = self.metrics.setdefault(name, kind())
+            finally:
+                self.lock.release()
+        return metric
+    #------------------------------------------------------
+
+
+    def counter(self, name):
+        return self.get(name, Counter)
+
+    def gauge(self, name):
+        return self.get(name, Gauge)
+
+    def histogram(self, name):
+        return self.get(name, Histogram)
+    #------------------------------------------------------
+
+
+    def value(self, name, default = 0):
+        metric = self.metrics.get(name)
+        if metric is None:
+            return default
+        return metric.value
+    #------------------------------------------------------
+
+
+    def reset(self):
+        self.lock.acquire()
+        try:
+            self.metrics = {}
+            self.created = time.time()
+        finally:
+            self.lock.release()
+    #------------------------------------------------------
+
+
+    def snapshot(self):
+        metrics = dict(self.metrics)
+        return dict(uptime  = time.time() - self.created,
+                    metrics = dict((name, metrics[name].snapshot())
+                                   for name in sorted(metrics)))
+    #------------------------------------------------------
+
+
+    def dump(self, f):
+        json.dump(self.snapshot(), f, indent=2, sort_keys=True)
+    #------------------------------------------------------
+
+
+METRICS = MetricsRegistry()
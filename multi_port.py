@@ -0,0 +1,173 @@
+import sys, threading, time, select, os, serial
+from globals            import *
+from schema             import DEFAULT_SCHEMA, create_framer
+from timestamps         import SampleClock, monotonic, wire_period
+from metrics            import METRICS
+
+
+
+class MultiPortMonitorThread(threading.Thread):
+    """ A single thread monitoring several COM ports: the port file
+        descriptors are registered in one poll()/select() call that
+        only wakes up when one of them has data to read, instead of
+        one thread per port spinning on its read timeout.
+
+        data_q:
+            Queue for received data. Items in the queue are
+            (samples, timestamps, source_id) tuples: same as
+            ComMonitorThread plus the index of the port in 'ports'.
+            Every port has its own SampleClock.
+
+        error_q:
+            Queue for error messages (a port that fails to open or
+            is disconnected). The other ports keep running.
+
+        ports:
+            A list of (port, baudrate, protocol) tuples, protocol
+            being 'binary' or 'line' as for ComMonitorThread.
+
+        poll_timeout:
+            Maximum time blocked in poll(), only used to notice
+            that the thread was joined.
+
+        schema:
+            The StreamSchema of the samples of all the ports.
+
+        POSIX only: select() can't wait on serial handles on Windows.
+    """
+    def __init__(   self,
+                    data_q, error_q,
+                    ports,
+                    poll_timeout = 0.1,
+                    schema       = DEFAULT_SCHEMA):
+        threading.Thread.__init__(self)
+
+        self.ports        = ports
+        self.poll_timeout = poll_timeout
+        self.schema       = schema
+        self.serial_ports = {}                  # fd -> serial port
+        self.framers      = {}                  # fd -> frame parser
+        self.clocks       = {}                  # fd -> SampleClock
+        self.source_ids   = {}                  # fd -> source id
+
+        self.data_q       = data_q
+        self.error_q      = error_q
+        self.start_time   = None
+
+        self.alive        = threading.Event()
+        self.alive.set()
+    #------------------------------------------------------
+
+
+    def open_ports(self):
+        for source_id, (port, baudrate, protocol) in enumerate(self.ports):
+            try:
+                serial_port = serial.Serial(port = port, baudrate = baudrate, timeout = 0)
+            except serial.SerialException, e:
+                self.error_q.put('%s: %s' % (port, e))
+                continue
+            fd = serial_port.fileno()
+            self.serial_ports[fd] = serial_port
+            self.source_ids[fd]   = source_id
+            self.framers[fd]      = create_framer(protocol, self.schema)
+            samples_per_frame     = getattr(self.framers[fd], 'samples_per_frame', 1)
+            self.clocks[fd]       = SampleClock(samples_per_frame = samples_per_frame,
+                                                link_period       = wire_period(
+                                                    self.framers[fd].frame_size,
+                                                    samples_per_frame, baudrate))
+    #------------------------------------------------------
+
+
+    def close_port(self, fd):
+        self.serial_ports.pop(fd).close()
+        del self.framers[fd]
+        del self.clocks[fd]
+        del self.source_ids[fd]
+    #------------------------------------------------------
+
+
+    def wait_readable(self, poller):
+        """ Return the readable file descriptors, and the ones in
+            error (hang up)
+        """
+        if poller is not None:
+            readable, broken = [], []
+            for fd, event in poller.poll(self.poll_timeout * 1000):
+                if event & select.POLLIN:
+                    readable.append(fd)
+                elif event & (select.POLLHUP | select.POLLERR | select.POLLNVAL):
+                    broken.append(fd)
+            return readable, broken
+        readable, _, broken = select.select(list(self.serial_ports), [],
+                                            list(self.serial_ports), self.poll_timeout)
+        return readable, broken
+    #------------------------------------------------------
+
+
+    def run(self):
+        if os.name == 'nt':
+            self.error_q.put('Multi-port monitoring needs select() on the ports (POSIX only)')
+            return
+        self.open_ports()
+        if not self.serial_ports:
+            return
+
+        # poll() where there is one, select() else and on Mac OS X (its
+        # poll() doesn't support terminal devices)
+        poller = None
+        if hasattr(select, 'poll') and sys.platform != 'darwin':
+            poller = select.poll()
+            for fd in self.serial_ports:
+                poller.register(fd, select.POLLIN | select.POLLHUP | select.POLLERR)
+
+        self.start_time = time.time()
+        startTime       = monotonic()
+        bytes_read      = METRICS.counter('bytes_read')
+        frames_decoded  = METRICS.counter('frames_decoded')
+        frames_rejected = METRICS.counter('frames_rejected')
+
+        while self.alive.isSet() and self.serial_ports:
+            readable, broken = self.wait_readable(poller)
+            now = monotonic()
+
+            for fd in readable:
+                try:
+                    chunk = os.read(fd, 65536)
+                except OSError, e:
+                    chunk = ''
+                if not chunk:
+                    broken.append(fd)
+                    continue
+                bytes_read.inc(len(chunk))
+
+                framer  = self.framers[fd]
+                decoded  = framer.frames_decoded
+                rejected = framer.frames_rejected
+                frames   = framer.feed(chunk)
+                if framer.frames_rejected != rejected:
+                    frames_rejected.inc(framer.frames_rejected - rejected)
+                if len(frames) == 0:
+                    continue
+                frames_decoded.inc(framer.frames_decoded - decoded)
+
+                samples    = self.schema.decode(frames)
+                timestamps = self.clocks[fd].stamp(now - startTime, len(samples),
+                                                   getattr(framer, 'last_sequences', None))
+                self.data_q.put((samples, timestamps, self.source_ids[fd]))
+
+            for fd in set(broken):
+                if fd in self.serial_ports:
+                    self.error_q.put('%s disconnected' % self.serial_ports[fd].port)
+                    if poller is not None:
+                        poller.unregister(fd)
+                    self.close_port(fd)
+
+        # clean up
+        for fd in list(self.serial_ports):
+            self.close_port(fd)
+    #------------------------------------------------------
+
+
+    def join(self, timeout=None):
+        self.alive.clear()
+        threading.Thread.join(self, timeout)
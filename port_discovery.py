@@ -0,0 +1,279 @@
+import os, glob, threading, serial
+
+try:
+    from serial.tools import list_ports             # pyserial >= 2.6
+except ImportError:
+    list_ports = None
+
+
+
+SYSFS_TTY   = '/sys/class/tty'
+SERIAL_BY_ID = '/dev/serial/by-id'
+
+
+class PortInfo(object):
+    """ A serial port found by the discovery.
+
+        id:
+            Stable identifier: the /dev/serial/by-id name of the
+            device when there is one (the same whatever the USB
+            plug order), else the device path.
+
+        device:
+            Path (or COMn name) to open.
+
+        description/driver/vid/pid/serial_number/manufacturer:
+            What is known about the device, '' or None otherwise.
+    """
+    def __init__(self, device, id = None, description = '', driver = '',
+                 vid = None, pid = None, serial_number = '', manufacturer = ''):
+        self.device        = device
+        self.id            = id or device
+        self.description   = description
+        self.driver        = driver
+        self.vid           = vid
+        self.pid           = pid
+        self.serial_number = serial_number
+        self.manufacturer  = manufacturer
+    #------------------------------------------------------
+
+
+    def label(self):
+        """ Text of the port in a combobox
+        """
+        if self.description:
+            return '%s - %s' % (self.device, self.description)
+        return self.device
+
+    def hwid(self):
+        if self.vid is None:
+            return self.driver
+        return 'USB VID:PID=%04X:%04X SER=%s' % (self.vid, self.pid, self.serial_number)
+    #------------------------------------------------------
+
+
+    def __eq__(self, other):
+        return isinstance(other, PortInfo) and self.__dict__ == other.__dict__
+
+    def __ne__(self, other):
+        return not self == other
+#------------------------------------------------------------
+
+
+def read_attribute(path, name):
+    try:
+        f = open(os.path.join(path, name))
+    except IOError:
+        return ''
+    try:
+        return f.read().strip()
+    finally:
+        f.close()
+#------------------------------------------------------------
+
+
+def sysfs_port(name):
+    """ PortInfo of /sys/class/tty/<name>, None if it isn't backed
+        by a device (virtual consoles, ptys) or is one of the
+        placeholders of the legacy 8250 driver
+    """
+    link = os.path.join(SYSFS_TTY, name, 'device')
+    if not os.path.exists(link):
+        return None
+    device = os.path.realpath(link)
+    if os.path.basename(os.path.realpath(os.path.join(device, 'subsystem'))) == 'platform':
+        return None
+    info = PortInfo('/dev/' + name)
+    if os.path.exists(os.path.join(device, 'driver')):
+        info.driver = os.path.basename(os.path.realpath(os.path.join(device, 'driver')))
+
+    # the USB attributes are on the usb device, above the interface
+    path = device
+    for level in range(3):
+        if os.path.exists(os.path.join(path, 'idVendor')):
+            try:
+                info.vid       = int(read_attribute(path, 'idVendor'), 16)
+                info.pid       = int(read_attribute(path, 'idProduct'), 16)
+            except ValueError:
+                # empty or garbled attribute: the ids are unknown
+                info.vid = info.pid = None
+            info.serial_number = read_attribute(path, 'serial')
+            info.manufacturer  = read_attribute(path, 'manufacturer')
+            info.description   = read_attribute(path, 'product')
+            break
+        path = os.path.dirname(path)
+    if not info.description:
+        info.description = info.driver
+    return info
+#------------------------------------------------------------
+
+
+def scan_sysfs():
+    ports = {}
+    by_id = {}
+    for link in glob.glob(os.path.join(SERIAL_BY_ID, '*')):
+        by_id[os.path.realpath(link)] = os.path.basename(link)
+    for name in os.listdir(SYSFS_TTY):
+        info = sysfs_port(name)
+        if info is not None:
+            info.id = by_id.get(info.device, info.device)
+            ports[info.id] = info
+    return ports
+#------------------------------------------------------------
+
+
+def scan_list_ports():
+    ports = {}
+    for port in list_ports.comports():
+        if isinstance(port, tuple):
+            # pyserial < 3.0: (device, description, hwid)
+            info = PortInfo(port[0], description = port[1])
+        else:
+            info = PortInfo(port.device, description = port.description,
+                            vid = port.vid, pid = port.pid,
+                            serial_number = port.serial_number or '',
+                            manufacturer = port.manufacturer or '')
+            if port.description == 'n/a':
+                info.description = ''
+        ports[info.id] = info
+    return ports
+#------------------------------------------------------------
+
+
+def probe_ports():
+    """ Last resort, without sysfs nor serial.tools: open the
+        COM ports one by one on Windows (slow), list the tty
+        devices elsewhere
+    """
+    ports = {}
+    if os.name == 'nt':
+        for i in range(256):
+            try:
+                s = serial.Serial(i)
+                ports[s.portstr] = PortInfo(s.portstr)
+                s.close()
+            except serial.SerialException:
+                pass
+    else:
+        for device in glob.glob('/dev/tty.*') + glob.glob('/dev/ttyUSB*') + glob.glob('/dev/ttyACM*'):
+            ports[device] = PortInfo(device)
+    return ports
+#------------------------------------------------------------
+
+
+# the scans cheap enough to be repeated to follow the hotplug
+FAST_SCAN = os.path.isdir(SYSFS_TTY) or list_ports is not None
+
+
+def scan_ports():
+    """
+    Purpose:    list the serial ports with their description
+    Return:     a dict of PortInfo by id
+    """
+    if os.path.isdir(SYSFS_TTY):
+        return scan_sysfs()
+    if list_ports is not None:
+        return scan_list_ports()
+    return probe_ports()
+#------------------------------------------------------------
+
+
+def resolve_port(name, ports = None):
+    """ Device path of a port given by its id (a /dev/serial/by-id
+        name) or by its device path
+    """
+    if ports is None:
+        ports = scan_ports()
+    if name in ports:
+        return ports[name].device
+    return name
+#------------------------------------------------------------
+
+
+
+class PortScanner(threading.Thread):
+    """ A thread scanning the serial ports in the background, so
+        listing them never blocks the GUI: the result is cached and
+        the changes are reported to callbacks.
+
+        added(info)/removed(info):
+            Called from the scanner thread with the PortInfo of a
+            port plugged or unplugged (or whose metadata changed:
+            removed then added).
+
+        interval:
+            Seconds between two scans. When the only scan available
+            is the slow probe of the ports, it is only done at the
+            start and on rescan().
+
+        ports():
+            The cached PortInfo, sorted by device.
+
+        rescan():
+            Scan now.
+    """
+    def __init__(self, added = None, removed = None, interval = 1.0):
+        threading.Thread.__init__(self)
+        self.daemon   = True
+
+        self.added    = added
+        self.removed  = removed
+        self.interval = interval if FAST_SCAN else None
+        self.lock     = threading.Lock()
+        self.cache    = {}
+        self.scanned  = threading.Event()       # set after the first scan
+
+        self.wake     = threading.Event()
+        self.alive    = threading.Event()
+        self.alive.set()
+    #------------------------------------------------------
+
+
+    def ports(self):
+        self.lock.acquire()
+        try:
+            return sorted(self.cache.values(), key = lambda info: info.device)
+        finally:
+            self.lock.release()
+    #------------------------------------------------------
+
+
+    def rescan(self):
+        self.wake.set()
+    #------------------------------------------------------
+
+
+    def scan(self):
+        """ Scan once, update the cache and report the changes
+        """
+        found = scan_ports()
+        self.lock.acquire()
+        try:
+            old, self.cache = self.cache, found
+        finally:
+            self.lock.release()
+        for port_id, info in sorted(old.items()):
+            if found.get(port_id) != info and self.removed is not None:
+                self.removed(info)
+        for port_id, info in sorted(found.items()):
+            if old.get(port_id) != info and self.added is not None:
+                self.added(info)
+        self.scanned.set()
+    #------------------------------------------------------
+
+
+    def run(self):
+        while self.alive.isSet():
+            try:
+                self.scan()
+            except (IOError, OSError, ValueError):
+                pass
+            self.wake.wait(self.interval)
+            self.wake.clear()
+    #------------------------------------------------------
+
+
+    def join(self, timeout=None):
+        self.alive.clear()
+        self.wake.set()
+        threading.Thread.join(self, timeout)
@@ -0,0 +1,337 @@
+import Queue, threading, time, os, csv, errno
+import numpy as np
+from globals            import *
+from recording          import make_header, to_records, RECORDING_EXTENSION
+from archive            import ArchiveWriter, ARCHIVE_EXTENSION, ARCHIVE_CHUNK_SECONDS, ARCHIVE_ZLIB
+from schema             import DEFAULT_SCHEMA
+from metrics            import METRICS
+
+
+
+def unique_filename(directory, prefix, extension):
+    """
+    Purpose:    create a new empty file named after the current time
+    Return:     the path of the created file; a counter is added to the
+                name so two files created in the same second never
+                overwrite each other
+    """
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    index = 0
+    while True:
+        name = os.path.join(directory, "%s%s-%03d%s" % (prefix, stamp, index, extension))
+        try:
+            os.close(os.open(name, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return name
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+            index += 1
+#------------------------------------------------------------
+
+
+
+class CsvRecorderThread(threading.Thread):
+    """ A thread writing the received samples to csv files, so
+        the disk latency never stalls the plotting or the serial
+        port draining.
+
+        put(timestamps, samples):
+            Hand a batch over to the thread. Never blocks: if the
+            bounded queue is full (the disk can't keep up), the
+            batch is dropped and counted in rows_dropped.
+
+        put_comment(text):
+            Write a '#' prefixed line between the rows (summary
+            statistics...), skipped by the csv readers.
+
+        directory/prefix:
+            Where and how the files are named:
+            <prefix><date>-<time>-<index>.csv
+
+        rotate_rows/rotate_bytes/rotate_seconds:
+            A new file is started once the current one holds
+            this many rows, bytes or seconds of recording (0 or
+            None to disable a criterion). Change rotate_rows with
+            set_rotate_rows() while the thread runs.
+
+        queue_size:
+            Number of batches the hand-off queue can hold.
+
+        buffer_size:
+            Size of the file write buffer.
+
+        schema:
+            The StreamSchema of the samples: the columns of the
+            files, named in a '#' header line.
+
+        The files are flushed and closed when the thread is
+        joined, after the pending batches are written.
+
+        error_q:
+            Queue for error messages: on a write error (disk full,
+            permissions...) the error is placed into this queue
+            and the thread stops recording.
+    """
+    def __init__(   self,
+                    directory      = '.',
+                    prefix         = '',
+                    rotate_rows    = 1000,
+                    rotate_bytes   = None,
+                    rotate_seconds = None,
+                    queue_size     = 256,
+                    buffer_size    = 1 << 16,
+                    schema         = DEFAULT_SCHEMA):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.directory      = directory
+        self.prefix         = prefix
+        self.rotate_rows    = rotate_rows
+        self.rotate_bytes   = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.buffer_size    = buffer_size
+        self.schema         = schema
+
+        self.batch_q        = Queue.Queue(queue_size)
+        self.settings_lock  = threading.Lock()
+        self.new_settings   = {}                # set from other threads, applied by run()
+        self.error_q        = Queue.Queue()
+
+        self.file           = None
+        self.filename       = None
+        self.rows_written   = 0
+        self.rows_dropped   = 0
+        self.files_written  = 0
+
+        self.alive          = threading.Event()
+        self.alive.set()
+    #------------------------------------------------------
+
+
+    def put(self, timestamps, samples):
+        try:
+            self.batch_q.put_nowait((timestamps, samples))
+        except Queue.Full:
+            self.rows_dropped += len(timestamps)
+            METRICS.counter('recorder_rows_dropped').inc(len(timestamps))
+    #------------------------------------------------------
+
+
+    def set_rotate_rows(self, rotate_rows):
+        """ Change rotate_rows from another thread: applied by the
+            recorder thread before the next batch
+        """
+        self.settings_lock.acquire()
+        try:
+            self.new_settings['rotate_rows'] = rotate_rows
+        finally:
+            self.settings_lock.release()
+    #------------------------------------------------------
+
+
+    def apply_settings(self):
+        self.settings_lock.acquire()
+        try:
+            settings, self.new_settings = self.new_settings, {}
+        finally:
+            self.settings_lock.release()
+        for name, value in settings.items():
+            setattr(self, name, value)
+    #------------------------------------------------------
+
+
+    def put_comment(self, text):
+        try:
+            self.batch_q.put_nowait((None, text))
+        except Queue.Full:
+            pass
+    #------------------------------------------------------
+
+
+    def open_file(self):
+        self.close_file()
+        self.filename   = unique_filename(self.directory, self.prefix, ".csv")
+        self.file       = open(self.filename, 'wb', self.buffer_size)
+        self.writer     = csv.writer(self.file)
+        self.file.write('# %s\r\n' % ','.join(['t (s)'] + self.schema.labels()))
+        self.file_rows  = 0
+        self.file_start = time.time()
+        self.files_written += 1
+        debug('--> recording to', self.filename)
+    #------------------------------------------------------
+
+
+    def close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+    #------------------------------------------------------
+
+
+    def rotation_due(self):
+        if self.file is None:
+            return True
+        if self.rotate_rows and self.file_rows >= self.rotate_rows:
+            return True
+        if self.rotate_bytes and self.file.tell() >= self.rotate_bytes:
+            return True
+        if self.rotate_seconds and time.time() - self.file_start >= self.rotate_seconds:
+            return True
+        return False
+    #------------------------------------------------------
+
+
+    def write_batch(self, timestamps, samples):
+        rows = np.column_stack((timestamps, samples)).tolist()
+        while rows:
+            if self.rotation_due():
+                self.open_file()
+            n = len(rows)
+            rotate_rows = self.rotate_rows
+            if rotate_rows:
+                n = max(1, min(n, rotate_rows - self.file_rows))
+            self.writer.writerows(rows[:n])
+            self.file_rows    += n
+            self.rows_written += n
+            METRICS.counter('csv_rows_written').inc(n)
+            del rows[:n]
+    #------------------------------------------------------
+
+
+    def write_comment(self, text):
+        if self.file is None:
+            self.open_file()
+        self.file.write('# %s\r\n' % text)
+    #------------------------------------------------------
+
+
+    def run(self):
+        try:
+            while self.alive.isSet() or not self.batch_q.empty():
+                try:
+                    timestamps, samples = self.batch_q.get(True, 0.1)
+                except Queue.Empty:
+                    continue
+                self.apply_settings()
+                if timestamps is None:
+                    self.write_comment(samples)
+                else:
+                    self.write_batch(timestamps, samples)
+        except (IOError, OSError), e:
+            self.error_q.put(str(e))
+        finally:
+            # flushing the last rows can fail too (disk full)
+            try:
+                self.close_file()
+            except (IOError, OSError), e:
+                self.error_q.put(str(e))
+    #------------------------------------------------------
+
+
+    def join(self, timeout=None):
+        self.alive.clear()
+        threading.Thread.join(self, timeout)
+#------------------------------------------------------------
+
+
+
+class BinaryRecorderThread(CsvRecorderThread):
+    """ Same as CsvRecorderThread, but the samples are appended to
+        a binary recording (see recording.py): a header followed by
+        fixed-width records of the timestamp and the int16 channels.
+        By default the recording isn't rotated. The records have no
+        room for comments: put_comment() is ignored.
+    """
+    def __init__(self, directory = '.', prefix = '', rotate_rows = None, **kwargs):
+        CsvRecorderThread.__init__(self, directory, prefix, rotate_rows, **kwargs)
+    #------------------------------------------------------
+
+
+    def open_file(self):
+        self.close_file()
+        self.filename   = unique_filename(self.directory, self.prefix, RECORDING_EXTENSION)
+        self.file       = open(self.filename, 'wb', self.buffer_size)
+        self.file.write(make_header(self.schema))
+        self.file_rows  = 0
+        self.file_start = time.time()
+        self.files_written += 1
+        debug('--> recording to', self.filename)
+    #------------------------------------------------------
+
+
+    def write_comment(self, text):
+        pass
+    #------------------------------------------------------
+
+
+    def write_batch(self, timestamps, samples):
+        records = to_records(timestamps, samples, self.schema)
+        while len(records):
+            if self.rotation_due():
+                self.open_file()
+            n = len(records)
+            rotate_rows = self.rotate_rows
+            if rotate_rows:
+                n = max(1, min(n, rotate_rows - self.file_rows))
+            self.file.write(records[:n].tostring())
+            self.file_rows    += n
+            self.rows_written += n
+            METRICS.counter('records_written').inc(n)
+            records = records[n:]
+    #------------------------------------------------------
+
+
+
+class ArchiveRecorderThread(BinaryRecorderThread):
+    """ Same as BinaryRecorderThread, but the samples are written to
+        a chunked compressed archive (see archive.py), for the long
+        unattended runs: the file is several times smaller and a
+        time range is read without scanning it. The last chunk and
+        the index are written when the file is closed.
+
+        chunk_seconds/codec:
+            See ArchiveWriter.
+    """
+    def __init__(self, directory = '.', prefix = '', rotate_rows = None,
+                 chunk_seconds = ARCHIVE_CHUNK_SECONDS, codec = ARCHIVE_ZLIB, **kwargs):
+        BinaryRecorderThread.__init__(self, directory, prefix, rotate_rows, **kwargs)
+        self.chunk_seconds = chunk_seconds
+        self.codec         = codec
+        self.archive       = None
+    #------------------------------------------------------
+
+
+    def open_file(self):
+        self.close_file()
+        self.filename   = unique_filename(self.directory, self.prefix, ARCHIVE_EXTENSION)
+        self.file       = open(self.filename, 'wb', self.buffer_size)
+        self.archive    = ArchiveWriter(self.file, self.schema, self.chunk_seconds, self.codec)
+        self.file_rows  = 0
+        self.file_start = time.time()
+        self.files_written += 1
+        debug('--> recording to', self.filename)
+    #------------------------------------------------------
+
+
+    def close_file(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+        CsvRecorderThread.close_file(self)
+    #------------------------------------------------------
+
+
+    def write_batch(self, timestamps, samples):
+        while len(timestamps):
+            if self.rotation_due():
+                self.open_file()
+            n = len(timestamps)
+            rotate_rows = self.rotate_rows
+            if rotate_rows:
+                n = max(1, min(n, rotate_rows - self.file_rows))
+            self.archive.write(timestamps[:n], samples[:n])
+            self.file_rows    += n
+            self.rows_written += n
+            METRICS.counter('records_written').inc(n)
+            timestamps, samples = timestamps[n:], samples[n:]
+    #------------------------------------------------------
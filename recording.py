@@ -0,0 +1,182 @@
+import os, json, struct
+import numpy as np
+from globals            import *
+from schema             import StreamSchema, DEFAULT_SCHEMA
+
+
+
+#===============================================================================
+# Binary recording file:
+#
+#   magic       8 bytes     'ADXLREC1'
+#   size        uint32      header size, records start at this offset
+#   schema      json        the StreamSchema (channels names, raw type,
+#                           scale, units...), padded with spaces up to a
+#                           multiple of 64 bytes
+#   records     (t, ch0, ch1, ...) as <f8 + n x the raw type in little-endian
+#               (<i2 by default), appended in place
+#===============================================================================
+RECORDING_MAGIC     = 'ADXLREC1'
+RECORDING_EXTENSION = '.adxl'
+HEADER_ALIGN        = 64
+
+
+def record_dtype(schema):
+    """ numpy dtype of one record: timestamp + raw channels
+    """
+    raw = schema.raw_dtype.newbyteorder('<')
+    return np.dtype([('t', '<f8'), ('raw', raw, (schema.channels,))])
+#------------------------------------------------------------
+
+
+def make_header(schema = DEFAULT_SCHEMA):
+    schema = json.dumps(schema.to_dict())
+    size   = len(RECORDING_MAGIC) + 4 + len(schema)
+    size  += -size % HEADER_ALIGN
+    schema = schema.ljust(size - len(RECORDING_MAGIC) - 4)
+    return RECORDING_MAGIC + struct.pack('<I', size) + schema
+#------------------------------------------------------------
+
+
+def read_header(f):
+    """
+    Purpose:    parse the header of an opened recording file
+    Return:     (header size, StreamSchema)
+    """
+    start = f.read(len(RECORDING_MAGIC) + 4)
+    if len(start) < len(RECORDING_MAGIC) + 4 or not start.startswith(RECORDING_MAGIC):
+        raise ValueError('%s is not a binary recording' % getattr(f, 'name', f))
+    size   = struct.unpack('<I', start[len(RECORDING_MAGIC):])[0]
+    schema = json.loads(f.read(size - len(start)))
+    return size, StreamSchema.from_dict(schema)
+#------------------------------------------------------------
+
+
+def to_records(timestamps, samples, schema = DEFAULT_SCHEMA):
+    """ Pack a batch of samples into records, the values are
+        quantized back to the sensor raw counts
+    """
+    rec = np.empty(len(timestamps), dtype=record_dtype(schema))
+    rec['t']   = timestamps
+    rec['raw'] = schema.quantize(samples)
+    return rec
+#------------------------------------------------------------
+
+
+
+class Recording(object):
+    """ A binary recording opened through mmap: opening is instant
+        whatever the file length, only the pages of the accessed
+        slices are read from the disk.
+
+        t:
+            The timestamps of all the records (memory mapped)
+
+        samples(start, stop):
+            The scaled values of the records [start, stop) as an
+            (N, channels) array.
+
+        index(t):
+            Position of the first record at or after time t.
+    """
+    def __init__(self, path):
+        self.path = path
+        f = open(path, 'rb')
+        try:
+            self.header_size, self.schema = read_header(f)
+        finally:
+            f.close()
+
+        self.channels = self.schema.names
+        self.units    = self.schema.units
+        self.dtype    = record_dtype(self.schema)
+
+        count = (os.path.getsize(path) - self.header_size) // self.dtype.itemsize
+        if count > 0:
+            self.records = np.memmap(path, dtype=self.dtype, mode='r',
+                                     offset=self.header_size, shape=(count,))
+        else:
+            self.records = np.empty(0, dtype=self.dtype)
+        self.t = self.records['t']
+    #------------------------------------------------------
+
+
+    def __len__(self):
+        return len(self.records)
+    #------------------------------------------------------
+
+
+    def duration(self):
+        if len(self) == 0:
+            return 0.0
+        return float(self.t[-1] - self.t[0])
+    #------------------------------------------------------
+
+
+    def index(self, t):
+        return int(np.searchsorted(self.t, t))
+    #------------------------------------------------------
+
+
+    def samples(self, start, stop):
+        return self.schema.decode(self.records['raw'][start:stop])
+    #------------------------------------------------------
+
+
+
+class RecordingPlayer(object):
+    """ Plays a Recording back at a given speed: advance() returns
+        the records whose timestamps were reached since the last
+        call, after 'elapsed' seconds of wall clock.
+
+        speed:
+            Playback speed factor (0.1x to 100x).
+
+        seek(t):
+            Move the play head to the recording time t.
+    """
+    def __init__(self, recording, speed = 1.0):
+        self.recording = recording
+        self.speed     = speed
+        self.playing   = False
+        self.position  = 0                      # next record to play
+        self.time      = recording.t[0] if len(recording) else 0.0
+    #------------------------------------------------------
+
+
+    def seek(self, t):
+        self.time     = t
+        self.position = self.recording.index(t)
+    #------------------------------------------------------
+
+
+    def at_end(self):
+        return self.position >= len(self.recording)
+    #------------------------------------------------------
+
+
+    def advance(self, elapsed):
+        """
+        Purpose:    move the play head forward
+        Input:      elapsed: wall clock seconds since the last call
+        Return:     (timestamps, samples) of the records played
+        """
+        if self.playing:
+            self.time += elapsed * self.speed
+        start = self.position
+        stop  = max(start, self.recording.index(self.time))
+        self.position = stop
+        return (np.array(self.recording.t[start:stop]),
+                self.recording.samples(start, stop))
+    #------------------------------------------------------
+
+
+    def window(self, size):
+        """ Return the (timestamps, samples) of the 'size' records
+            before the play head
+        """
+        stop  = self.position
+        start = max(0, stop - size)
+        return (np.array(self.recording.t[start:stop]),
+                self.recording.samples(start, stop))
+    #------------------------------------------------------
@@ -0,0 +1,164 @@
+import threading, time, os
+import numpy as np
+from globals            import *
+from schema             import DEFAULT_SCHEMA, create_framer
+from recording          import Recording, RECORDING_EXTENSION
+from archive            import Archive, ARCHIVE_EXTENSION
+
+
+
+REPLAY_PREFIX = 'replay:'
+
+
+def csv_blocks(path, block):
+    """ (timestamps, samples) blocks of a csv file written by the
+        monitor: timestamp,channels... rows ('#' lines are skipped)
+    """
+    data = np.loadtxt(path, delimiter=',', ndmin=2)
+    for i in xrange(0, len(data), block):
+        yield data[i:i+block, 0], data[i:i+block, 1:]
+#------------------------------------------------------------
+
+
+def recording_blocks(path, block):
+    """ (timestamps, samples) blocks of a binary recording
+    """
+    recording = Recording(path)
+    for i in xrange(0, len(recording), block):
+        yield np.array(recording.t[i:i+block]), recording.samples(i, i+block)
+#------------------------------------------------------------
+
+
+def archive_blocks(path, block):
+    """ (timestamps, samples) blocks of an archive, decompressed
+        one chunk at a time
+    """
+    for timestamps, samples in Archive(path).blocks():
+        for i in xrange(0, len(timestamps), block):
+            yield timestamps[i:i+block], samples[i:i+block]
+#------------------------------------------------------------
+
+
+def raw_blocks(path, block, protocol, rate, schema = DEFAULT_SCHEMA):
+    """ (timestamps, samples) blocks of a raw dump of the bytes
+        received on the port. There is no timestamp in a dump: the
+        samples are spaced by 1/rate seconds.
+    """
+    framer = create_framer(protocol, schema)
+    count = 0
+    f = open(path, 'rb')
+    try:
+        while True:
+            chunk = f.read(block * 16)
+            if not chunk:
+                break
+            samples = schema.decode(framer.feed(chunk))
+            if len(samples):
+                timestamps = (count + np.arange(len(samples))) / float(rate)
+                count += len(samples)
+                yield timestamps, samples
+    finally:
+        f.close()
+#------------------------------------------------------------
+
+
+
+class ReplayThread(threading.Thread):
+    """ A thread replaying a recorded capture as a virtual port:
+        it fills data_q exactly like ComMonitorThread does, so the
+        whole decode/plot/log path can run without a serial port.
+
+        data_q/error_q:
+            Same as ComMonitorThread.
+
+        path:
+            The capture to replay, its type is found from the
+            extension: a csv file written by the monitor, a
+            binary recording (.adxl), an archive (.adxa) or a raw dump of the bytes
+            received on the port (any other extension).
+
+        speed:
+            1.0 replays in real time, N replays N times faster,
+            0 replays as fast as possible.
+
+        block:
+            Number of samples put in data_q at once.
+
+        protocol/rate:
+            Frame format and sample rate of a raw dump.
+
+        schema:
+            The StreamSchema of the samples: decodes a raw dump,
+            the csv files and recordings must have its number of
+            channels.
+    """
+    def __init__(   self,
+                    data_q, error_q,
+                    path,
+                    speed    = 1.0,
+                    block    = 64,
+                    protocol = 'binary',
+                    rate     = 100.0,
+                    schema   = DEFAULT_SCHEMA):
+        threading.Thread.__init__(self)
+
+        self.data_q   = data_q
+        self.error_q  = error_q
+        self.path     = path
+        self.speed    = speed
+        self.block    = block
+        self.protocol = protocol
+        self.rate     = rate
+        self.schema   = schema
+
+        self.alive    = threading.Event()
+        self.alive.set()
+        self.stopped  = threading.Event()       # wakes up the pacing waits
+        self.start_time = None
+    #------------------------------------------------------
+
+
+    def blocks(self):
+        extension = os.path.splitext(self.path)[1].lower()
+        if extension == '.csv':
+            return csv_blocks(self.path, self.block)
+        if extension == RECORDING_EXTENSION:
+            return recording_blocks(self.path, self.block)
+        if extension == ARCHIVE_EXTENSION:
+            return archive_blocks(self.path, self.block)
+        return raw_blocks(self.path, self.block, self.protocol, self.rate, self.schema)
+    #------------------------------------------------------
+
+
+    def run(self):
+        try:
+            blocks = self.blocks()
+            startTime = self.start_time = time.time()
+            t0 = None
+            for timestamps, samples in blocks:
+                if not self.alive.isSet():
+                    break
+                if len(timestamps) == 0:
+                    continue
+                if samples.shape[1] != self.schema.channels:
+                    raise ValueError('%s has %d channels, %d expected' %
+                                     (self.path, samples.shape[1], self.schema.channels))
+                if t0 is None:
+                    t0 = timestamps[0]
+                timestamps = timestamps - t0
+
+                if self.speed > 0:
+                    # wait for the time of the last sample of the block
+                    delay = timestamps[-1] / self.speed - (time.time() - startTime)
+                    if delay > 0:
+                        self.stopped.wait(delay)
+                self.data_q.put((samples, timestamps))
+        except (IOError, ValueError), e:
+            self.error_q.put(str(e))
+    #------------------------------------------------------
+
+
+    def join(self, timeout=None):
+        self.alive.clear()
+        self.stopped.set()
+        threading.Thread.join(self, timeout)
@@ -0,0 +1,185 @@
+import numpy as np
+
+
+
+def spread_ties(t, previous = None):
+    """
+    Purpose:    spread the samples sharing a timestamp (all the samples of
+                one port read are stamped with the read time) evenly over
+                the interval since the previous timestamp
+    Input:      t: (N,) non decreasing timestamps
+                previous: the last timestamp of the previous batch (None:
+                the first group is spread with the spacing of the second)
+    Return:     the (N,) spread timestamps, a group ends at its stamp
+    """
+    n = len(t)
+    if n == 0:
+        return np.asarray(t, dtype=np.float64)
+
+    starts = np.flatnonzero(np.r_[True, t[1:] != t[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    stamps = t[starts].astype(np.float64)
+
+    if previous is None:
+        if len(stamps) > 1:
+            previous = stamps[0] - counts[0] * (stamps[1] - stamps[0]) / counts[1]
+        else:
+            previous = stamps[0]
+    before = np.r_[previous, stamps[:-1]]
+
+    rank = np.arange(n) - np.repeat(starts, counts) + 1
+    return (np.repeat(before, counts) +
+            np.repeat(stamps - before, counts) * rank / np.repeat(counts, counts).astype(np.float64))
+#------------------------------------------------------------
+
+
+def lanczos(x, lobes):
+    """ Lanczos windowed sinc kernel
+    """
+    return np.where(np.abs(x) < lobes, np.sinc(x) * np.sinc(x / lobes), 0.0)
+#------------------------------------------------------------
+
+
+
+class StreamResampler(object):
+    """ Resamples an irregular stream of samples on a uniform time
+        grid (multiples of 1/rate), batch after batch.
+
+        The last input samples are kept between the calls, so the
+        output doesn't depend on where the stream was cut into
+        batches: an output sample is only produced once the input
+        samples it is interpolated from have all been received.
+
+        rate:
+            Output sample rate (Hz).
+
+        method:
+            'linear' interpolation between the two neighbours, or
+            'sinc': Lanczos windowed sinc over 'lobes' neighbours on
+            each side. The input spacing is irregular, so the
+            kernel is scaled by the local input rate and the weights
+            are normalized.
+
+        max_gap:
+            No output is interpolated across a gap of the input
+            longer than this (seconds): the grid resumes after it.
+
+        push(timestamps, samples):
+            Feed a (N,) / (N, channels) batch and return the
+            (timestamps, samples) resampled so far.
+    """
+    def __init__(   self,
+                    rate,
+                    method  = 'linear',
+                    lobes   = 3,
+                    max_gap = 1.0):
+        if method not in ('linear', 'sinc'):
+            raise ValueError('unknown interpolation method %r' % method)
+        self.rate    = float(rate)
+        self.method  = method
+        self.lobes   = lobes if method == 'sinc' else 1
+        self.max_gap = max_gap
+        self.reset()
+    #------------------------------------------------------
+
+
+    def reset(self):
+        self.t          = np.empty(0)
+        self.y          = None
+        self.last_stamp = None                  # last input timestamp, before spreading
+        self.next_index = None                  # grid index of the next output
+    #------------------------------------------------------
+
+
+    def push(self, timestamps, samples):
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        samples    = np.asarray(samples, dtype=np.float64)
+        if samples.ndim == 1:
+            samples = samples[:, None]
+
+        if len(timestamps):
+            t = spread_ties(timestamps, self.last_stamp)
+            self.last_stamp = timestamps[-1]
+            # drop the samples going back in time
+            last = self.t[-1] if len(self.t) else -np.inf
+            keep = t > np.maximum.accumulate(np.r_[last, t])[:-1]
+            t, samples = t[keep], samples[keep]
+        else:
+            t = timestamps
+
+        if self.y is None:
+            self.y = np.empty((0, samples.shape[1]))
+        T = np.r_[self.t, t]
+        Y = np.concatenate((self.y, samples))
+
+        out_t, out_y = self.interpolate(T, Y)
+
+        # keep the samples the next outputs will be interpolated from
+        self.t = T[-2 * self.lobes:]
+        self.y = Y[-2 * self.lobes:]
+        return out_t, out_y
+    #------------------------------------------------------
+
+
+    def interpolate(self, T, Y):
+        n     = len(T)
+        lobes = self.lobes
+        empty = np.empty(0), np.empty((0, Y.shape[1]))
+        if n < 2 * lobes:
+            return empty
+
+        if self.next_index is None:
+            self.next_index = int(np.ceil(T[0] * self.rate))
+
+        # an output needs 'lobes' input samples after it
+        if lobes == 1:
+            last = int(np.floor(T[-1] * self.rate))
+        else:
+            last = int(np.ceil(T[n - lobes] * self.rate)) - 1
+        if last < self.next_index:
+            return empty
+
+        # no output across the gaps, the grid resumes after them
+        pieces = []
+        start  = self.next_index
+        gaps   = np.flatnonzero(np.diff(T) > self.max_gap)
+        for gap in gaps:
+            end = int(np.floor(T[gap] * self.rate))
+            if end > last:
+                # the outputs before this gap aren't all ready yet
+                break
+            if end >= start:
+                pieces.append(np.arange(start, end + 1))
+            start = max(start, int(np.ceil(T[gap + 1] * self.rate)))
+        if last >= start:
+            pieces.append(np.arange(start, last + 1))
+        self.next_index = max(start, last + 1)
+        if not pieces:
+            return empty
+        grid = np.concatenate(pieces) / self.rate
+
+        # first input sample after each output
+        after = np.clip(np.searchsorted(T, grid, 'right'), 1, n - 1)
+        if self.method == 'linear':
+            w = (grid - T[after - 1]) / (T[after] - T[after - 1])
+            return grid, Y[after - 1] + w[:, None] * (Y[after] - Y[after - 1])
+
+        # 2 * lobes neighbours, clipped to the segment between two gaps
+        # holding the output (the samples across a gap are unrelated,
+        # and whether they were received yet depends on the batches)
+        segment = np.searchsorted(gaps, after - 1, 'left')
+        lo  = np.r_[0, gaps + 1][segment]
+        hi  = np.r_[gaps, n - 1][segment]
+        idx = np.clip(after[:, None] + np.arange(-lobes, lobes), lo[:, None], hi[:, None])
+        # kernel scaled by the local input rate around each output
+        span  = T[idx[:, -1]] - T[idx[:, 0]]
+        scale = np.where(span > 0, (idx[:, -1] - idx[:, 0]) / np.where(span > 0, span, 1.0),
+                         self.rate)
+        w = lanczos((grid[:, None] - T[idx]) * scale[:, None], lobes)
+        # a clipped neighbour counts once
+        w[:, 1:][idx[:, 1:] == idx[:, :-1]] = 0.0
+        wsum = w.sum(axis=1)
+        valid = np.abs(wsum) > 1e-6
+        out = np.einsum('ij,ijk->ik', w[valid], Y[idx[valid]]) / wsum[valid, None]
+        return grid[valid], out[valid]
+    #------------------------------------------------------
@@ -0,0 +1,120 @@
+import numpy as np
+
+
+
+class SampleRingBuffer(object):
+    """ A fixed-capacity, preallocated history of timestamps and
+        channel values.
+
+        Every sample is written twice, at index i and i + capacity
+        of arrays twice the capacity long, so the last 'len(self)'
+        samples are always a contiguous slice: times() and
+        channel() return views that can be handed to the curves
+        without copying or reordering anything.
+
+        append(timestamps, samples):
+            Append a batch of N samples in O(N), whatever the
+            capacity: no pop(0), no list rebuilt.
+
+        total:
+            Number of samples appended since the creation (or the
+            last clear), used to address the samples absolutely.
+
+        generation:
+            Incremented by clear() and allocate(): the samples
+            addressed by 'total' before are gone, the caches built
+            on them (see MinMaxDecimator) must be dropped.
+    """
+    def __init__(self, capacity, channels = 3, dtype = np.float32):
+        self.channels   = channels
+        self.dtype      = dtype
+        self.generation = 0
+        self.allocate(capacity)
+    #------------------------------------------------------
+
+
+    def allocate(self, capacity):
+        self.capacity = int(capacity)
+        self.t        = np.zeros(2 * self.capacity, dtype=np.float64)
+        self.values   = np.zeros((self.channels, 2 * self.capacity), dtype=self.dtype)
+        self.total    = 0
+        self.generation += 1
+    #------------------------------------------------------
+
+
+    def clear(self):
+        self.total = 0
+        self.generation += 1
+    #------------------------------------------------------
+
+
+    def resize(self, capacity):
+        """ Change the capacity, keeping the most recent samples
+        """
+        if capacity == self.capacity:
+            return
+        t, values = self.times().copy(), self.values_view().copy()
+        self.allocate(capacity)
+        self.append(t, values.T)
+    #------------------------------------------------------
+
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+    #------------------------------------------------------
+
+
+    def append(self, timestamps, samples):
+        """
+        Purpose:    append a batch of samples
+        Input:      timestamps: (N,) array
+                    samples: (N, channels) array
+        """
+        n = len(timestamps)
+        if n == 0:
+            return
+        cap = self.capacity
+        if n > cap:
+            # only the last 'capacity' samples can be kept
+            self.total += n - cap
+            timestamps  = timestamps[-cap:]
+            samples     = samples[-cap:]
+            n           = cap
+
+        samples = np.asarray(samples).T
+        start   = self.total % cap
+        first   = min(n, cap - start)
+        for lo, hi, src in ((start, start + first, slice(0, first)),
+                            (0, n - first, slice(first, n))):
+            if hi <= lo:
+                continue
+            self.t[lo:hi]                   = timestamps[src]
+            self.t[lo + cap:hi + cap]       = timestamps[src]
+            self.values[:, lo:hi]           = samples[:, src]
+            self.values[:, lo + cap:hi + cap] = samples[:, src]
+        self.total += n
+    #------------------------------------------------------
+
+
+    def window(self):
+        """ Return the slice of the internal arrays holding the
+            current history, from the oldest to the newest sample
+        """
+        end = self.total % self.capacity + self.capacity
+        return slice(end - len(self), end)
+    #------------------------------------------------------
+
+
+    def times(self):
+        return self.t[self.window()]
+    #------------------------------------------------------
+
+
+    def channel(self, i):
+        return self.values[i, self.window()]
+    #------------------------------------------------------
+
+
+    def values_view(self):
+        return self.values[:, self.window()]
+    #------------------------------------------------------
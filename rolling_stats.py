@@ -0,0 +1,247 @@
+import numpy as np
+from ring_buffer        import SampleRingBuffer
+
+
+
+def batch_moments(x):
+    """ (count, mean, M2) of a (N, channels) batch, M2 being the sum
+        of the squared deviations from the mean
+    """
+    mean = x.mean(axis=0)
+    return len(x), mean, ((x - mean) ** 2).sum(axis=0)
+#------------------------------------------------------------
+
+
+def merge_moments(a, b):
+    """ Moments of the union of two sets (Chan et al. parallel
+        variance)
+    """
+    na, ma, m2a = a
+    nb, mb, m2b = b
+    n = na + nb
+    if n == 0:
+        return a
+    delta = mb - ma
+    return n, ma + delta * nb / float(n), m2a + m2b + delta ** 2 * na * nb / float(n)
+#------------------------------------------------------------
+
+
+def remove_moments(a, b):
+    """ Moments of the set 'a' without its subset 'b'
+    """
+    na, ma, m2a = a
+    nb, mb, m2b = b
+    n = na - nb
+    if n <= 0:
+        return 0, np.zeros_like(ma), np.zeros_like(m2a)
+    mean  = (na * ma - nb * mb) / float(n)
+    delta = mb - mean
+    return n, mean, np.maximum(m2a - m2b - delta ** 2 * n * nb / float(na), 0.0)
+#------------------------------------------------------------
+
+
+def dominant_positions(x):
+    """ Positions of the samples of a (N,) batch greater than all
+        the ones after them: the candidates of a sliding maximum
+    """
+    after = np.r_[np.maximum.accumulate(x[::-1])[::-1][1:], -np.inf]
+    return np.flatnonzero(x > after)
+#------------------------------------------------------------
+
+
+
+class SlidingMaximum(object):
+    """ Monotonic deque of the (index, value) candidates of a sliding
+        maximum, in ring arrays of a fixed capacity (the window): the
+        values decrease from the head, the maximum of the window, to
+        the tail.
+
+        push(x, first, oldest):
+            Add the batch x, whose first sample has the index
+            'first', and drop the samples before 'oldest'. The
+            expired entries (head) and the dominated ones (tail) are
+            found by bisection, the entries being sorted, and
+            dropped by moving the pointers: O(batch + log(window))
+            whatever the signal, nothing is copied or rebuilt.
+    """
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.index    = np.zeros(self.capacity, dtype=np.int64)
+        self.value    = np.zeros(self.capacity)
+        self.clear()
+    #------------------------------------------------------
+
+
+    def clear(self):
+        self.head = 0                           # absolute positions, modulo capacity in the arrays
+        self.tail = 0
+    #------------------------------------------------------
+
+
+    def __len__(self):
+        return self.tail - self.head
+    #------------------------------------------------------
+
+
+    def first(self):
+        """ Value at the head, the maximum, NaN if empty
+        """
+        if self.tail == self.head:
+            return np.nan
+        return self.value[self.head % self.capacity]
+    #------------------------------------------------------
+
+
+    def prefix(self, array, test):
+        """ Length of the prefix of the entries whose 'array' value
+            passes test (true for a prefix, false after)
+        """
+        lo, hi = 0, self.tail - self.head
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if test(array[(self.head + mid) % self.capacity]):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+    #------------------------------------------------------
+
+
+    def push(self, x, first, oldest):
+        top = x.max()
+        self.head += self.prefix(self.index, lambda index: index < oldest)
+        self.tail  = self.head + self.prefix(self.value, lambda value: value > top)
+        pos   = dominant_positions(x)
+        slots = (self.tail + np.arange(len(pos))) % self.capacity
+        self.index[slots] = pos + first
+        self.value[slots] = x[pos]
+        self.tail += len(pos)
+    #------------------------------------------------------
+
+
+
+class RollingStats(object):
+    """ Statistics of every channel over the last 'window' samples,
+        updated batch after batch in O(batch) whatever the window:
+
+        - mean and variance: the moments of the new batch are merged
+          and the ones of the samples leaving the window removed
+          (Welford/Chan updates), recomputed exactly once per window
+          to cancel the rounding drift;
+        - min and max: monotonic deques of (index, value) in fixed
+          ring arrays (see SlidingMaximum), fed with the candidates
+          of each batch, so the oldest entry of a deque is the
+          extremum of the window.
+
+        update(timestamps, samples):
+            Add a (N, channels) batch.
+
+        mean, std, rms, min, max, peak_to_peak, crest:
+            (channels,) arrays of the current window.
+    """
+    def __init__(self, window, channels = 3):
+        self.window   = int(window)
+        self.channels = channels
+        self.history  = SampleRingBuffer(self.window, channels, np.float64)
+        self.maxima   = [SlidingMaximum(self.window) for c in range(channels)]
+        self.minima   = [SlidingMaximum(self.window) for c in range(channels)]   # of -x
+        self.reset()
+    #------------------------------------------------------
+
+
+    def reset(self):
+        self.count    = 0                       # samples received
+        self.clear()
+    #------------------------------------------------------
+
+
+    def clear(self):
+        """ Empty the window
+        """
+        self.history.clear()
+        self.moments  = (0, np.zeros(self.channels), np.zeros(self.channels))
+        self.removed  = 0                       # samples removed since the exact computation
+        for deque in self.maxima + self.minima:
+            deque.clear()
+    #------------------------------------------------------
+
+
+    def update(self, timestamps, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        n = len(samples)
+        if n == 0:
+            return
+        if n >= self.window:
+            timestamps, samples = timestamps[-self.window:], samples[-self.window:]
+            self.count += n - self.window
+            self.clear()
+            n = self.window
+
+        leaving = len(self.history) + n - self.window
+        if leaving > 0:
+            self.removed += leaving
+            if self.removed < self.window:
+                old = self.history.values_view()[:, :leaving].T
+                self.moments = remove_moments(self.moments, batch_moments(old))
+        self.history.append(timestamps, samples)
+        if self.removed >= self.window:
+            self.moments = batch_moments(self.history.values_view().T)
+            self.removed = 0
+        else:
+            self.moments = merge_moments(self.moments, batch_moments(samples))
+
+        first = self.count
+        self.count += n
+        oldest = self.count - self.window
+        for c in range(self.channels):
+            x = samples[:, c]
+            self.maxima[c].push(x, first, oldest)
+            self.minima[c].push(-x, first, oldest)
+    #------------------------------------------------------
+
+
+    @property
+    def n(self):
+        return len(self.history)
+
+    @property
+    def mean(self):
+        return self.moments[1]
+
+    @property
+    def std(self):
+        return np.sqrt(self.moments[2] / max(1, self.moments[0]))
+
+    @property
+    def rms(self):
+        return np.sqrt(self.mean ** 2 + self.std ** 2)
+
+    @property
+    def max(self):
+        return np.array([deque.first() for deque in self.maxima])
+
+    @property
+    def min(self):
+        return -np.array([deque.first() for deque in self.minima])
+
+    @property
+    def peak_to_peak(self):
+        return self.max - self.min
+
+    @property
+    def crest(self):
+        rms = self.rms
+        return np.maximum(np.abs(self.max), np.abs(self.min)) / np.where(rms > 0, rms, np.nan)
+    #------------------------------------------------------
+
+
+    def summary(self, labels = 'xyz'):
+        """ One line text of the current statistics
+        """
+        parts = ['window=%d' % self.n]
+        for c, label in enumerate(labels[:self.channels]):
+            parts.append('%s mean=%.5f std=%.5f rms=%.5f min=%.5f max=%.5f p2p=%.5f crest=%.3f' %
+                         (label, self.mean[c], self.std[c], self.rms[c], self.min[c],
+                          self.max[c], self.peak_to_peak[c], self.crest[c]))
+        return ' | '.join(parts)
+    #------------------------------------------------------
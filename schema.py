@@ -0,0 +1,225 @@
+import os, json
+import numpy as np
+from globals            import *
+from framing            import LineFrameSplitter
+from codec              import BinaryFrameCodec, SAMPLES_PER_FRAME
+
+
+
+class StreamSchema(object):
+    """ Declarative description of the samples sent by a device,
+        compiled once into the numpy dtype and per channel arrays
+        the whole batch is decoded with: one frombuffer/view and one
+        multiply-add per batch, whatever the number of channels.
+
+        names:
+            Channel names, their number gives the channel count.
+
+        dtype/endian:
+            Raw type of every channel on the wire ('i2', 'u2',
+            'i4', 'f4'...) and its byte order ('<' or '>').
+
+        scale/offset:
+            value = raw * scale + offset, a number for all the
+            channels or a list with one per channel.
+
+        units:
+            A unit for all the channels or a list, one per channel.
+
+        title:
+            What is measured, shown on the plot.
+
+        range:
+            (min, max) of the plot vertical axis, the full scale of
+            the raw type by default.
+
+        burst:
+            Samples per frame of the binary protocol (a FIFO burst).
+
+        decode(frames):
+            (N, channels) float64 values of raw payload bytes, an
+            uint8 array of frames, or an already decoded raw array.
+
+        quantize(samples):
+            Raw values of scaled samples, back in the wire type (in
+            native byte order).
+    """
+    def __init__(   self,
+                    names   = ('x', 'y', 'z'),
+                    dtype   = 'i2',
+                    endian  = '<',
+                    scale   = SCALE_MULTIPLIER,
+                    offset  = 0.0,
+                    units   = 'g',
+                    title   = 'Acceleration',
+                    range   = None,
+                    burst   = SAMPLES_PER_FRAME):
+        if endian not in '<>':
+            raise ValueError('unknown byte order %r' % endian)
+        self.names    = list(names)
+        self.channels = len(self.names)
+        self.dtype    = np.dtype(dtype).str[1:]
+        self.endian   = endian
+        self.title    = title
+        self.burst    = int(burst)
+
+        # compiled layout
+        self.raw_dtype  = np.dtype(endian + self.dtype)
+        self.frame_size = self.raw_dtype.itemsize * self.channels
+        self.scale      = self.per_channel(scale, 'scale').astype(np.float64)
+        self.offset     = self.per_channel(offset, 'offset').astype(np.float64)
+        self.units      = map(str, self.per_channel(units, 'units'))
+        self.has_offset = bool(self.offset.any())
+
+        if self.raw_dtype.kind in 'iu':
+            info = np.iinfo(self.raw_dtype)
+            self.raw_min, self.raw_max = info.min, info.max
+        else:
+            self.raw_min, self.raw_max = -np.inf, np.inf
+        if range is None:
+            limits = np.array([self.raw_min, self.raw_max]) * self.scale.max() + self.offset.min()
+            range  = (float(limits.min()), float(limits.max()))
+        self.range = tuple(range)
+    #------------------------------------------------------
+
+
+    def per_channel(self, value, name):
+        """ (channels,) array of a value given for all the channels
+            or as a list
+        """
+        if np.ndim(value) == 0:
+            return np.array([value] * self.channels)
+        value = np.asarray(value)
+        if len(value) != self.channels:
+            raise ValueError('%d %s values for %d channels' % (len(value), name, self.channels))
+        return value
+    #------------------------------------------------------
+
+
+    def labels(self):
+        """ 'name (unit)' of every channel
+        """
+        return ['%s (%s)' % (name, unit) for name, unit in zip(self.names, self.units)]
+    #------------------------------------------------------
+
+
+    def decode(self, frames):
+        if not isinstance(frames, np.ndarray):
+            raw = np.frombuffer(frames, dtype=self.raw_dtype)
+        elif frames.dtype == np.uint8:
+            raw = np.ascontiguousarray(frames).view(self.raw_dtype)
+        else:
+            raw = frames
+        raw = raw.reshape(-1, self.channels)
+        if self.has_offset:
+            return raw * self.scale + self.offset
+        return raw * self.scale
+    #------------------------------------------------------
+
+
+    def quantize(self, samples):
+        raw = (np.asarray(samples) - self.offset) / self.scale
+        if self.raw_dtype.kind in 'iu':
+            raw = np.clip(np.rint(raw), self.raw_min, self.raw_max)
+        return raw.astype(self.raw_dtype.newbyteorder('='))
+    #------------------------------------------------------
+
+
+    def to_dict(self):
+        """ The schema as saved in the recordings headers
+        """
+        return dict(channels = self.names,
+                    dtype    = self.dtype,
+                    endian   = self.endian,
+                    scale    = self.scale.tolist(),
+                    offset   = self.offset.tolist(),
+                    units    = self.units,
+                    title    = self.title,
+                    range    = list(self.range),
+                    burst    = self.burst)
+
+    @classmethod
+    def from_dict(cls, d):
+        """ Schema of a dict written by to_dict(), or by older
+            recordings (channels, scale and units only)
+        """
+        return cls(d['channels'],
+                   d.get('dtype', 'i2'),
+                   d.get('endian', '<'),
+                   d.get('scale', SCALE_MULTIPLIER),
+                   d.get('offset', 0.0),
+                   d.get('units', 'g'),
+                   d.get('title', 'Acceleration'),
+                   d.get('range'),
+                   d.get('burst', SAMPLES_PER_FRAME))
+    #------------------------------------------------------
+
+
+    # the compiled arrays are rebuilt when sent to another process
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        state = dict(state)
+        names = state.pop('channels')
+        self.__init__(names, **state)
+    #------------------------------------------------------
+
+
+    def __eq__(self, other):
+        return isinstance(other, StreamSchema) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+#------------------------------------------------------------
+
+
+
+# Known devices (MONITOR_SCHEMA / --schema name)
+SCHEMAS = {
+    # ADXL345 at +/-4 g, full resolution
+    'adxl345':      StreamSchema(range = (YMIN, YMAX)),
+    # same, the 32 samples of the FIFO sent in one frame
+    'adxl345-fifo': StreamSchema(range = (YMIN, YMAX), burst = 32),
+    # ITG-3200 gyroscope: big-endian registers, 14.375 LSB per deg/s
+    'itg3200':      StreamSchema(dtype = 'i2', endian = '>', scale = 1 / 14.375,
+                                 units = 'deg/s', title = 'Angular rate',
+                                 range = (-2000, 2000)),
+    # MPU-6050 at +/-2 g and +/-250 deg/s: accelerometer then gyroscope
+    'mpu6050':      StreamSchema(names  = ('ax', 'ay', 'az', 'gx', 'gy', 'gz'),
+                                 endian = '>',
+                                 scale  = [1 / 16384.0] * 3 + [1 / 131.0] * 3,
+                                 units  = ['g'] * 3 + ['deg/s'] * 3,
+                                 title  = 'Acceleration / angular rate',
+                                 range  = (-250, 250)),
+}
+DEFAULT_SCHEMA = SCHEMAS['adxl345']
+
+
+def load_schema(name):
+    """
+    Purpose:    get a schema by name
+    Input:      name: one of SCHEMAS, or the path of a json file
+                holding a schema dict (see StreamSchema.to_dict)
+    Return:     the StreamSchema
+    """
+    if name in SCHEMAS:
+        return SCHEMAS[name]
+    if not os.path.isfile(name):
+        raise ValueError('unknown schema %r (known: %s)' % (name, ', '.join(sorted(SCHEMAS))))
+    f = open(name)
+    try:
+        return StreamSchema.from_dict(json.load(f))
+    finally:
+        f.close()
+#------------------------------------------------------------
+
+
+def create_framer(protocol, schema = DEFAULT_SCHEMA):
+    """ Return the incremental frame parser of a protocol for the
+        samples of a schema
+    """
+    if protocol == 'line':
+        return LineFrameSplitter(schema.frame_size)
+    return BinaryFrameCodec(schema.channels, schema.burst, dtype = schema.raw_dtype)
+#------------------------------------------------------------
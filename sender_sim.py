@@ -2,6 +2,8 @@
 
 import random, time, math, os, serial
 
+from codec import BinaryFrameCodec
+
 if os.name  == 'nt':
     port = "com1"
 else:
@@ -9,23 +11,28 @@ else:
 
 ser = serial.Serial(port, 9600)
 
+codec = BinaryFrameCodec()
 
 incycle = 0
+seq     = 0
 
 while True:
-    a = int(random.randint(60, 80) * (1 + math.sin(incycle)))
-    b = int(random.randint(60, 80) * (1 + math.sin(incycle)))
-    c = int(random.randint(60, 80) * (1 + math.sin(incycle)))
-
-    # send a sequence of 6 bytes followed by space (end of frame marker)
-    data = chr(a) + " " + chr(0) + " " + chr(b) + " " + chr(1) + " " + chr(c)+ " " + chr(0)
-    x = ser.write(data+'\n')
-      
-    time.sleep(0.02)
-    
-    incycle += 0.01
-    if incycle >= 2 * math.pi:
-        incycle = 0
+    samples = []
+    for i in range(codec.samples_per_frame):
+        a = int(random.randint(60, 80) * (1 + math.sin(incycle)))
+        b = int(random.randint(60, 80) * (1 + math.sin(incycle))) + 256
+        c = int(random.randint(60, 80) * (1 + math.sin(incycle)))
+        samples.append((a, b, c))
+
+        incycle += 0.01
+        if incycle >= 2 * math.pi:
+            incycle = 0
+
+    # send one binary frame: sync word, sequence counter, samples and crc
+    x = ser.write(codec.encode(samples, seq))
+    seq += 1
+
+    time.sleep(0.02 * codec.samples_per_frame)
 
 ser.close()
 
@@ -0,0 +1,110 @@
+import multiprocessing, ctypes, serial
+from multiprocessing.sharedctypes import RawArray, RawValue
+from globals            import *
+from com_monitor        import ComMonitorThread
+from schema             import DEFAULT_SCHEMA
+from metrics            import METRICS
+
+
+
+# Reception metrics copied from the acquisition process
+SHARED_METRICS = ['bytes_read', 'frames_decoded', 'frames_rejected']
+
+
+class AcquisitionProcess(multiprocessing.Process):
+    """ Runs a ComMonitorThread in a separate process, so the port
+        reads and the decoding don't wait for the GIL of the GUI
+        process (replot, csv writes...).
+
+        The interface is the one of ComMonitorThread: same
+        arguments, start(), join(timeout) and start_time, so it can
+        be used in its place.
+
+        data_q:
+            A SharedSampleRing (see spsc_ring.py): the samples are
+            written in shared memory by the acquisition process.
+            Once started, the ring is mapped read-only on this side.
+
+        error_q:
+            A multiprocessing.Queue for the error messages of the
+            port (get_item_from_queue works the same).
+
+        sync_metrics():
+            Copy the reception counters of the acquisition process
+            in the METRICS of this process.
+    """
+    def __init__(   self,
+                    data_q, error_q,
+                    port_num,
+                    port_baud,
+                    port_stopbits  = serial.STOPBITS_ONE,
+                    port_parity    = serial.PARITY_NONE,
+                    port_timeout   = 0.01,
+                    port_read_size = None,
+                    port_protocol  = 'binary',
+                    schema         = DEFAULT_SCHEMA):
+        multiprocessing.Process.__init__(self)
+        self.daemon      = True
+
+        self.monitor_arg = dict(port_stopbits  = port_stopbits,
+                                port_parity    = port_parity,
+                                port_timeout   = port_timeout,
+                                port_read_size = port_read_size,
+                                port_protocol  = port_protocol,
+                                schema         = schema)
+        self.port        = (port_num, port_baud)
+
+        self.data_q      = data_q
+        self.error_q     = error_q
+        self.stop_event  = multiprocessing.Event()
+        self.shared_time = RawValue(ctypes.c_double, 0.0)
+        self.metrics     = RawArray(ctypes.c_double, len(SHARED_METRICS))
+    #------------------------------------------------------
+
+
+    @property
+    def start_time(self):
+        return self.shared_time.value or None
+    #------------------------------------------------------
+
+
+    def isAlive(self):
+        return self.is_alive()
+    #------------------------------------------------------
+
+
+    def start(self):
+        multiprocessing.Process.start(self)
+        self.data_q.map_readonly()
+    #------------------------------------------------------
+
+
+    def run(self):
+        # the errors are only messages: don't wait for them to be
+        # read before exiting
+        self.error_q.cancel_join_thread()
+
+        monitor = ComMonitorThread(self.data_q, self.error_q,
+                                   self.port[0], self.port[1], **self.monitor_arg)
+        monitor.start()
+        while monitor.isAlive() and not self.stop_event.wait(0.1):
+            if monitor.start_time is not None:
+                self.shared_time.value = monitor.start_time
+            for i, name in enumerate(SHARED_METRICS):
+                self.metrics[i] = METRICS.value(name)
+        monitor.join()
+    #------------------------------------------------------
+
+
+    def sync_metrics(self):
+        for i, name in enumerate(SHARED_METRICS):
+            METRICS.counter(name).value = int(self.metrics[i])
+    #------------------------------------------------------
+
+
+    def join(self, timeout=None):
+        self.stop_event.set()
+        multiprocessing.Process.join(self, timeout)
+        if self.is_alive():
+            self.terminate()
+            multiprocessing.Process.join(self, timeout)
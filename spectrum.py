@@ -0,0 +1,166 @@
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+
+WINDOW_FUNCTIONS = dict(hann     = np.hanning,
+                        hamming  = np.hamming,
+                        blackman = np.blackman,
+                        rect     = np.ones)
+
+
+def magnitude_db(magnitude, floor = 1e-9):
+    """ Magnitude in dB (20 log10), clipped at 'floor'
+    """
+    return 20 * np.log10(np.maximum(magnitude, floor))
+#------------------------------------------------------------
+
+
+
+class StreamingSpectrum(object):
+    """ Short-time spectra of a stream of samples, computed
+        incrementally: every push() only transforms the windows
+        completed by the new samples (one hop each), all of them in
+        one vectorized rfft.
+
+        size:
+            Number of samples per FFT window.
+
+        overlap:
+            Fraction of a window shared with the next one (0 to 0.9):
+            a new spectrum every size * (1 - overlap) samples.
+
+        window:
+            Window function: 'hann', 'hamming', 'blackman' or 'rect'.
+
+        depth:
+            Number of spectra kept for the spectrogram.
+
+        The magnitudes are scaled so a sine of amplitude A shows a
+        peak of A. The sample rate is estimated from the timestamps
+        (exact once the samples are resampled on a uniform grid).
+
+        push(timestamps, samples):
+            Feed a (N, channels) batch, return the number of new
+            spectra.
+
+        spectrum():
+            (channels, bins) magnitude of the last spectrum.
+
+        spectrogram(channel):
+            (frames, bins) magnitudes of the last 'depth' spectra,
+            oldest first (a contiguous view).
+    """
+    def __init__(   self,
+                    size     = 256,
+                    overlap  = 0.5,
+                    window   = 'hann',
+                    depth    = 200,
+                    channels = 3):
+        if window not in WINDOW_FUNCTIONS:
+            raise ValueError('unknown window function %r' % window)
+        self.size     = int(size)
+        self.hop      = max(1, int(round(self.size * (1 - min(overlap, 0.9)))))
+        self.window   = WINDOW_FUNCTIONS[window](self.size)
+        self.depth    = depth
+        self.channels = channels
+        self.bins     = self.size // 2 + 1
+
+        # single-sided amplitude: the DC and Nyquist bins aren't doubled
+        self.scale    = np.empty(self.bins)
+        self.scale.fill(2.0 / self.window.sum())
+        self.scale[0] /= 2
+        if self.size % 2 == 0:
+            self.scale[-1] /= 2
+
+        # spectrogram: every spectrum is written twice, at i and
+        # i + depth, so the last 'depth' ones are a contiguous slice
+        self.history  = np.zeros((channels, 2 * depth, self.bins))
+        self.frames   = 0                       # spectra computed since the creation
+
+        self.pending  = np.empty((0, channels)) # samples of the next windows
+        self.count    = 0                       # samples received
+        self.t_first  = None
+        self.t_last   = None
+    #------------------------------------------------------
+
+
+    @property
+    def rate(self):
+        """ Estimated sample rate (Hz), 0 until known
+        """
+        if self.count < 2 or self.t_last <= self.t_first:
+            return 0.0
+        return (self.count - 1) / (self.t_last - self.t_first)
+    #------------------------------------------------------
+
+
+    def frequencies(self):
+        rate = self.rate or 1.0
+        return np.arange(self.bins) * rate / self.size
+    #------------------------------------------------------
+
+
+    def push(self, timestamps, samples):
+        if len(timestamps) == 0:
+            return 0
+        if self.t_first is None:
+            self.t_first = timestamps[0]
+        self.t_last  = timestamps[-1]
+        self.count  += len(timestamps)
+
+        pending = np.concatenate((self.pending, samples))
+        nb = (len(pending) - self.size) // self.hop + 1 if len(pending) >= self.size else 0
+        if nb > 0:
+            pending = np.ascontiguousarray(pending, dtype=np.float64)
+            s0, s1  = pending.strides
+            windows = as_strided(pending, shape=(nb, self.size, self.channels),
+                                 strides=(self.hop * s0, s0, s1))
+            spectra = np.abs(np.fft.rfft(windows * self.window[:, None], axis=1)) * self.scale[:, None]
+            self.store(spectra.transpose(2, 0, 1))
+            pending = pending[nb * self.hop:]
+        self.pending = pending
+        return nb
+    #------------------------------------------------------
+
+
+    def store(self, spectra):
+        """ Append (channels, nb, bins) spectra to the spectrogram
+        """
+        nb = spectra.shape[1]
+        if nb > self.depth:
+            self.frames += nb - self.depth
+            spectra = spectra[:, -self.depth:]
+            nb = self.depth
+        pos   = self.frames % self.depth
+        first = min(nb, self.depth - pos)
+        for offset in (0, self.depth):
+            self.history[:, pos + offset:pos + offset + first] = spectra[:, :first]
+        if first < nb:
+            for offset in (0, self.depth):
+                self.history[:, offset:offset + nb - first] = spectra[:, first:]
+        self.frames += nb
+    #------------------------------------------------------
+
+
+    def spectrogram(self, channel):
+        n   = min(self.frames, self.depth)
+        end = self.frames % self.depth + self.depth
+        return self.history[channel, end - n:end]
+    #------------------------------------------------------
+
+
+    def spectrum(self):
+        if self.frames == 0:
+            return np.zeros((self.channels, self.bins))
+        return self.history[:, self.frames % self.depth + self.depth - 1]
+    #------------------------------------------------------
+
+
+    def peak_frequencies(self):
+        """ Frequency of the highest peak of the last spectrum of
+            every channel (the DC bin excluded)
+        """
+        peaks = self.spectrum()[:, 1:].argmax(axis=1) + 1
+        return self.frequencies()[peaks]
+    #------------------------------------------------------
@@ -0,0 +1,295 @@
+import Queue, threading, time, ctypes, multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+
+
+
+OVERFLOW_DROP_OLDEST = 'drop-oldest'
+OVERFLOW_DROP_NEWEST = 'drop-newest'
+OVERFLOW_BLOCK       = 'block'
+OVERFLOW_POLICIES    = [OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_BLOCK]
+
+
+
+class SampleRing(object):
+    """ A bounded single-producer/single-consumer ring of samples
+        between a reception thread and its reader, in place of an
+        unbounded Queue.Queue.
+
+        The samples, timestamps and source ids are written in
+        preallocated arrays: put() copies a batch in place and the
+        reader drains everything available in one get_all(), with
+        no lock taken on either side. Only the producer writes
+        'head' and only the consumer writes 'tail' (a Python
+        attribute assignment is atomic), and head is published
+        after the samples are written. With 'drop-oldest' the
+        producer may overwrite samples being read: it announces
+        them in 'reserved' before writing, and the reader drops
+        the ones it may have read torn.
+
+        put(item):
+            Same items as the data_q of the reception threads:
+            (samples, timestamps) or (samples, timestamps, source_id).
+
+        get_all():
+            (samples, timestamps, sources) copies of all the
+            available samples, possibly empty.
+
+        get(block=True, timeout=None):
+            (samples, timestamps) of all the available samples,
+            waiting for some like Queue.get (raises Queue.Empty).
+
+        policy:
+            What put() does when the ring is full:
+            'drop-oldest' overwrites the oldest samples (the reader
+            notices it and skips them), 'drop-newest' drops the
+            samples of the batch that don't fit and 'block' waits
+            up to 'block_timeout' seconds for the reader to make
+            room before dropping them.
+
+        overflows:
+            Number of samples lost because the ring was full.
+
+        notify:
+            None, or a function called by the producer when it puts
+            samples in a ring drained since the last call, so the
+            consumer is woken up once per batch it has to read,
+            rather than polling (same process only).
+    """
+    def __init__(   self,
+                    capacity      = 1 << 16,
+                    channels      = 3,
+                    policy        = OVERFLOW_DROP_OLDEST,
+                    block_timeout = 1.0):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError('unknown overflow policy %r' % policy)
+        self.capacity      = int(capacity)
+        self.channels      = channels
+        self.policy        = policy
+        self.block_timeout = block_timeout
+        self.allocate()
+
+        self.head          = 0                  # samples written, producer side
+        self.reserved      = 0                  # samples being written, producer side
+        self.tail          = 0                  # samples read, consumer side
+        self.dropped       = 0                  # overflows counted by the producer
+        self.overwritten   = 0                  # overflows counted by the consumer
+        self.notify        = None
+        self.notified      = False              # set by the producer, cleared by get_all()
+    #------------------------------------------------------
+
+
+    def allocate(self):
+        self.samples       = np.zeros((self.capacity, self.channels), dtype=np.float64)
+        self.timestamps    = np.zeros(self.capacity, dtype=np.float64)
+        self.sources       = np.zeros(self.capacity, dtype=np.int16)
+        self.readable      = threading.Event()
+        self.writable      = threading.Event()
+    #------------------------------------------------------
+
+
+    @property
+    def overflows(self):
+        return self.dropped + self.overwritten
+    #------------------------------------------------------
+
+
+    def qsize(self):
+        return min(self.head - self.tail, self.capacity)
+
+    def empty(self):
+        return self.head == self.tail
+    #------------------------------------------------------
+
+
+    def put(self, item, block = True, timeout = None):
+        """ block/timeout are only there for Queue compatibility,
+            the overflow policy decides
+        """
+        samples, timestamps = item[0], item[1]
+        source = item[2] if len(item) > 2 else 0
+        n = len(timestamps)
+
+        if self.policy == OVERFLOW_DROP_OLDEST:
+            self.write(samples, timestamps, source, 0, n)
+            return
+
+        done = 0
+        while done < n:
+            free = self.capacity - (self.head - self.tail)
+            if free == 0 and self.policy == OVERFLOW_BLOCK:
+                self.writable.clear()
+                if self.head - self.tail == self.capacity:
+                    self.writable.wait(self.block_timeout)
+                free = self.capacity - (self.head - self.tail)
+            if free == 0:
+                self.dropped += n - done
+                return
+            count = min(free, n - done)
+            self.write(samples, timestamps, source, done, done + count)
+            done += count
+    #------------------------------------------------------
+
+
+    def write(self, samples, timestamps, source, start, stop):
+        """ Copy samples[start:stop] at the head of the ring (only
+            the last 'capacity' ones if there are more)
+        """
+        head = self.head
+        n    = stop - start
+        skip = max(0, n - self.capacity)
+        src  = start + skip
+        self.reserved = head + n
+        for lo, hi in self.spans(head + skip, head + n):
+            count = hi - lo
+            self.samples[lo:hi]    = samples[src:src + count]
+            self.timestamps[lo:hi] = timestamps[src:src + count]
+            self.sources[lo:hi]    = source
+            src += count
+        self.head = head + n
+        self.readable.set()
+        if self.notify is not None and not self.notified:
+            self.notified = True
+            self.notify()
+    #------------------------------------------------------
+
+
+    def spans(self, start, stop):
+        """ The (lo, hi) slices of the arrays holding the absolute
+            sample indexes start..stop (at most 'capacity' of them)
+        """
+        lo    = start % self.capacity
+        first = min(stop - start, self.capacity - lo)
+        if first == stop - start:
+            return [(lo, lo + first)]
+        return [(lo, lo + first), (0, stop - start - first)]
+    #------------------------------------------------------
+
+
+    def get_all(self):
+        # cleared before head is read: a batch published after it is
+        # notified again
+        self.notified = False
+        head = self.head
+        tail = max(self.tail, head - self.capacity)
+        lost = tail - self.tail
+
+        n          = head - tail
+        samples    = np.empty((n, self.channels), dtype=self.samples.dtype)
+        timestamps = np.empty(n, dtype=self.timestamps.dtype)
+        sources    = np.empty(n, dtype=self.sources.dtype)
+        dst = 0
+        for lo, hi in self.spans(tail, head):
+            samples[dst:dst + hi - lo]    = self.samples[lo:hi]
+            timestamps[dst:dst + hi - lo] = self.timestamps[lo:hi]
+            sources[dst:dst + hi - lo]    = self.sources[lo:hi]
+            dst += hi - lo
+
+        # the oldest samples may have been overwritten while copied
+        overrun = self.reserved - self.capacity - tail
+        if overrun > 0:
+            lost      += min(overrun, n)
+            samples    = samples[overrun:]
+            timestamps = timestamps[overrun:]
+            sources    = sources[overrun:]
+
+        self.tail = head
+        self.overwritten += lost
+        self.writable.set()
+        return samples, timestamps, sources
+    #------------------------------------------------------
+
+
+    def get(self, block = True, timeout = None):
+        if block:
+            deadline = None if timeout is None else time.time() + timeout
+            while self.empty():
+                self.readable.clear()
+                if not self.empty():
+                    break
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.readable.wait(remaining)
+        if self.empty():
+            raise Queue.Empty
+        samples, timestamps, sources = self.get_all()
+        if len(timestamps) == 0:
+            raise Queue.Empty
+        return samples, timestamps
+    #------------------------------------------------------
+
+
+
+def shared_counter(index):
+    """ A property stored in the shared 'counters' array
+    """
+    def get(self):
+        return int(self.counters[index])
+    def set(self, value):
+        self.counters[index] = value
+    return property(get, set)
+#------------------------------------------------------------
+
+
+
+class SharedSampleRing(SampleRing):
+    """ A SampleRing in shared memory, to pass the samples between
+        processes: the arrays and the head/tail counters are
+        multiprocessing RawArrays (no lock) and the events are
+        multiprocessing events. It is handed to the producer
+        process when the process is created.
+
+        The counters are aligned 64 bits integers: their stores
+        are atomic, and seen in order by the other process on x86.
+
+        map_readonly():
+            Make the arrays of this side read-only, for the
+            consumer process once the producer is started.
+    """
+    head        = shared_counter(0)
+    reserved    = shared_counter(1)
+    tail        = shared_counter(2)
+    dropped     = shared_counter(3)
+    overwritten = shared_counter(4)
+
+    def allocate(self):
+        self.raw = dict(samples    = RawArray(ctypes.c_double, self.capacity * self.channels),
+                        timestamps = RawArray(ctypes.c_double, self.capacity),
+                        sources    = RawArray(ctypes.c_int16, self.capacity),
+                        counters   = RawArray(ctypes.c_int64, 5))
+        self.readable = multiprocessing.Event()
+        self.writable = multiprocessing.Event()
+        self.map()
+    #------------------------------------------------------
+
+
+    def map(self):
+        """ numpy views of the shared arrays
+        """
+        self.samples    = np.frombuffer(self.raw['samples'], dtype=np.float64
+                                        ).reshape(self.capacity, self.channels)
+        self.timestamps = np.frombuffer(self.raw['timestamps'], dtype=np.float64)
+        self.sources    = np.frombuffer(self.raw['sources'], dtype=np.int16)
+        self.counters   = np.frombuffer(self.raw['counters'], dtype=np.int64)
+    #------------------------------------------------------
+
+
+    def map_readonly(self):
+        for array in (self.samples, self.timestamps, self.sources):
+            array.flags.writeable = False
+    #------------------------------------------------------
+
+
+    def __getstate__(self):
+        # the numpy views are rebuilt from the shared arrays
+        state = dict(self.__dict__)
+        for name in ('samples', 'timestamps', 'sources', 'counters'):
+            del state[name]
+        state['notify'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.map()
+    #------------------------------------------------------
@@ -0,0 +1,156 @@
+import unittest, os, shutil, tempfile
+import numpy as np
+from schema             import StreamSchema, DEFAULT_SCHEMA
+from archive            import zigzag, unzigzag, varint_encode, varint_decode, \
+                               ArchiveWriter, Archive, convert_csv, \
+                               ARCHIVE_VARINT, ARCHIVE_ZLIB, ARCHIVE_EXTENSION, \
+                               TIME_RESOLUTION
+
+
+
+def capture(n, schema = DEFAULT_SCHEMA, rate = 400.0, seed = 0):
+    """ (timestamps, samples) of n samples on the schema's grid, with
+        the timestamps on the microsecond resolution of the archives
+    """
+    rng = np.random.RandomState(seed)
+    t   = np.rint((1000.0 + np.arange(n) / rate + rng.uniform(0, 1e-4, n)) * 1e6)
+    t   = t.astype(np.int64) * TIME_RESOLUTION
+    raw = rng.randint(-500, 500, (n, schema.channels)).astype(schema.raw_dtype)
+    return t, schema.decode(raw)
+#------------------------------------------------------------
+
+
+
+class PackingTest(unittest.TestCase):
+    """ The zigzag and varint packing round trip, including the
+        extremes of int64
+    """
+    def test_zigzag_varint(self):
+        info   = np.iinfo(np.int64)
+        values = np.r_[0, 1, -1, 63, -64, 64, 300, -300, info.max, info.min,
+                       np.random.RandomState(0).randint(-1 << 40, 1 << 40, 1000)].astype(np.int64)
+        codes  = zigzag(values)
+        self.assertEqual(codes[:4].tolist(), [0, 2, 1, 126])
+        self.assertTrue(np.array_equal(unzigzag(codes), values))
+        packed = varint_encode(codes)
+        decoded, used = varint_decode(np.r_[packed, [0x85, 0x01]].astype(np.uint8).tostring(),
+                                      len(values))
+        self.assertEqual(used, len(packed))
+        self.assertTrue(np.array_equal(decoded, codes))
+        self.assertRaises(ValueError, varint_decode, packed[:-1].tostring(), len(values))
+        self.assertEqual(len(varint_encode([])), 0)
+#------------------------------------------------------------
+
+
+
+class ArchiveTest(unittest.TestCase):
+    """ Archives give back the samples written to them, whole or by
+        time range and channels
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path      = os.path.join(self.directory, 'capture' + ARCHIVE_EXTENSION)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    #------------------------------------------------------
+
+
+    def write(self, t, y, schema = DEFAULT_SCHEMA, codec = ARCHIVE_ZLIB, close = True):
+        out = open(self.path, 'wb')
+        writer = ArchiveWriter(out, schema, 2.0, codec)
+        rng = np.random.RandomState(1)
+        start = 0
+        while start < len(t):
+            stop = start + rng.randint(1, 700)
+            writer.write(t[start:stop], y[start:stop])
+            start = stop
+        if close:
+            writer.close()
+        else:
+            writer.flush()
+        out.close()
+        return Archive(self.path)
+    #------------------------------------------------------
+
+
+    def test_round_trip(self):
+        t, y = capture(5000)
+        for codec in (ARCHIVE_VARINT, ARCHIVE_ZLIB):
+            archive = self.write(t, y, codec = codec)
+            self.assertFalse(archive.recovered)
+            self.assertEqual(len(archive), len(t))
+            self.assertEqual(archive.time_range(), (t[0], t[-1]))
+            times, values = archive.query()
+            self.assertTrue(np.array_equal(times, t))
+            self.assertTrue(np.array_equal(values, y))
+            self.assertTrue(np.array_equal(archive.index['min'].min(axis=0), y.min(axis=0)))
+    #------------------------------------------------------
+
+
+    def test_query_range_and_channels(self):
+        t, y = capture(5000)
+        archive = self.write(t, y)
+        t1, t2  = t[1234], t[3210]
+        times, values = archive.query(t1, t2, ['z', 0])
+        self.assertTrue(np.array_equal(times, t[1234:3211]))
+        self.assertTrue(np.array_equal(values, y[1234:3211][:, [2, 0]]))
+        self.assertTrue(len(archive.chunks(t1, t2)) < len(archive.index))
+        self.assertRaises(ValueError, archive.query, channels = ['w'])
+    #------------------------------------------------------
+
+
+    def test_rebuilt_index(self):
+        # writer killed: no index, and a truncated last chunk
+        t, y = capture(5000)
+        self.write(t, y, close = False)
+        size = os.path.getsize(self.path)
+        f = open(self.path, 'r+b')
+        f.truncate(size - 10)
+        f.close()
+        archive = Archive(self.path)
+        self.assertTrue(archive.recovered)
+        times, values = archive.query()
+        self.assertTrue(0 < len(times) < len(t))
+        self.assertTrue(np.array_equal(times, t[:len(times)]))
+        self.assertTrue(np.array_equal(values, y[:len(times)]))
+    #------------------------------------------------------
+
+
+    def test_float_schema(self):
+        schema = StreamSchema(names = ('p', 'q'), dtype = 'f4', scale = 1.0, units = 'V')
+        t, y   = capture(3000, schema)
+        y      = y + np.float32(0.25)
+        times, values = self.write(t, y, schema).query()
+        self.assertTrue(np.array_equal(times, t))
+        self.assertTrue(np.array_equal(values, y))
+    #------------------------------------------------------
+
+
+    def test_empty(self):
+        archive = self.write(np.empty(0), np.empty((0, 3)))
+        self.assertEqual(len(archive), 0)
+        self.assertEqual(archive.time_range(), None)
+        times, values = archive.query()
+        self.assertEqual(values.shape, (0, 3))
+    #------------------------------------------------------
+
+
+    def test_convert_csv(self):
+        t, y  = capture(3000)
+        paths = []
+        for part in range(2):
+            path = os.path.join(self.directory, '%d.csv' % part)
+            rows = slice(part * 1500, (part + 1) * 1500)
+            np.savetxt(path, np.column_stack((t[rows], y[rows])), fmt='%.6f', delimiter=',',
+                       header='timestamp,x,y,z')
+            paths.append(path)
+        self.assertEqual(convert_csv(paths, self.path, chunk_seconds = 2.0), len(t))
+        times, values = Archive(self.path).query()
+        self.assertTrue(np.allclose(times, t, rtol=0, atol=1e-6))
+        self.assertTrue(np.allclose(values, y, rtol=0, atol=1e-6))
+#------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+from ring_buffer        import SampleRingBuffer
+from decimate           import MinMaxDecimator, minmax_positions, lttb_positions
+
+
+
+def fill(history, n, rng, start = 0.0):
+    t = start + np.arange(n, dtype=np.float64)
+    history.append(t, rng.normal(0, 1, (n, history.channels)).astype(np.float32))
+#------------------------------------------------------------
+
+
+
+class DecimateTest(unittest.TestCase):
+    """ The decimated curves keep the extrema of the window
+    """
+    def check_extrema(self, history, positions):
+        values = history.values_view()
+        for i in range(history.channels):
+            kept = values[i, positions[i]]
+            self.assertEqual(kept.max(), values[i].max())
+            self.assertEqual(kept.min(), values[i].min())
+    #------------------------------------------------------
+
+
+    def test_minmax_positions(self):
+        y = np.random.RandomState(0).normal(0, 1, (3, 1000))
+        pos = minmax_positions(y, 64)
+        self.assertEqual(pos.shape, (3, 2 * 16))
+        self.assertTrue((np.diff(pos, axis=1) >= 0).all())
+        for i in range(3):
+            self.assertEqual(y[i, pos[i]].max(), y[i].max())
+    #------------------------------------------------------
+
+
+    def test_incremental_matches_extrema(self):
+        rng       = np.random.RandomState(1)
+        history   = SampleRingBuffer(20000)
+        decimator = MinMaxDecimator()
+        for step in range(40):
+            fill(history, rng.randint(1, 3000), rng, history.total)
+            positions = decimator.positions(history, 300)
+            if positions is not None:
+                self.check_extrema(history, positions)
+    #------------------------------------------------------
+
+
+    def test_clear_then_refill(self):
+        # the refill goes past the total before the clear: the cache
+        # of the old samples must not be reused
+        rng       = np.random.RandomState(2)
+        history   = SampleRingBuffer(100000)
+        decimator = MinMaxDecimator()
+        fill(history, 60000, rng)
+        decimator.positions(history, 704)
+        history.clear()
+        fill(history, 90000, rng)
+        history.values[0, history.window()][1000] = 50.0
+        positions = decimator.positions(history, 704)
+        self.assertEqual(decimator.bucket, 128)
+        self.assertEqual(history.values_view()[0, positions[0]].max(), 50.0)
+        self.check_extrema(history, positions)
+    #------------------------------------------------------
+
+
+    def test_lttb_keeps_ends(self):
+        t = np.arange(500, dtype=np.float64)
+        pos = lttb_positions(t, np.sin(t / 10.0), 50)
+        self.assertEqual(len(pos), 50)
+        self.assertEqual((pos[0], pos[-1]), (0, 499))
+        self.assertTrue((np.diff(pos) > 0).all())
+#------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import numpy as np
+from filters            import (BlockSosFilter, StreamFilter, ChannelFilters, biquad, steady_state,
+                                FILTER_LOWPASS, FILTER_HIGHPASS, FILTER_BANDPASS, FILTER_AVERAGE,
+                                FILTER_NONE)
+
+
+
+def sosfilt_reference(sos, x, zi):
+    """ Sample by sample transposed direct form II
+    """
+    y  = np.array(x, dtype=np.float64)
+    zf = np.array(zi, dtype=np.float64)
+    for s, (b0, b1, b2, a0, a1, a2) in enumerate(sos):
+        z1, z2 = zf[s]
+        for n in range(len(y)):
+            xn   = y[n]
+            yn   = b0 * xn + z1
+            z1   = b1 * xn - a1 * yn + z2
+            z2   = b2 * xn - a2 * yn
+            y[n] = yn
+        zf[s, 0], zf[s, 1] = z1, z2
+    return y, zf
+#------------------------------------------------------------
+
+
+
+class FiltersTest(unittest.TestCase):
+
+    def setUp(self):
+        rng    = np.random.RandomState(0)
+        self.t = np.arange(1000) / 100.0
+        self.x = rng.normal(0, 1, (1000, 3)) + [1.0, -2.0, 0.5]
+    #------------------------------------------------------
+
+
+    def test_block_filter_matches_the_recurrence(self):
+        for kind in (FILTER_LOWPASS, FILTER_HIGHPASS, FILTER_BANDPASS):
+            sos = np.array([biquad(kind, 12.0, 100.0)] * 2)
+            zi  = steady_state(sos, self.x[0])
+            y, zf         = BlockSosFilter(sos).filter(self.x[:203], zi)
+            y_ref, zf_ref = sosfilt_reference(sos, self.x[:203], zi)
+            self.assertTrue(np.allclose(y, y_ref, atol=1e-10))
+            self.assertTrue(np.allclose(zf, zf_ref, atol=1e-10))
+    #------------------------------------------------------
+
+
+    def test_split_invariance(self):
+        for kind in (FILTER_LOWPASS, FILTER_AVERAGE):
+            whole = StreamFilter(kind, 5.0, 100.0).process(self.t, self.x)
+            f     = StreamFilter(kind, 5.0, 100.0)
+            cuts  = [0, 1, 70, 71, 300, 999, 1000]
+            parts = [f.process(self.t[lo:hi], self.x[lo:hi]) for lo, hi in zip(cuts, cuts[1:])]
+            self.assertTrue(np.allclose(np.concatenate(parts), whole, atol=1e-10))
+    #------------------------------------------------------
+
+
+    def test_starts_without_transient(self):
+        x = np.ones((50, 3)) * [1.0, 2.0, 3.0]
+        y = StreamFilter(FILTER_LOWPASS, 5.0, 100.0, sections = 2).process(self.t[:50], x)
+        self.assertTrue(np.allclose(y, x))
+    #------------------------------------------------------
+
+
+    def test_redesign_restarts_from_the_last_sample(self):
+        # the estimated rate doubles: the new design starts from the
+        # steady state of the last sample, without a step
+        f = StreamFilter(FILTER_LOWPASS, 5.0)
+        x = np.ones((200, 1)) * 3.0
+        f.process(np.arange(100) / 100.0, x[:100])
+        t = 1.0 + np.arange(1, 401) / 400.0
+        y = f.process(t, x[:100].repeat(4, axis=0))
+        self.assertTrue(f.rate > 150.0)
+        self.assertTrue(np.allclose(y, 3.0))
+    #------------------------------------------------------
+
+
+    def test_channel_filters(self):
+        filters = [StreamFilter(FILTER_LOWPASS, 5.0, 100.0),
+                   StreamFilter(FILTER_NONE),
+                   StreamFilter(FILTER_LOWPASS, 5.0, 100.0)]
+        y = ChannelFilters(filters).process(self.t, self.x)
+        ref = StreamFilter(FILTER_LOWPASS, 5.0, 100.0).process(self.t, self.x[:, [0, 2]])
+        self.assertTrue(np.allclose(y[:, [0, 2]], ref))
+        self.assertTrue(np.array_equal(y[:, 1], self.x[:, 1]))
+#------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest, json, StringIO
+from metrics            import MetricsRegistry, Histogram
+
+
+
+class MetricsTest(unittest.TestCase):
+    """ The registry creates the metrics on first use and snapshots
+        their values
+    """
+    def test_registry(self):
+        metrics = MetricsRegistry()
+        metrics.counter('bytes_read').inc(10)
+        metrics.counter('bytes_read').inc()
+        metrics.gauge('queue_depth').set(3)
+        self.assertTrue(metrics.counter('bytes_read') is metrics.get('bytes_read', None))
+        self.assertEqual(metrics.value('bytes_read'), 11)
+        self.assertEqual(metrics.value('missing', -1), -1)
+
+        out = StringIO.StringIO()
+        metrics.dump(out)
+        values = json.loads(out.getvalue())['metrics']
+        self.assertEqual(values, {'bytes_read': 11, 'queue_depth': 3})
+        metrics.reset()
+        self.assertEqual(metrics.snapshot()['metrics'], {})
+    #------------------------------------------------------
+
+
+    def test_histogram(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.snapshot()['p99'], 0.0)
+        for i in range(1, 1001):
+            histogram.observe(i * 1e-5)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 1000)
+        self.assertAlmostEqual(snapshot['mean'], 5.005e-3)
+        self.assertEqual(snapshot['max'], 1e-2)
+        # bucket upper bounds: within a factor sqrt(2) of the quantile
+        self.assertTrue(5e-3 <= snapshot['p50'] <= 5e-3 * 2 ** 0.5)
+        self.assertTrue(9.9e-3 <= snapshot['p99'] <= 1e-2)
+        histogram.observe(1e3)
+        self.assertEqual(histogram.quantile(1.0), 1e3)
+#------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    unittest.main()
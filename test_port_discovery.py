@@ -0,0 +1,105 @@
+import unittest, tempfile, shutil, os
+import port_discovery
+from port_discovery     import PortInfo, PortScanner, sysfs_port, resolve_port
+
+
+
+class SysfsTest(unittest.TestCase):
+    """ sysfs_port on a fake /sys/class/tty tree
+    """
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.saved = port_discovery.SYSFS_TTY
+        port_discovery.SYSFS_TTY = os.path.join(self.root, 'class', 'tty')
+    #------------------------------------------------------
+
+
+    def tearDown(self):
+        port_discovery.SYSFS_TTY = self.saved
+        shutil.rmtree(self.root)
+    #------------------------------------------------------
+
+
+    def add_usb_port(self, name, vid, pid):
+        usb = os.path.join(self.root, 'devices', 'usb1', '1-1')
+        interface = os.path.join(usb, '1-1:1.0')
+        os.makedirs(interface)
+        for attribute, value in (('idVendor', vid), ('idProduct', pid),
+                                 ('product', 'FT232R USB UART'), ('serial', 'A123')):
+            f = open(os.path.join(usb, attribute), 'w')
+            f.write(value + '\n')
+            f.close()
+        tty = os.path.join(port_discovery.SYSFS_TTY, name)
+        os.makedirs(tty)
+        os.symlink(interface, os.path.join(tty, 'device'))
+    #------------------------------------------------------
+
+
+    def test_usb_port(self):
+        self.add_usb_port('ttyUSB0', '0403', '6001')
+        info = sysfs_port('ttyUSB0')
+        self.assertEqual((info.device, info.vid, info.pid), ('/dev/ttyUSB0', 0x0403, 0x6001))
+        self.assertEqual(info.description, 'FT232R USB UART')
+        self.assertEqual(info.hwid(), 'USB VID:PID=0403:6001 SER=A123')
+    #------------------------------------------------------
+
+
+    def test_bad_attribute(self):
+        self.add_usb_port('ttyUSB0', '', 'zz')
+        info = sysfs_port('ttyUSB0')
+        self.assertEqual((info.vid, info.pid), (None, None))
+        self.assertEqual(info.description, 'FT232R USB UART')
+    #------------------------------------------------------
+
+
+    def test_virtual_tty_skipped(self):
+        os.makedirs(os.path.join(port_discovery.SYSFS_TTY, 'tty1'))
+        self.assertEqual(sysfs_port('tty1'), None)
+#------------------------------------------------------------
+
+
+
+class PortScannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = port_discovery.scan_ports
+        self.found = {}
+        port_discovery.scan_ports = lambda: dict(self.found)
+
+    def tearDown(self):
+        port_discovery.scan_ports = self.saved
+    #------------------------------------------------------
+
+
+    def test_hotplug_callbacks(self):
+        events  = []
+        scanner = PortScanner(lambda info: events.append(('+', info.id)),
+                              lambda info: events.append(('-', info.id)))
+        usb = PortInfo('/dev/ttyUSB0', 'usb-FTDI_A123-if00', 'FT232R')
+        scanner.scan()
+        self.found[usb.id] = usb
+        scanner.scan()
+        self.assertEqual(scanner.ports(), [usb])
+        self.assertEqual(resolve_port(usb.id, self.found), '/dev/ttyUSB0')
+        del self.found[usb.id]
+        scanner.scan()
+        self.assertEqual(events, [('+', usb.id), ('-', usb.id)])
+        self.assertEqual(scanner.ports(), [])
+    #------------------------------------------------------
+
+
+    def test_scan_error_keeps_the_thread(self):
+        def failing():
+            raise ValueError('bad attribute')
+        port_discovery.scan_ports = failing
+        scanner = PortScanner(interval = 0.01)
+        scanner.start()
+        scanner.wake.wait(0.05)
+        self.assertTrue(scanner.isAlive())
+        scanner.join(1.0)
+        self.assertFalse(scanner.isAlive())
+#------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest, tempfile, shutil, glob, os
+import numpy as np
+from recorder           import CsvRecorderThread, BinaryRecorderThread, ArchiveRecorderThread
+
+
+
+class CsvRecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    #------------------------------------------------------
+
+
+    def test_rotate_rows_changed_while_recording(self):
+        recorder = CsvRecorderThread(self.directory, rotate_rows = 1000)
+        recorder.start()
+        for i in range(100):
+            recorder.put(np.arange(50.0) + 50 * i, np.zeros((50, 3)))
+            recorder.set_rotate_rows([1000, 7, 1, 300][i % 4])
+        recorder.join()
+        self.assertFalse(recorder.isAlive())
+        self.assertEqual(recorder.rows_written + recorder.rows_dropped, 5000)
+
+        rows = 0
+        for name in glob.glob(os.path.join(self.directory, '*.csv')):
+            f = open(name)
+            lines = [line for line in f if not line.startswith('#')]
+            f.close()
+            self.assertTrue(1 <= len(lines) <= 1000)
+            rows += len(lines)
+        self.assertEqual(rows, recorder.rows_written)
+    #------------------------------------------------------
+
+
+    def test_write_error_is_reported(self):
+        missing = os.path.join(self.directory, 'missing')
+        for kind in (CsvRecorderThread, BinaryRecorderThread, ArchiveRecorderThread):
+            recorder = kind(missing)
+            recorder.start()
+            recorder.put(np.arange(10.0), np.zeros((10, 3)))
+            recorder.join(5.0)
+            self.assertFalse(recorder.isAlive())
+            self.assertTrue('No such file or directory' in recorder.error_q.get_nowait())
+#------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    unittest.main()
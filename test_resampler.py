@@ -0,0 +1,78 @@
+import unittest
+import numpy as np
+from resampler          import StreamResampler, spread_ties
+
+
+
+def jittered_stream(n, rate, seed, gaps = ()):
+    """ (t, y) of a 2-channel stream at 'rate' with a timing jitter
+        and gaps (sample index, seconds): the gap is before the sample
+    """
+    rng = np.random.RandomState(seed)
+    dt  = np.ones(n) / rate + rng.uniform(-0.2, 0.2, n) / rate
+    for i, gap in gaps:
+        dt[i] += gap
+    t = 10.0 + np.cumsum(dt)
+    y = np.column_stack((np.sin(t * 7.0), rng.normal(0, 1, n)))
+    return t, y
+#------------------------------------------------------------
+
+
+def resample(resampler, t, y, cuts):
+    out_t, out_y = [], []
+    cuts = np.asarray(cuts, dtype=np.intp)
+    for lo, hi in zip(np.r_[0, cuts], np.r_[cuts, len(t)]):
+        rt, ry = resampler.push(t[lo:hi], y[lo:hi])
+        out_t.append(rt)
+        out_y.append(ry)
+    return np.concatenate(out_t), np.concatenate(out_y)
+#------------------------------------------------------------
+
+
+
+class StreamResamplerTest(unittest.TestCase):
+
+    def check_split_invariance(self, method):
+        t, y = jittered_stream(2000, 100.0, 0, gaps = [(500, 1.5), (503, 2.0), (1200, 3.0)])
+        ref_t, ref_y = resample(StreamResampler(50.0, method), t, y, [])
+        self.assertTrue(len(ref_t) > 0)
+        rng = np.random.RandomState(1)
+        for split in range(40):
+            cuts = np.unique(rng.randint(1, len(t), rng.randint(1, 60)))
+            out_t, out_y = resample(StreamResampler(50.0, method), t, y, cuts)
+            self.assertEqual(len(out_t), len(ref_t))
+            self.assertTrue(np.allclose(out_t, ref_t))
+            self.assertTrue(np.allclose(out_y, ref_y, atol=1e-9))
+    #------------------------------------------------------
+
+
+    def test_linear_split_invariance(self):
+        self.check_split_invariance('linear')
+
+    def test_sinc_split_invariance(self):
+        self.check_split_invariance('sinc')
+    #------------------------------------------------------
+
+
+    def test_uniform_grid_without_gap_outputs(self):
+        t, y = jittered_stream(1000, 100.0, 2, gaps = [(400, 2.0)])
+        for method in ('linear', 'sinc'):
+            out_t, out_y = StreamResampler(100.0, method).push(t, y)
+            steps = np.diff(np.rint(out_t * 100.0))
+            self.assertTrue((steps >= 1).all())
+            gap_lo, gap_hi = t[399], t[400]
+            self.assertFalse(((out_t > gap_lo) & (out_t < gap_hi)).any())
+            # a slow sine is reproduced by both interpolations
+            self.assertTrue(np.abs(out_y[:, 0] - np.sin(out_t * 7.0)).max() < 0.05)
+    #------------------------------------------------------
+
+
+    def test_spread_ties(self):
+        t = np.array([1.0, 1.0, 1.0, 2.0, 2.0, 3.0])
+        spread = spread_ties(t, 0.0)
+        self.assertTrue(np.allclose(spread, [1 / 3.0, 2 / 3.0, 1.0, 1.5, 2.0, 3.0]))
+#------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+from ring_buffer        import SampleRingBuffer
+
+
+
+class SampleRingBufferTest(unittest.TestCase):
+    """ The window always holds the last 'capacity' samples in order
+    """
+    def test_wraparound(self):
+        rng     = np.random.RandomState(0)
+        history = SampleRingBuffer(1000, 3, np.float64)
+        t_all, y_all = [], []
+        for step in range(50):
+            n = rng.randint(0, 1500)
+            t = np.arange(n, dtype=np.float64) + history.total
+            y = rng.normal(0, 1, (n, 3))
+            history.append(t, y)
+            t_all.append(t)
+            y_all.append(y)
+            t_ref = np.concatenate(t_all)[-1000:]
+            y_ref = np.concatenate(y_all)[-1000:]
+            self.assertEqual(len(history), len(t_ref))
+            self.assertTrue(np.array_equal(history.times(), t_ref))
+            self.assertTrue(np.array_equal(history.values_view(), y_ref.T))
+            self.assertTrue(np.array_equal(history.channel(2), y_ref[:, 2]))
+    #------------------------------------------------------
+
+
+    def test_resize_keeps_the_last_samples(self):
+        history = SampleRingBuffer(100, 1, np.float64)
+        t = np.arange(250, dtype=np.float64)
+        history.append(t, t[:, None])
+        history.resize(40)
+        self.assertTrue(np.array_equal(history.times(), t[-40:]))
+        history.resize(80)
+        self.assertTrue(np.array_equal(history.channel(0), t[-40:]))
+    #------------------------------------------------------
+
+
+    def test_clear_bumps_the_generation(self):
+        history = SampleRingBuffer(10)
+        generation = history.generation
+        history.append(np.arange(5.0), np.zeros((5, 3)))
+        history.clear()
+        self.assertEqual(len(history), 0)
+        self.assertNotEqual(history.generation, generation)
+        generation = history.generation
+        history.resize(20)
+        self.assertNotEqual(history.generation, generation)
+#------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    unittest.main()
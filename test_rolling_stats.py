@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+from rolling_stats      import RollingStats, SlidingMaximum
+
+
+
+class RollingStatsTest(unittest.TestCase):
+    """ The incremental statistics match the ones computed on the
+        last 'window' samples
+    """
+    def check_stream(self, x, window, seed):
+        rng   = np.random.RandomState(seed)
+        stats = RollingStats(window, x.shape[1])
+        done  = 0
+        while done < len(x):
+            n = min(rng.randint(1, 2 * window // 3), len(x) - done)
+            stats.update(np.arange(done, done + n, dtype=np.float64), x[done:done + n])
+            done += n
+            ref = x[max(0, done - window):done]
+            self.assertEqual(stats.n, len(ref))
+            self.assertTrue(np.allclose(stats.mean, ref.mean(axis=0)))
+            self.assertTrue(np.allclose(stats.std, ref.std(axis=0)))
+            self.assertTrue(np.array_equal(stats.max, ref.max(axis=0)))
+            self.assertTrue(np.array_equal(stats.min, ref.min(axis=0)))
+    #------------------------------------------------------
+
+
+    def test_random(self):
+        x = np.random.RandomState(0).normal(0, 1, (5000, 3))
+        self.check_stream(x, 256, 1)
+    #------------------------------------------------------
+
+
+    def test_monotone_and_constant(self):
+        # a decreasing signal keeps the whole window in the max deque
+        t = np.arange(5000, dtype=np.float64)
+        x = np.column_stack((-t, t, np.ones(5000)))
+        self.check_stream(x, 300, 2)
+    #------------------------------------------------------
+
+
+    def test_batch_longer_than_window(self):
+        x = np.random.RandomState(3).normal(0, 1, (1000, 2))
+        stats = RollingStats(100, 2)
+        stats.update(np.arange(1000.0), x)
+        self.assertTrue(np.array_equal(stats.max, x[-100:].max(axis=0)))
+        self.assertTrue(np.allclose(stats.mean, x[-100:].mean(axis=0)))
+    #------------------------------------------------------
+
+
+    def test_deque_stays_within_capacity(self):
+        deque = SlidingMaximum(64)
+        count = 0
+        for batch in range(200):
+            x = -np.arange(count, count + 40, dtype=np.float64)
+            count += 40
+            deque.push(x, count - 40, count - 64)
+            self.assertTrue(len(deque) <= 64)
+            self.assertEqual(deque.first(), -max(0, count - 64))
+#------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    unittest.main()
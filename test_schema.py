@@ -0,0 +1,76 @@
+import unittest, pickle, os, json, tempfile
+import numpy as np
+from schema             import StreamSchema, SCHEMAS, DEFAULT_SCHEMA, load_schema
+
+
+
+class StreamSchemaTest(unittest.TestCase):
+    """ Decoding the quantized samples gives them back, whatever the
+        wire type, byte order and scaling
+    """
+    def test_round_trip(self):
+        rng = np.random.RandomState(0)
+        for schema in SCHEMAS.values():
+            raw     = rng.randint(-1000, 1000, (200, schema.channels)).astype(schema.raw_dtype)
+            samples = schema.decode(raw.tostring())
+            self.assertEqual(samples.shape, (200, schema.channels))
+            self.assertTrue(np.array_equal(schema.quantize(samples), raw))
+            frames  = np.frombuffer(raw.tostring(), dtype=np.uint8)
+            self.assertTrue(np.array_equal(schema.decode(frames), samples))
+    #------------------------------------------------------
+
+
+    def test_offset_and_float(self):
+        schema  = StreamSchema(names = ('a', 'b'), dtype = 'f4', endian = '>',
+                               scale = [2.0, 0.5], offset = [1.0, -3.0])
+        raw     = np.array([[1.5, -2.0], [0.0, 8.0]], dtype='>f4')
+        samples = schema.decode(raw.tostring())
+        self.assertTrue(np.allclose(samples, [[4.0, -4.0], [1.0, 1.0]]))
+        self.assertTrue(np.array_equal(schema.quantize(samples), raw.astype('=f4')))
+        self.assertEqual(schema.range, (-np.inf, np.inf))
+    #------------------------------------------------------
+
+
+    def test_quantize_clips(self):
+        schema = StreamSchema(names = ('x',), dtype = 'i2', scale = 1.0)
+        raw    = schema.quantize([[1e6], [-1e6], [1.4]])
+        self.assertEqual(raw.ravel().tolist(), [32767, -32768, 1])
+    #------------------------------------------------------
+
+
+    def test_dict_and_pickle(self):
+        for schema in SCHEMAS.values():
+            self.assertEqual(StreamSchema.from_dict(schema.to_dict()), schema)
+            copy = pickle.loads(pickle.dumps(schema, 2))
+            self.assertEqual(copy, schema)
+            self.assertEqual(copy.raw_dtype, schema.raw_dtype)
+            self.assertTrue(np.array_equal(copy.scale, schema.scale))
+        # older recordings only saved the channels, scale and units
+        old = StreamSchema.from_dict(dict(channels = ['x', 'y', 'z'], scale = 0.004, units = 'g'))
+        self.assertEqual(old.frame_size, 6)
+        self.assertNotEqual(old, StreamSchema(names = ('x', 'y')))
+    #------------------------------------------------------
+
+
+    def test_labels_and_errors(self):
+        self.assertEqual(SCHEMAS['mpu6050'].labels()[3], 'gx (deg/s)')
+        self.assertRaises(ValueError, StreamSchema, endian = '!')
+        self.assertRaises(ValueError, StreamSchema, scale = [1.0, 2.0])
+    #------------------------------------------------------
+
+
+    def test_load_schema(self):
+        self.assertTrue(load_schema('adxl345') is DEFAULT_SCHEMA)
+        self.assertRaises(ValueError, load_schema, 'no-such-device')
+        fd, path = tempfile.mkstemp(suffix = '.json')
+        try:
+            os.write(fd, json.dumps(SCHEMAS['itg3200'].to_dict()))
+            os.close(fd)
+            self.assertEqual(load_schema(path), SCHEMAS['itg3200'])
+        finally:
+            os.remove(path)
+#------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import numpy as np
+from timestamps         import SampleClock, wire_period, monotonic
+
+
+
+class SampleClockTest(unittest.TestCase):
+
+    def test_first_reads_are_spread(self):
+        # no nominal rate, no previous read: the samples of the first
+        # frame are spaced by the link period, not stacked on the arrival
+        period = wire_period(14, 4, 115200)
+        clock  = SampleClock(samples_per_frame = 4, link_period = period)
+        t = clock.stamp(1.0, 4, [0])
+        self.assertEqual(len(np.unique(t)), 4)
+        self.assertTrue(np.allclose(np.diff(t), period))
+        self.assertEqual(t[-1], 1.0)
+        t2 = clock.stamp(1.1, 4, [1])
+        self.assertTrue(t2[0] > t[-1])
+        self.assertTrue((np.diff(t2) > 0).all())
+    #------------------------------------------------------
+
+
+    def test_first_read_with_nominal_rate(self):
+        clock = SampleClock(rate = 100.0)
+        t = clock.stamp(5.0, 10)
+        self.assertTrue(np.allclose(np.diff(t), 0.01))
+        self.assertEqual(t[-1], 5.0)
+    #------------------------------------------------------
+
+
+    def test_drift_estimate_and_jitter(self):
+        # device at 1000 Hz with a +50 ppm clock, reads of 8 samples
+        # arriving with up to 3 ms of random delay
+        rng   = np.random.RandomState(0)
+        clock = SampleClock(rate = 1000.0)
+        true_period = 1e-3 * (1 + 50e-6)
+        errors = []
+        for k in range(1000):
+            n = 8 * (k + 1)
+            sampled = np.arange(n - 8, n) * true_period
+            t = clock.stamp(sampled[-1] + rng.uniform(0, 3e-3), 8)
+            self.assertTrue(t[-1] <= sampled[-1] + 3e-3)
+            if k > 300:
+                errors.append(t - sampled)
+        errors = np.concatenate(errors)
+        self.assertTrue(errors.std() < 1e-3)
+        self.assertTrue(abs(clock.drift_ppm - 50) < 20)
+    #------------------------------------------------------
+
+
+    def test_timestamps_never_decrease(self):
+        rng   = np.random.RandomState(1)
+        clock = SampleClock(samples_per_frame = 4, link_period = 1e-4)
+        last  = -np.inf
+        arrival = 0.0
+        for seq in range(0, 3000, 3):               # lost frames, counter wraps at 2**16
+            arrival += rng.uniform(0, 0.02)
+            t = clock.stamp(arrival, 8, [(seq * 40) % 65536, (seq * 40 + 1) % 65536])
+            self.assertTrue(t[0] >= last)
+            self.assertTrue((np.diff(t) >= 0).all())
+            self.assertTrue(t[-1] <= arrival)
+            last = t[-1]
+    #------------------------------------------------------
+
+
+    def test_monotonic(self):
+        a = monotonic()
+        self.assertTrue(monotonic() >= a)
+#------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    unittest.main()
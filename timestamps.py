@@ -0,0 +1,285 @@
+import sys, os, time
+import numpy as np
+
+
+
+#===============================================================================
+# Monotonic clock: time.time() jumps when the system clock is set (NTP...),
+# time.clock() is the CPU time on Linux. Python 2 has no time.monotonic, so
+# clock_gettime(CLOCK_MONOTONIC) is called through ctypes (the same way,
+# CLOCK_THREAD_CPUTIME_ID gives the CPU time used by the calling thread).
+#===============================================================================
+CLOCK_MONOTONIC_IDS      = dict(linux2 = 1, linux = 1, darwin = 6)
+CLOCK_THREAD_CPUTIME_IDS = dict(linux2 = 3, linux = 3, darwin = 16)
+
+
+def posix_clock(clock_ids):
+    """ A clock_gettime() function of the clock of this platform in
+        clock_ids (platform -> clock id), None if the system doesn't
+        provide it
+    """
+    import ctypes, ctypes.util
+    clock_id = clock_ids.get(sys.platform)
+    if clock_id is None:
+        return None
+
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    for name in ('rt', 'c'):
+        path = ctypes.util.find_library(name)
+        if path is None:
+            continue
+        try:
+            clock_gettime = ctypes.CDLL(path, use_errno = True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+
+        def clock():
+            ts = timespec()
+            if clock_gettime(clock_id, ctypes.byref(ts)) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            return ts.tv_sec + ts.tv_nsec * 1e-9
+        return clock
+    return None
+#------------------------------------------------------------
+
+
+def posix_monotonic():
+    """ clock_gettime(CLOCK_MONOTONIC), None if not available
+    """
+    return posix_clock(CLOCK_MONOTONIC_IDS)
+#------------------------------------------------------------
+
+
+try:
+    from time import monotonic                      # python 3.3+
+except ImportError:
+    if os.name == 'nt':
+        monotonic = time.clock                      # QueryPerformanceCounter
+    else:
+        monotonic = posix_monotonic() or time.time
+#------------------------------------------------------------
+
+
+
+def wire_period(frame_size, samples_per_frame, baud):
+    """ Seconds a serial link at 'baud' (10 bits per byte) takes to
+        carry one sample, sent in frames of 'frame_size' bytes
+    """
+    return 10.0 * frame_size / baud / samples_per_frame
+#------------------------------------------------------------
+
+
+
+class SampleClock(object):
+    """ Reconstructs the sampling time of every sample from the
+        times the batches were read, instead of giving all the
+        samples of a read the time of the read.
+
+        The device samples at a steady rate on its own clock: the
+        sample n was taken at origin + period * n on the host clock
+        (the period includes the drift between the two clocks). A
+        batch read at time T whose last sample is n gives a point
+        (n, T), T being the sampling time plus a variable delay
+        (transmission, OS buffering, port reads). Over the last
+        'window' points:
+
+        - period: least squares slope of T against n;
+        - origin: the lower envelope of the points with that slope,
+          i.e. the reads with the shortest delay (the delay can't be
+          negative, its minimum is the most stable part of it).
+
+        n is the device sample counter when the frames carry one
+        (the sequence numbers of the binary protocol: lost frames
+        leave a gap instead of shifting the following samples),
+        else the number of samples received.
+
+        rate:
+            Nominal sample rate (Hz), used until the estimate is
+            available and to report the drift. None if unknown.
+
+        samples_per_frame:
+            Samples per sequence number.
+
+        link_period:
+            Seconds the serial link takes to carry one sample (see
+            wire_period): the spacing of the samples of the first
+            reads when the rate is not known yet. None if unknown.
+
+        window:
+            Number of reads the estimate is computed on.
+
+        resync:
+            When a read is this many seconds away from the estimate
+            (device reset, long pause), the estimate is restarted.
+
+        refit:
+            The estimate is computed again every 'refit' reads.
+
+        stamp(arrival, count, sequences=None):
+            Return the (count,) timestamps of the samples of a read
+            done at 'arrival' (host monotonic seconds). sequences:
+            the frame counters of the read, if any. The timestamps
+            never decrease and are never later than the arrival.
+    """
+    MIN_POINTS = 8
+
+    def __init__(   self,
+                    rate              = None,
+                    samples_per_frame = 1,
+                    link_period       = None,
+                    window            = 256,
+                    resync            = 1.0,
+                    refit             = 8,
+                    sequence_bits     = 16):
+        self.nominal           = rate
+        self.samples_per_frame = samples_per_frame
+        self.link_period       = link_period
+        self.window            = window
+        self.resync            = resync
+        self.refit             = refit
+        self.modulo            = 1 << sequence_bits
+        self.reset()
+    #------------------------------------------------------
+
+
+    def reset(self):
+        self.index     = np.zeros(self.window)  # (n, T) points, in a ring
+        self.arrival   = np.zeros(self.window)
+        self.points    = 0
+        self.frame     = None                   # unwrapped counter of the last frame
+        self.count     = 0                      # samples received
+        self.last_time = -np.inf                # last timestamp given
+        self.last      = None                   # last (n, T) point
+        self.restart()
+    #------------------------------------------------------
+
+
+    def restart(self):
+        """ Forget the estimate, keep the counters
+        """
+        self.points    = 0
+        self.period    = None
+        self.reference = 0.0                    # sample index of the origin
+        self.origin    = 0.0
+        self.latency   = 0.0                    # mean delay above the shortest one
+    #------------------------------------------------------
+
+
+    @property
+    def rate(self):
+        """ Estimated sample rate on the host clock (Hz)
+        """
+        if self.period:
+            return 1.0 / self.period
+        return self.nominal or 0.0
+
+    @property
+    def drift_ppm(self):
+        """ Device clock drift against the host, relative to the
+            nominal rate (ppm)
+        """
+        if not self.period or not self.nominal:
+            return 0.0
+        return (self.nominal * self.period - 1) * 1e6
+    #------------------------------------------------------
+
+
+    def unwrap(self, sequences):
+        """ Unwrapped frame counters of wrapping sequence numbers
+        """
+        seqs  = np.asarray(sequences, dtype=np.int64)
+        last  = seqs[0] - 1 if self.frame is None else self.frame
+        steps = np.empty_like(seqs)
+        steps[0]  = seqs[0] - last
+        steps[1:] = seqs[1:] - seqs[:-1]
+        frames = last + np.cumsum(steps % self.modulo)
+        self.frame = int(frames[-1])
+        return frames
+    #------------------------------------------------------
+
+
+    def sample_indexes(self, count, sequences):
+        if sequences is not None and len(sequences) * self.samples_per_frame == count and count:
+            frames  = self.unwrap(sequences)
+            indexes = (frames[:, None] * self.samples_per_frame +
+                       np.arange(self.samples_per_frame)).ravel()
+        else:
+            indexes = self.count + np.arange(count)
+        self.count += count
+        return indexes.astype(np.float64)
+    #------------------------------------------------------
+
+
+    def predict(self, indexes):
+        return self.origin + self.period * (indexes - self.reference)
+    #------------------------------------------------------
+
+
+    def add_point(self, index, arrival):
+        if self.period is not None and abs(self.predict(index) - arrival) > self.resync:
+            self.restart()
+        pos = self.points % self.window
+        self.index[pos]   = index
+        self.arrival[pos] = arrival
+        self.points += 1
+        self.last = (index, arrival)
+    #------------------------------------------------------
+
+
+    def fit(self):
+        """ Update period/origin from the points, return False if
+            there are not enough of them yet
+        """
+        n = min(self.points, self.window)
+        if n < self.MIN_POINTS:
+            return False
+        reference = self.last[0]
+        x = self.index[:n] - reference
+        y = self.arrival[:n]
+        dx = x - x.mean()
+        spread = (dx * dx).sum()
+        if spread == 0:
+            return False
+        period = (dx * (y - y.mean())).sum() / spread
+        if period <= 0:
+            return False
+        residual = y - period * x
+        self.period    = period
+        self.reference = reference
+        self.origin    = residual.min()
+        self.latency   = residual.mean() - self.origin
+        return True
+    #------------------------------------------------------
+
+
+    def stamp(self, arrival, count, sequences = None):
+        if count == 0:
+            return np.empty(0)
+        indexes  = self.sample_indexes(count, sequences)
+        previous = self.last
+        self.add_point(indexes[-1], arrival)
+
+        if self.period is None or self.points % self.refit == 0:
+            self.fit()
+        if self.period is not None:
+            timestamps = self.predict(indexes)
+        else:
+            # no estimate yet: the last sample at the arrival, the
+            # others before it at the nominal or the observed rate, or
+            # at least as far apart as the link carried them
+            period = 1.0 / self.nominal if self.nominal else 0.0
+            if not period and previous is not None and indexes[-1] > previous[0]:
+                period = (arrival - previous[1]) / (indexes[-1] - previous[0])
+            if not period and self.link_period:
+                period = self.link_period
+            timestamps = arrival - (indexes[-1] - indexes) * period
+
+        timestamps = np.minimum(timestamps, arrival)
+        timestamps = np.maximum.accumulate(np.maximum(timestamps, self.last_time))
+        self.last_time = timestamps[-1]
+        return timestamps
+    #------------------------------------------------------
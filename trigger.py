@@ -0,0 +1,156 @@
+import numpy as np
+from ring_buffer        import SampleRingBuffer
+
+
+
+TRIGGER_RISING    = 'rising'
+TRIGGER_FALLING   = 'falling'
+TRIGGER_LEVEL     = 'level'
+TRIGGER_MAGNITUDE = 'magnitude'
+TRIGGER_SLOPE     = 'slope'
+TRIGGER_CONDITIONS = [TRIGGER_RISING, TRIGGER_FALLING, TRIGGER_LEVEL,
+                      TRIGGER_MAGNITUDE, TRIGGER_SLOPE]
+
+TRIGGER_NORMAL    = 'normal'
+TRIGGER_SINGLE    = 'single'
+TRIGGER_MODES     = [TRIGGER_NORMAL, TRIGGER_SINGLE]
+
+
+
+class Trigger(object):
+    """ Oscilloscope-like trigger on a stream of samples: it keeps
+        the last 'pre' samples in a ring buffer and, when the
+        condition is met, returns the event window of the 'pre'
+        samples before the trigger and the 'post' samples from it.
+
+        condition:
+            'rising'/'falling': the channel crosses 'level' upwards/
+            downwards; 'level': the channel is at or above 'level';
+            'magnitude': the norm of the (x, y, z) vector is at or
+            above 'level'; 'slope': the channel changes by 'level'
+            or more between two samples (downwards if negative).
+
+        holdoff:
+            Seconds after the end of an event before the trigger can
+            fire again.
+
+        mode:
+            'normal' re-arms after every event (and the holdoff),
+            'single' disarms after one event until arm() is called.
+
+        push(timestamps, samples):
+            Evaluate a (N, channels) batch at once (the condition is
+            computed on the whole batch, the samples are only looked
+            at one by one where it is met) and return the list of the
+            (timestamps, samples, trigger_time) events completed by it.
+    """
+    def __init__(   self,
+                    condition = TRIGGER_RISING,
+                    channel   = 0,
+                    level     = 1.0,
+                    pre       = 100,
+                    post      = 400,
+                    holdoff   = 0.0,
+                    mode      = TRIGGER_NORMAL,
+                    channels  = 3):
+        if condition not in TRIGGER_CONDITIONS:
+            raise ValueError('unknown trigger condition %r' % condition)
+        if mode not in TRIGGER_MODES:
+            raise ValueError('unknown trigger mode %r' % mode)
+        self.condition = condition
+        self.channel   = channel
+        self.level     = level
+        self.pre       = int(pre)
+        self.post      = max(1, int(post))
+        self.holdoff   = holdoff
+        self.mode      = mode
+
+        # samples before the current batch: at least 'pre' before a
+        # trigger waiting for its 'post' samples
+        self.history   = SampleRingBuffer(self.pre + self.post, channels, np.float64)
+        self.last      = None                   # last sample, for the edges and the slope
+        self.pending   = None                   # absolute index of a trigger being completed
+        self.allowed   = -np.inf                # time from which the trigger can fire again
+        self.armed     = True
+        self.events    = 0
+    #------------------------------------------------------
+
+
+    def arm(self):
+        self.armed = True
+    #------------------------------------------------------
+
+
+    def evaluate(self, samples):
+        """ (N,) mask of the samples meeting the condition
+        """
+        if self.condition == TRIGGER_MAGNITUDE:
+            return np.sqrt((samples ** 2).sum(axis=1)) >= self.level
+
+        x    = samples[:, self.channel]
+        prev = np.r_[x[0] if self.last is None else self.last[self.channel], x[:-1]]
+        if self.condition == TRIGGER_RISING:
+            return (prev < self.level) & (x >= self.level)
+        if self.condition == TRIGGER_FALLING:
+            return (prev > self.level) & (x <= self.level)
+        if self.condition == TRIGGER_LEVEL:
+            return x >= self.level
+        if self.level >= 0:
+            return x - prev >= self.level
+        return x - prev <= self.level
+    #------------------------------------------------------
+
+
+    def push(self, timestamps, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        n = len(samples)
+        if n == 0:
+            return []
+
+        mask   = self.evaluate(samples)
+        base   = self.history.total             # absolute index of samples[0]
+        events = []
+        i      = 0
+        while True:
+            if self.pending is not None:
+                end = self.pending + self.post - base
+                if end > n:
+                    break
+                events.append(self.extract(self.pending, timestamps, samples, base))
+                self.events += 1
+                self.pending = None
+                self.allowed = timestamps[end - 1] + self.holdoff
+                i = end
+                if self.mode == TRIGGER_SINGLE:
+                    self.armed = False
+            if not self.armed or i >= n:
+                break
+            fire = np.flatnonzero(mask[i:] & (timestamps[i:] >= self.allowed))
+            if len(fire) == 0:
+                break
+            self.pending = base + i + fire[0]
+
+        self.history.append(timestamps, samples)
+        self.last = samples[-1].copy()
+        return events
+    #------------------------------------------------------
+
+
+    def extract(self, index, timestamps, samples, base):
+        """ The event window around the trigger at the absolute
+            'index', from the history and the current batch
+        """
+        start = max(index - self.pre, base - len(self.history))
+        stop  = index + self.post
+        t, y  = [], []
+        if start < base:
+            first = len(self.history) - (base - start)
+            t.append(self.history.times()[first:])
+            y.append(self.history.values_view()[:, first:].T)
+        lo = max(start - base, 0)
+        t.append(timestamps[lo:stop - base])
+        y.append(samples[lo:stop - base])
+        trigger_time = timestamps[index - base] if index >= base else \
+                       self.history.times()[len(self.history) - (base - index)]
+        return np.concatenate(t), np.concatenate(y), trigger_time
+    #------------------------------------------------------